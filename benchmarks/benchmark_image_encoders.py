@@ -0,0 +1,74 @@
+# run from the repository root: python -m benchmarks.benchmark_image_encoders
+
+import time
+import argparse
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+from device_capture_system.datamodel import ImageFile
+from device_capture_system.imageIO import IMAGE_ENCODERS
+
+# ---------------------------------------------------------------------
+
+AP = argparse.ArgumentParser()
+AP.add_argument("--resolutions", type=str, nargs="+", default=["2560x1440", "1440x2560", "1920x1080"], help="frame sizes as WIDTHxHEIGHT")
+AP.add_argument("--formats", type=str, nargs="+", default=["jpg", "png", "webp"], help="image formats to encode")
+AP.add_argument("--pixel_formats", type=str, nargs="+", default=["rgb24", "yuv420p"], help="input pixel formats")
+AP.add_argument("--repeats", type=int, default=10, help="encodes per measurement")
+AP.add_argument("--threads", type=int, default=4, help="threads for the parallel throughput measurement")
+ARGS = AP.parse_args()
+
+# ---------------------------------------------------------------------
+
+def test_frame(width: int, height: int, pixel_format: str) -> np.ndarray:
+    # smooth gradients with sensor like noise, pure noise would be an unrealistic worst case for the encoders
+    rng = np.random.default_rng(0)
+    rgb = np.linspace(0, 200, width)[None, :, None] + np.linspace(0, 50, height)[:, None, None] + rng.normal(0, 8, (height, width, 3))
+    rgb = np.clip(rgb, 0, 255).astype(np.uint8)
+    if pixel_format == "rgb24":
+        return rgb
+    import av
+    return av.VideoFrame.from_ndarray(rgb, format="rgb24").reformat(format="yuv420p").to_ndarray()
+
+def measure(encoder, frame, image_file, pixel_format):
+    encoder.encode(frame, image_file, pixel_format) # warm up
+    
+    dt = time.perf_counter()
+    for _ in range(ARGS.repeats):
+        size = len(encoder.encode(frame, image_file, pixel_format))
+    single = (time.perf_counter() - dt) / ARGS.repeats
+    
+    with ThreadPoolExecutor(ARGS.threads) as executor:
+        dt = time.perf_counter()
+        list(executor.map(lambda _: encoder.encode(frame, image_file, pixel_format), range(ARGS.repeats * ARGS.threads)))
+        parallel_fps = ARGS.repeats * ARGS.threads / (time.perf_counter() - dt)
+    
+    return single, parallel_fps, size
+
+if __name__ == "__main__":
+    
+    print(f"{'resolution':>10} {'format':>6} {'input':>8} {'encoder':>8} {'ms/img':>8} {'fps':>7} {f'fps@{ARGS.threads}t':>8} {'kB':>8}")
+    
+    for resolution in ARGS.resolutions:
+        width, height = map(int, resolution.split("x"))
+        
+        for file_extension in ARGS.formats:
+            image_file = ImageFile(
+                file_path="benchmark", 
+                file_name="benchmark", 
+                file_extension=file_extension, 
+                jpg_quality=95, 
+                png_compression=3, 
+                jpg_subsampling="4:2:0"
+            )
+            
+            for pixel_format in ARGS.pixel_formats:
+                frame = test_frame(width, height, pixel_format)
+                
+                for name, encoder_class in IMAGE_ENCODERS.items():
+                    if not encoder_class.is_available() or not encoder_class.supports(file_extension):
+                        continue
+                    
+                    single, parallel_fps, size = measure(encoder_class(), frame, image_file, pixel_format)
+                    print(f"{resolution:>10} {file_extension:>6} {pixel_format:>8} {name:>8} {single * 1000:8.1f} {1 / single:7.1f} {parallel_fps:8.1f} {size / 1000:8.0f}")
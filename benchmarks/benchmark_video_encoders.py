@@ -0,0 +1,104 @@
+# run from the repository root: python -m benchmarks.benchmark_video_encoders
+
+import io
+import time
+import argparse
+import numpy as np
+
+import av
+
+from device_capture_system.datamodel import VideoFile
+from device_capture_system.videoIO import add_video_stream, VIDEO_ENCODER_PROFILES
+
+# ---------------------------------------------------------------------
+
+AP = argparse.ArgumentParser()
+AP.add_argument("--resolutions", type=str, nargs="+", default=["2560x1440", "1920x1080"], help="frame sizes as WIDTHxHEIGHT")
+AP.add_argument("--codecs", type=str, nargs="+", default=["libx264", "mpeg4"], help="encoders to measure, x264 presets only apply to libx264")
+AP.add_argument("--presets", type=str, nargs="+", default=["ultrafast", "superfast", "veryfast", "faster", "medium"], help="x264 presets")
+AP.add_argument("--thread_configs", type=str, nargs="+", default=["0:AUTO", "1:SLICE", "4:SLICE", "4:FRAME"], help="THREADS:TYPE pairs")
+AP.add_argument("--profiles", type=str, nargs="*", default=list(VIDEO_ENCODER_PROFILES), help="encoder profiles to measure")
+AP.add_argument("--frames", type=int, default=60, help="frames encoded per measurement")
+AP.add_argument("--fps", type=float, default=30., help="nominal frame rate of the streams")
+ARGS = AP.parse_args()
+
+# ---------------------------------------------------------------------
+
+def test_frames(width: int, height: int, n: int = 8) -> list:
+    # moving gradients with sensor like noise, static frames would make inter prediction unrealistically cheap
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(n):
+        rgb = np.linspace(0, 200, width)[None, :, None] + np.linspace(0, 50, height)[:, None, None] + rng.normal(0, 8, (height, width, 3))
+        rgb = np.roll(np.clip(rgb, 0, 255).astype(np.uint8), i * 8, axis=1)
+        frames.append(av.VideoFrame.from_ndarray(rgb, format="rgb24").reformat(format="yuv420p"))
+    return frames
+
+def measure(video_file: VideoFile, frames: list):
+    """encoded frames per second of one camera stream and the encoder that was used"""
+    # packets are only counted, not muxed, the container just provides the stream
+    container = av.open(io.BytesIO(), mode="w", format="mp4")
+    stream = add_video_stream(container, video_file)
+    
+    size = 0
+    dt = time.perf_counter()
+    for i in range(ARGS.frames):
+        frame = frames[i % len(frames)]
+        frame.pts = None
+        for packet in stream.encode(frame):
+            size += packet.size
+    for packet in stream.encode():
+        size += packet.size
+    fps = ARGS.frames / (time.perf_counter() - dt)
+    
+    codec_name = stream.codec_context.name
+    container.close()
+    return fps, codec_name, size
+
+def video_file(width: int, height: int, **encoder_fields) -> VideoFile:
+    return VideoFile(
+        file_path="benchmark",
+        file_name="benchmark",
+        file_extension="mp4",
+        width=width,
+        height=height,
+        fps=ARGS.fps,
+        seconds=1.,
+        **encoder_fields
+    )
+
+if __name__ == "__main__":
+
+    print(f"{'resolution':>10} {'encoder':>18} {'preset':>10} {'threads':>9} {'fps/cam':>8} {'cams@fps':>8} {'kB/frame':>9}")
+    
+    def report(resolution, label, preset, threads, fps, size):
+        # how many cameras one encoder process could keep up with at the nominal frame rate
+        print(f"{resolution:>10} {label:>18} {preset:>10} {threads:>9} {fps:8.1f} {fps / ARGS.fps:8.2f} {size / ARGS.frames / 1000:9.1f}")
+    
+    for resolution in ARGS.resolutions:
+        width, height = map(int, resolution.split("x"))
+        frames = test_frames(width, height)
+        
+        for codec in ARGS.codecs:
+            presets = ARGS.presets if codec == "libx264" else ["-"]
+            
+            for preset in presets:
+                for thread_config in ARGS.thread_configs:
+                    threads, thread_type = thread_config.split(":")
+                    
+                    fps, codec_name, size = measure(video_file(
+                        width,
+                        height,
+                        codec=codec,
+                        preset=None if preset == "-" else preset,
+                        threads=int(threads),
+                        thread_type=thread_type
+                    ), frames)
+                    report(resolution, codec_name, preset, thread_config, fps, size)
+        
+        for profile in ARGS.profiles:
+            encoder_fields = dict(VIDEO_ENCODER_PROFILES[profile])
+            encoder_fields.setdefault("codec", "h264")
+            
+            fps, codec_name, size = measure(video_file(width, height, **encoder_fields), frames)
+            report(resolution, f"{profile}:{codec_name}", encoder_fields.get("preset", "-"), encoder_fields.get("thread_type", "-"), fps, size)
@@ -0,0 +1,123 @@
+# run from the repository root: python -m benchmarks.benchmark_zmq_proxy
+
+import zmq
+import time
+import argparse
+import numpy as np
+
+from datetime import datetime
+from multiprocessing import Process, Event
+
+from device_capture_system.datamodel import FramePacket, PeripheryDevice, ProxyOptions
+from device_capture_system.zmqIO import ZMQProxy, ZMQSender
+
+# ---------------------------------------------------------------------
+
+AP = argparse.ArgumentParser()
+AP.add_argument("--resolution", type=str, default="2560x1440", help="frame size as WIDTHxHEIGHT, frames are rgb24")
+AP.add_argument("--fps", type=float, default=30., help="frame rate of every stream")
+AP.add_argument("--streams", type=int, nargs="+", default=[1, 2, 4, 6, 8], help="numbers of concurrent camera streams")
+AP.add_argument("--configs", type=str, nargs="+", default=["io_threads=1", "io_threads=2", "io_threads=4", "io_threads=2,sndbuf=8388608,rcvbuf=8388608", "io_threads=2,cpu_affinity=0"],
+                help="proxy options as comma separated key=value pairs, list values separated by +")
+AP.add_argument("--seconds", type=float, default=3., help="duration of every measurement")
+AP.add_argument("--queue_size", type=int, default=10, help="HWM of the proxy and sender sockets")
+AP.add_argument("--threshold", type=float, default=0.95, help="delivered fraction below which a configuration counts as saturated")
+AP.add_argument("--port", type=int, default=11000, help="first of the two proxy ports")
+ARGS = AP.parse_args()
+
+# ---------------------------------------------------------------------
+
+def proxy_options(config: str) -> ProxyOptions:
+    fields = {}
+    for pair in config.split(","):
+        key, value = pair.split("=")
+        if key == "cpu_affinity":
+            fields[key] = [int(cpu) for cpu in value.split("+")]
+        elif key == "tcp_keepalive":
+            fields[key] = value.lower() in ("1", "true")
+        else:
+            fields[key] = int(value)
+    return ProxyOptions(**fields)
+
+def send_stream(index: int, width: int, height: int, start_event, stop_event):
+    # paced like a camera, frames that do not fit into the sender HWM are counted as dropped by the sender
+    sender = ZMQSender(host="127.0.0.1", port=ARGS.port, q_size=ARGS.queue_size, name=f"stream{index}")
+    sender.start(connect_timeout=2)
+    frame_packet = FramePacket(
+        device=PeripheryDevice(device_id=f"stream{index}", name=f"stream{index}"),
+        frame=np.random.default_rng(index).integers(0, 255, (height, width, 3), dtype=np.uint8),
+        start_read_dt=datetime.now(),
+        end_read_dt=datetime.now()
+    )
+    
+    start_event.wait()
+    next_frame = time.perf_counter()
+    while not stop_event.is_set():
+        frame_packet.sequence += 1
+        sender.send(frame_packet)
+        next_frame += 1 / ARGS.fps
+        time.sleep(max(0, next_frame - time.perf_counter()))
+    
+    sender.stop()
+
+def measure(options: ProxyOptions, streams: int, width: int, height: int):
+    """delivered and offered frames per second through the proxy"""
+    proxy = ZMQProxy(host="127.0.0.1", sub_port=ARGS.port, pub_port=ARGS.port + 1, queue_size=ARGS.queue_size, options=options)
+    assert proxy.start_process() is not None, "proxy did not start"
+    
+    # the receiving side only counts messages, parsing them would measure the receiver instead of the proxy
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.RCVHWM, ARGS.queue_size)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt_string(zmq.SUBSCRIBE, "")
+    socket.connect(f"tcp://127.0.0.1:{ARGS.port + 1}")
+    
+    start_event, stop_event = Event(), Event()
+    senders = [Process(target=send_stream, args=(i, width, height, start_event, stop_event)) for i in range(streams)]
+    for sender in senders:
+        sender.start()
+    time.sleep(1) # connections and subscriptions
+    
+    received = 0
+    start_event.set()
+    dt = time.perf_counter()
+    while time.perf_counter() - dt < ARGS.seconds:
+        if socket.poll(100):
+            socket.recv_multipart(copy=False)
+            received += 1
+    elapsed = time.perf_counter() - dt
+    stop_event.set()
+    
+    for sender in senders:
+        sender.join()
+    socket.close()
+    context.term()
+    proxy.stop_process()
+    
+    return received / elapsed, streams * ARGS.fps
+
+if __name__ == "__main__":
+
+    width, height = map(int, ARGS.resolution.split("x"))
+    frame_mb = width * height * 3 / 2 ** 20
+    
+    print(f"{'config':>45} {'streams':>7} {'offered':>8} {'fps':>8} {'MB/s':>8} {'delivered':>9}")
+    
+    for config in ARGS.configs:
+        options = proxy_options(config)
+        saturated_at = None
+        
+        for streams in ARGS.streams:
+            fps, offered = measure(options, streams, width, height)
+            delivered = fps / offered
+            print(f"{config:>45} {streams:7d} {offered:8.1f} {fps:8.1f} {fps * frame_mb:8.1f} {delivered:9.1%}")
+            
+            if delivered < ARGS.threshold:
+                saturated_at = streams
+                break
+        
+        if saturated_at is None:
+            print(f"{config:>45} not saturated up to {ARGS.streams[-1]} streams")
+        else:
+            print(f"{config:>45} saturated at {saturated_at} streams")
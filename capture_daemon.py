@@ -0,0 +1,88 @@
+import argparse
+import logging
+
+from device_capture_system.deviceIO import load_all_devices_from_config
+from device_capture_system.core import MultiInputStreamSender
+from device_capture_system.daemon import CaptureDaemon
+from device_capture_system.datamodel import ProxyOptions, CameraDevice, DerivedStream, ChangeDetection, FramePreprocessing
+
+# ---------------------------------------------------------------------
+
+AP = argparse.ArgumentParser()
+AP.add_argument("--config", type=str, default="./configs/devices.json", help="path to device configuration file")
+AP.add_argument("--device_type", type=str, default="video", help="device type to keep open", choices=["video", "audio"])
+AP.add_argument("--host", type=str, default="127.0.0.1", help="host name or ip of the server")
+AP.add_argument("--proxy_sub_port", type=int, default=10000, help="port for proxy subscriber")
+AP.add_argument("--proxy_pub_port", type=int, default=10001, help="port for proxy publisher")
+AP.add_argument("--control_port", type=int, default=10002, help="port for daemon control requests")
+AP.add_argument("--zmq_proxy_queue_size", type=int, default=1000, help="zmq proxy queue size")
+AP.add_argument("--zmq_proxy_io_threads", type=int, default=1, help="zmq io threads of the proxy, one thread handles roughly a gigabyte per second")
+AP.add_argument("--zmq_proxy_cpus", type=int, nargs="*", default=None, help="pin the proxy process to these cpus (linux)")
+AP.add_argument("--supervise", action="store_true", help="restart failed sender and proxy processes automatically")
+AP.add_argument("--clock_port", type=int, default=None, help="serve the clock of this node so receivers on other hosts can correct the timestamps")
+AP.add_argument("--clock_host", type=str, default=None, help="host name or ip under which receivers reach the clock port, defaults to --host")
+AP.add_argument("--registry_path", type=str, default=None, help="directory where senders register their own endpoints, receivers connect to them directly without the proxy")
+AP.add_argument("--wire_codec", type=str, default="none", choices=["none", "zlib", "lz4", "zstd", "jpeg"], help="compression of frames sent over the network, lz4 and zstd need their packages")
+AP.add_argument("--wire_codec_level", type=int, default=None, help="compression level of the wire codec, the quality for jpeg")
+AP.add_argument("--compression_workers", type=int, default=0, help="threads per sender compressing frames, 0 compresses in the capture loop")
+AP.add_argument("--preview_width", type=int, default=None, help="also publish a preview stream of every camera downscaled to this width")
+AP.add_argument("--preview_decimation", type=int, default=1, help="publish every n-th frame in the preview stream")
+AP.add_argument("--change_detection", action="store_true", help="suppress unchanged frames of static scenes and publish motion events of the cameras")
+AP.add_argument("--keep_alive_seconds", type=float, default=1., help="with change detection an unchanged frame is still sent after this many seconds")
+AP.add_argument("--motion_hold_seconds", type=float, default=2., help="with change detection motion stops after this many seconds without a changed frame")
+AP.add_argument("-ll", "--logging_level", type=str, default="info", help="logging level", choices=["debug", "info", "warning", "error"])
+ARGS = AP.parse_args()
+
+# ---------------------------------------------------------------------
+
+logging.basicConfig(level=ARGS.logging_level.upper())
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+
+# the same rotations as in save_frames.py, sessions attached to the daemon receive the frames preprocessed by it
+FRAME_PREPROCESSINGS = {
+    "Logitech-StreamCam.center": FramePreprocessing.ROTATE_90_CLOCKWISE,
+    "Razer-Kiyo-1.left": FramePreprocessing.ROTATE_90_CLOCKWISE,
+    "Razer-Kiyo-2.right": FramePreprocessing.ROTATE_90_COUNTERCLOCKWISE
+}
+
+# ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+    
+    devices = load_all_devices_from_config(ARGS.device_type, config_file=ARGS.config)
+    
+    logger.warning("FRAME PREPROCESSING IS SET MANUALLY IN THE CODE TO:\n" + ''.join([f'{device.name} => {FRAME_PREPROCESSINGS.get(device.name, None)}\n' for device in devices if isinstance(device, CameraDevice)]))
+    
+    derived_streams = {}
+    if ARGS.preview_width is not None or ARGS.preview_decimation > 1:
+        preview = DerivedStream(name="preview", width=ARGS.preview_width, decimation=ARGS.preview_decimation)
+        derived_streams = {device.name: [preview] for device in devices if isinstance(device, CameraDevice)}
+    
+    daemon = CaptureDaemon(
+        multi_sender=MultiInputStreamSender(
+            devices=devices,
+            proxy_sub_port=ARGS.proxy_sub_port,
+            proxy_pub_port=ARGS.proxy_pub_port,
+            host=ARGS.host,
+            zmq_proxy_queue_size=ARGS.zmq_proxy_queue_size,
+            zmq_proxy_options=ProxyOptions(io_threads=ARGS.zmq_proxy_io_threads, cpu_affinity=ARGS.zmq_proxy_cpus),
+            frame_preprocessings=FRAME_PREPROCESSINGS,
+            supervise=ARGS.supervise,
+            clock_port=ARGS.clock_port,
+            clock_host=ARGS.clock_host,
+            registry_path=ARGS.registry_path,
+            wire_codec=ARGS.wire_codec,
+            wire_codec_level=ARGS.wire_codec_level,
+            compression_workers=ARGS.compression_workers,
+            derived_streams=derived_streams,
+            change_detection=ChangeDetection(keep_alive_seconds=ARGS.keep_alive_seconds, motion_hold_seconds=ARGS.motion_hold_seconds) if ARGS.change_detection else None
+        ),
+        control_port=ARGS.control_port,
+        host=ARGS.host
+    )
+    
+    daemon.start()
+    logger.info(f"devices open and paused, waiting for sessions on port {ARGS.control_port} ...")
+    daemon.serve_forever()
@@ -0,0 +1,169 @@
+import os
+import json
+import numpy as np
+
+from logging import getLogger
+from typing import Union
+
+from .datamodel import AudioDevice, AudioFile, FramePacket
+from .utils import lazy_import
+
+av = lazy_import("av")
+
+# ------------------- AUDIO UTILS ------------------- #
+
+# output file extension -> (container format, codec)
+AUDIO_CODECS = {
+    "wav": ("wav", "pcm_s16le"), # raw pcm, samples are only copied
+    "flac": ("flac", "flac"),
+    "opus": ("ogg", "libopus"),
+}
+
+SAMPLE_FORMATS = {
+    "uint8": "u8",
+    "int16": "s16",
+    "int32": "s32",
+    "float32": "flt",
+    "float64": "dbl",
+}
+
+def channel_layout(channels: int) -> str:
+    return {1: "mono", 2: "stereo"}.get(channels, f"{channels}c")
+
+def audio_samples(frame: np.ndarray, channels: int) -> int:
+    """number of samples per channel in a received audio frame"""
+    return frame.size // channels
+
+def codec_sample_rate(codec: str, sample_rate: int) -> int:
+    """keep the device rate if the codec supports it, opus only runs at a few fixed rates"""
+    supported_rates = av.codec.Codec(codec, "w").audio_rates
+    if supported_rates and sample_rate not in supported_rates:
+        return max(supported_rates)
+    return sample_rate
+
+def audio_frame_from_ndarray(frame: np.ndarray, device: AudioDevice):
+    """
+    Rebuild the av.AudioFrame of an AudioDeviceReader packet.
+    Packed audio arrives as (1, samples * channels), planar audio as (channels, samples).
+    """
+    sample_format = SAMPLE_FORMATS.get(str(frame.dtype))
+    assert sample_format is not None, f"unsupported audio sample dtype {frame.dtype}"
+    
+    if device.channels > 1 and frame.shape[0] == device.channels:
+        sample_format += "p"
+    else:
+        frame = frame.reshape(1, -1)
+    
+    av_frame = av.AudioFrame.from_ndarray(np.ascontiguousarray(frame), format=sample_format, layout=channel_layout(device.channels))
+    av_frame.sample_rate = device.sample_rate
+    return av_frame
+
+# ------------------- AUDIO FILE WRITER ------------------- #
+
+class AudioFileWriter:
+    """
+    Streams the audio packets of one device into wav, flac or opus files through PyAV.
+    
+    With audio_file.segment_seconds set, a new file <file_name>_<segment>.<ext> is started at the first packet
+    after the segment is full. Every file has a json sidecar with the wall clock time of its first sample,
+    on the same clock as the video frame timestamps, so audio and video can be aligned after recording.
+    Not thread safe, all packets of a device must be written from one thread in order.
+    """
+    
+    def __init__(self, audio_file: AudioFile, device: AudioDevice):
+        self.logger = getLogger(f"{self.__class__.__name__}@{device.name}")
+        
+        assert audio_file.file_extension in AUDIO_CODECS, f"audio file extension must be one of {list(AUDIO_CODECS)}"
+        
+        self.audio_file = audio_file
+        self.device = device
+        
+        self.segment = -1
+        self.container = None
+        self.stream = None
+        self.resampler = None
+        self.sidecar = None
+        self.samples_in_segment = 0
+        self.files = []
+    
+    def is_active(self): return self.container is not None
+    
+    def _file_uri(self) -> str:
+        file_name = self.audio_file.file_name
+        if self.audio_file.segment_seconds is not None:
+            file_name = f"{file_name}_{self.segment:04d}"
+        return os.path.join(self.audio_file.file_path, f"{file_name}.{self.audio_file.file_extension}")
+    
+    def _open_segment(self, first_sample_ns: int):
+        self._close_segment()
+        
+        self.segment += 1
+        file_uri = self._file_uri()
+        container_format, codec = AUDIO_CODECS[self.audio_file.file_extension]
+        
+        self.container = av.open(file_uri, mode="w", format=container_format)
+        
+        sample_rate = codec_sample_rate(codec, self.audio_file.sample_rate)
+        
+        self.stream = self.container.add_stream(codec, rate=sample_rate, layout=channel_layout(self.audio_file.channels))
+        if self.audio_file.bit_rate is not None:
+            self.stream.bit_rate = self.audio_file.bit_rate
+        
+        # converts sample format, layout and rate to what the codec accepts, a no op for pcm
+        self.resampler = av.AudioResampler(format=self.stream.codec_context.codec.audio_formats[0].name, layout=channel_layout(self.audio_file.channels), rate=sample_rate)
+        
+        self.sidecar = {
+            "device": self.device.model_dump(),
+            "file": os.path.basename(file_uri),
+            "codec": codec,
+            "sample_rate": sample_rate,
+            "input_sample_rate": self.audio_file.sample_rate,
+            "channels": self.audio_file.channels,
+            "first_sample_timestamp_ns": first_sample_ns,
+            "input_samples": 0, # samples per channel at input_sample_rate
+        }
+        self.samples_in_segment = 0
+        self.files.append(file_uri)
+        
+        self.logger.info(f"writing {file_uri}")
+    
+    def _close_segment(self):
+        if self.container is None:
+            return
+        
+        for av_frame in self.resampler.resample(None):
+            self._mux(av_frame)
+        for packet in self.stream.encode():
+            self.container.mux(packet)
+        self.container.close()
+        
+        with open(f"{os.path.splitext(self.files[-1])[0]}.json", "w") as f:
+            json.dump(self.sidecar, f)
+        
+        self.container = None
+        self.stream = None
+        self.resampler = None
+    
+    def _mux(self, av_frame):
+        for packet in self.stream.encode(av_frame):
+            self.container.mux(packet)
+    
+    def write(self, frame_packet: FramePacket):
+        
+        samples = audio_samples(frame_packet.frame, self.device.channels)
+        segment_samples = None
+        if self.audio_file.segment_seconds is not None:
+            segment_samples = int(self.audio_file.segment_seconds * self.audio_file.sample_rate)
+        
+        if self.container is None or (segment_samples is not None and self.samples_in_segment >= segment_samples):
+            # the capture time of an audio packet is the one of its first sample
+            self._open_segment(frame_packet.capture_ns)
+        
+        for av_frame in self.resampler.resample(audio_frame_from_ndarray(frame_packet.frame, self.device)):
+            self._mux(av_frame)
+        
+        self.samples_in_segment += samples
+        self.sidecar["input_samples"] += samples
+    
+    def close(self):
+        self._close_segment()
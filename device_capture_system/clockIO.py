@@ -0,0 +1,199 @@
+import zmq
+import time
+
+from collections import deque
+from logging import getLogger
+from threading import Thread, Lock
+from threading import Event as ThreadEvent
+from typing import Union
+
+# ------------------- CLOCK SERVER ------------------- #
+
+class ClockServer:
+    """
+    Answers NTP style time requests of receivers on a REP socket, in a thread of the node that runs the senders.
+    A request is the client send time t1, the reply is [t1, t2, t3] with the server receive and send times in time.time_ns.
+    """
+    
+    def __init__(self, host: str, port: int, node_id: str, receive_wait_time_ms: int = 100):
+        self.logger = getLogger(f"{self.__class__.__name__}@{host}:{port}")
+        
+        self.host = host
+        self.port = port
+        self.node_id = node_id
+        self.receive_wait_time_ms = receive_wait_time_ms
+        
+        self.stop_event = ThreadEvent()
+        self.ready_event = ThreadEvent()
+        self.thread = None
+    
+    def is_active(self): return self.thread is not None
+    
+    def start(self, ready_timeout: float = 5):
+        self.logger.info("starting ...")
+        
+        assert not self.is_active(), "trying to start a clock server that has already started"
+        
+        self.stop_event.clear()
+        self.ready_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        
+        if not self.ready_event.wait(ready_timeout):
+            self.logger.warning(f"clock server not bound after {ready_timeout}s")
+        
+        self.logger.info("started !")
+    
+    def stop(self):
+        self.logger.info("stopping ...")
+        
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+        
+        self.logger.info("stopped !")
+    
+    def _run(self):
+        
+        context = zmq.Context()
+        socket = context.socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.setsockopt(zmq.RCVTIMEO, self.receive_wait_time_ms)
+        
+        try:
+            socket.bind(f"tcp://{self.host}:{self.port}")
+            self.ready_event.set()
+            
+            while not self.stop_event.is_set():
+                try:
+                    request = socket.recv_json()
+                except zmq.error.Again:
+                    continue
+                t2 = time.time_ns()
+                
+                socket.send_json({"node_id": self.node_id, "t1": request["t1"], "t2": t2, "t3": time.time_ns()})
+        finally:
+            socket.close()
+            context.term()
+
+# ------------------- CLOCK SYNC ------------------- #
+
+class ClockSync:
+    """
+    Estimates offset and drift of the clock of a remote ClockServer relative to the local time.time_ns.
+    
+    Every interval seconds a round of pings is sent, the ping with the smallest round trip gives the offset of that round
+    as ((t2 - t1) + (t3 - t4)) / 2, its error is bounded by half the round trip. The drift is the least squares slope of the
+    offsets of the last rounds, so the offset can be extrapolated between rounds.
+    """
+    
+    def __init__(self, endpoint: str, interval: float = 1., pings_per_round: int = 8, history: int = 32, timeout_ms: int = 500):
+        self.logger = getLogger(f"{self.__class__.__name__}@{endpoint}")
+        
+        assert pings_per_round > 0, "pings_per_round must be positive"
+        assert history > 1, "history must hold at least two rounds to estimate the drift"
+        
+        self.endpoint = endpoint
+        self.interval = interval
+        self.pings_per_round = pings_per_round
+        self.timeout_ms = timeout_ms
+        
+        self.node_id = None
+        self.rounds = deque(maxlen=history) # (local time, offset, round trip) in ns
+        self.offset = 0. # ns, remote - local at reference_ns
+        self.drift = 0. # ns of offset change per ns
+        self.reference_ns = 0
+        
+        self.lock = Lock()
+        self.stop_event = ThreadEvent()
+        self.thread = None
+    
+    def is_active(self): return self.thread is not None
+    
+    def is_synchronized(self) -> bool:
+        with self.lock:
+            return len(self.rounds) > 0
+    
+    def start(self):
+        assert not self.is_active(), "trying to start a clock sync that has already started"
+        
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+    
+    def offset_ns(self, local_ns: Union[int, None] = None) -> int:
+        """remote minus local clock at local_ns, now if None"""
+        if local_ns is None:
+            local_ns = time.time_ns()
+        with self.lock:
+            return round(self.offset + self.drift * (local_ns - self.reference_ns))
+    
+    def to_local_ns(self, remote_ns: int) -> int:
+        """convert a timestamp of the remote clock to the local clock"""
+        # the offset is a function of the local time, one fixed point step leaves an error of drift ** 2 * offset
+        return remote_ns - self.offset_ns(remote_ns - self.offset_ns(remote_ns))
+    
+    def _ping(self, socket) -> Union[tuple, None]:
+        t1 = time.time_ns()
+        socket.send_json({"t1": t1})
+        reply = socket.recv_json()
+        t4 = time.time_ns()
+        
+        self.node_id = reply["node_id"]
+        return (t1 + t4) // 2, ((reply["t2"] - t1) + (reply["t3"] - t4)) / 2, (t4 - t1) - (reply["t3"] - reply["t2"])
+    
+    def _update(self, sample: tuple):
+        with self.lock:
+            self.rounds.append(sample)
+            
+            if len(self.rounds) < 2:
+                self.offset, self.drift, self.reference_ns = sample[1], 0., sample[0]
+                return
+            
+            # least squares line through the offsets of the last rounds
+            t0 = self.rounds[-1][0]
+            xs = [r[0] - t0 for r in self.rounds]
+            ys = [r[1] for r in self.rounds]
+            x_mean, y_mean = sum(xs) / len(xs), sum(ys) / len(ys)
+            var = sum([(x - x_mean) ** 2 for x in xs])
+            self.drift = sum([(x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)]) / var if var > 0 else 0.
+            self.offset = y_mean - self.drift * x_mean
+            self.reference_ns = t0
+    
+    def sync_round(self) -> Union[tuple, None]:
+        """one round of pings, returns the (local time, offset, round trip) of the best ping or None if the server did not answer"""
+        
+        # a fresh REQ socket per round so a lost reply can not wedge the client
+        context = zmq.Context()
+        socket = context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.setsockopt(zmq.RCVTIMEO, self.timeout_ms)
+        socket.setsockopt(zmq.SNDTIMEO, self.timeout_ms)
+        
+        try:
+            socket.connect(self.endpoint)
+            samples = [self._ping(socket) for _ in range(self.pings_per_round)]
+        except zmq.error.Again:
+            self.logger.warning(f"clock server did not answer within {self.timeout_ms}ms")
+            return None
+        finally:
+            socket.close()
+            context.term()
+        
+        best = min(samples, key=lambda sample: sample[2])
+        self._update(best)
+        
+        self.logger.debug(f"offset {best[1] / 1e6:.3f}ms +- {best[2] / 2e6:.3f}ms, drift {self.drift * 1e6:.2f}ppm")
+        return best
+    
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.sync_round()
+            self.stop_event.wait(self.interval)
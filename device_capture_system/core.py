@@ -1,16 +1,22 @@
 import time
 import numpy as np
 
-from typing import Dict, Callable, List
+from typing import Dict, Callable, List, Set, Union
 from time import sleep
+from socket import gethostname
 from logging import getLogger
+from threading import Thread, Lock
+from threading import Event as ThreadEvent
 from concurrent.futures import ThreadPoolExecutor
-from multiprocessing import Process, Event
+from multiprocessing import Process, Event, Value
 from multiprocessing import TimeoutError as ProcessTimeoutError
 
-from .datamodel import PeripheryDevice, CameraDevice, AudioDevice, FramePreprocessing
+from .datamodel import PeripheryDevice, CameraDevice, AudioDevice, FramePacket, FramePreprocessing, ProcessHealth, ProcessState, StreamDescriptor, StreamCounters, ProxyOptions, DerivedStream, ChangeDetection, FULL_STREAM, MOTION_STREAM
 from .deviceIO import CameraDeviceReader, AudioDeviceReader
-from .zmqIO import ZMQSender, ZMQReceiver, ZMQProxy
+from .zmqIO import ZMQSender, ZMQReceiver, ZMQProxy, EndpointRegistry
+from .imageIO import resize_frame
+from .motionIO import ChangeDetector
+from .clockIO import ClockServer
 
 # ------------- SINGLE STREAM CLASSES -------------
 
@@ -22,51 +28,173 @@ class InputStreamSender:
         host: str = "127.0.0.1", 
         zmq_sender_queue_size: int = 10,
         frame_preprocessing: FramePreprocessing = None, 
-        invalid_frame_timeout: float = 1.):
+        invalid_frame_timeout: float = 1.,
+        connect_timeout: float = 5.,
+        node_id: str = None,
+        clock_endpoint: str = None,
+        registry_path: str = None,
+        wire_codec: str = "none",
+        wire_codec_level: int = None,
+        compression_workers: int = 0,
+        derived_streams: List[DerivedStream] = [],
+        change_detection: ChangeDetection = None):
         self.logger = getLogger(f"{self.__class__.__name__}:{device.name}")
         
+        assert len(derived_streams) == 0 or isinstance(device, CameraDevice), "derived streams are only supported for cameras"
+        assert change_detection is None or isinstance(device, CameraDevice), "change detection is only supported for cameras"
+        assert len(set([stream.name for stream in derived_streams])) == len(derived_streams), "derived stream names must be unique"
+        
         self.device = device
         self.host = host
         self.proxy_port = proxy_sub_port
         self.frame_preprocessing = frame_preprocessing
         self.zmq_sender_queue_size = zmq_sender_queue_size
+        self.node_id = node_id
+        self.clock_endpoint = clock_endpoint
+        # with a registry the sender binds its own PUB socket on host and registers it, instead of connecting to the proxy
+        self.registry_path = registry_path
+        self.wire_codec = wire_codec
+        self.wire_codec_level = wire_codec_level
+        self.compression_workers = compression_workers
+        # published next to the captured frames, produced once here so preview consumers do not receive full resolution
+        self.derived_streams = derived_streams
+        # suppresses unchanged frames of static scenes and publishes motion start and stop packets, see motionIO
+        self.change_detection = change_detection
         
         # timeouts
         self.invalid_frame_timeout = invalid_frame_timeout
+        self.connect_timeout = connect_timeout
         
         # for multiprocessing
         self.stop_event = Event()
+        self.ready_event = Event() # set by the process once the device is open and the socket is connected
+        self.pause_event = Event() # while set the device is kept open and read but frames are not sent
+        self.heartbeat = Value("d", 0., lock=False) # time.monotonic() of the last frame read by the process
         self.process = None
     
     def is_active(self): return self.process is not None
     
-    def start_process(self):
+    def is_alive(self): return self.process is not None and self.process.is_alive()
+    
+    def is_paused(self): return self.pause_event.is_set()
+    
+    def heartbeat_age(self) -> float:
+        return time.monotonic() - self.heartbeat.value
+    
+    def _derived_size(self, width: int, height: int, derived_stream: DerivedStream) -> tuple:
+        """frame size of derived_stream for frames of width x height, frames are never upscaled"""
+        if derived_stream.width is None or derived_stream.width >= width:
+            return width, height
+        return derived_stream.width, max(1, round(height * derived_stream.width / width))
+    
+    def stream_descriptor(self, stream: str = FULL_STREAM) -> StreamDescriptor:
+        descriptor = StreamDescriptor(device_id=self.device.device_id, device_name=self.device.name, stream=stream, frame_preprocessing=self.frame_preprocessing)
+        if isinstance(self.device, CameraDevice):
+            # the reader converts frames to rgb24, rotating by 90 degrees swaps width and height
+            rotated = self.frame_preprocessing in (FramePreprocessing.ROTATE_90_CLOCKWISE, FramePreprocessing.ROTATE_90_COUNTERCLOCKWISE)
+            descriptor.width = self.device.height if rotated else self.device.width
+            descriptor.height = self.device.width if rotated else self.device.height
+            descriptor.pixel_format = "rgb24"
+            descriptor.suppressed = self.change_detection is not None and self.change_detection.suppress
+            
+            if stream != FULL_STREAM:
+                derived_stream = [derived for derived in self.derived_streams if derived.name == stream][0]
+                descriptor.width, descriptor.height = self._derived_size(descriptor.width, descriptor.height, derived_stream)
+        return descriptor
+    
+    def _derived_packet(self, frame_packet: FramePacket, derived_stream: DerivedStream, sequence: int) -> FramePacket:
+        height, width = frame_packet.frame.shape[:2]
+        derived_width, derived_height = self._derived_size(width, height, derived_stream)
+        
+        frame = frame_packet.frame
+        if (derived_width, derived_height) != (width, height):
+            frame = resize_frame(frame, derived_width, derived_height)
+        
+        return frame_packet.model_copy(update={"frame": frame, "sequence": sequence})
+    
+    def pause(self):
+        self.pause_event.set()
+    
+    def resume(self):
+        self.pause_event.clear()
+    
+    def start_process(self, ready_timeout: float = 10, abort: ThreadEvent = None) -> Union[float, None]:
+        """
+        Start the sender process and wait for its ready signal.
+        Returns the startup latency in seconds or None if the process did not become ready within ready_timeout.
+        The wait ends early when the sender is signaled to stop or abort is set, the process is stopped by stop_process then.
+        """
         
         assert not self.is_active(), "trying to start a process that has already started ..."
         
+        dt = time.perf_counter()
+        
         self.stop_event.clear()
+        self.ready_event.clear()
+        self.heartbeat.value = time.monotonic() # startup grace period starts now
         self.process = Process(target=self._run)
         self.process.start()
         
-    def stop_process(self, timeout=1):
+        # wait for the ready signal, stop waiting early if the process died during startup or is stopped
+        while not self.ready_event.wait(0.01):
+            if self.stop_event.is_set() or (abort is not None and abort.is_set()):
+                self.logger.warning("startup aborted")
+                return None
+            if not self.process.is_alive() or time.perf_counter() - dt > ready_timeout:
+                self.logger.error(f"process did not become ready (alive: {self.process.is_alive()})")
+                return None
+        
+        latency = time.perf_counter() - dt
+        self.logger.info(f"ready after {latency:.3f}s")
+        return latency
         
+    def signal_stop(self):
         self.stop_event.set()
+    
+    def stop_process(self, timeout=1, kill_timeout=0.5):
+        
+        self.signal_stop()
         
         if self.process is None: return
         
-        try:
-            self.process.join(timeout=timeout)
-        except ProcessTimeoutError:
+        self.process.join(timeout=timeout)
+        if self.process.is_alive():
             self.logger.warning("process join timeout, terminating ...")
             self.process.terminate()
-            self.process.join()
+            self.process.join(timeout=kill_timeout)
+        if self.process.is_alive():
+            self.logger.warning("process did not terminate, killing ...")
+            self.process.kill()
+            self.process.join(timeout=kill_timeout)
+        if self.process.is_alive():
+            self.logger.error("process did not exit after kill")
         
         self.process = None
+    
+    def restart_process(self, timeout=1, abort: ThreadEvent = None):
+        self.logger.info("restarting ...")
+        self.stop_process(timeout=timeout)
+        if abort is not None and abort.is_set():
+            return
+        self.start_process(abort=abort)
         
     def _run(self):
         
         # crteate zmq sender
-        zmq_sender = ZMQSender(host=self.host, port=self.proxy_port, q_size=self.zmq_sender_queue_size, name=self.device.name)
+        direct = self.registry_path is not None
+        zmq_sender = ZMQSender(
+            host=self.host,
+            port=0 if direct else self.proxy_port,
+            q_size=self.zmq_sender_queue_size,
+            name=self.device.name,
+            node_id=self.node_id,
+            clock_endpoint=self.clock_endpoint,
+            bind=direct,
+            codec=self.wire_codec,
+            codec_level=self.wire_codec_level,
+            compression_workers=self.compression_workers
+        )
+        registry = EndpointRegistry(self.registry_path) if direct else None
         
         # create device reader
         if isinstance(self.device, CameraDevice):
@@ -86,10 +214,28 @@ class InputStreamSender:
         else:
             preprocess = lambda frame: frame
         
+        # sequence numbers are stamped here, for the packets that are meant to be sent, so paused frames do not show up as gaps
+        sequence = 0
+        # every derived stream counts its own packets, decimated frames are not gaps
+        derived_sequences = {derived_stream.name: 0 for derived_stream in self.derived_streams}
+        
+        change_detector = None
+        motion_sequence = 0
+        if self.change_detection is not None:
+            change_detector = ChangeDetector(self.change_detection, name=self.device.name)
+        
         # start continuous read frame -> preprocess -> send frame
         try:
+            # without a connection the sender is not ready, start_process reports it through the exited process
+            if not zmq_sender.start(connect_timeout=self.connect_timeout):
+                self.logger.error(f"not connected to the proxy after {self.connect_timeout}s, exiting")
+                return
+            if registry is not None:
+                registry.register(self.device.name, zmq_sender.endpoint, device_id=self.device.device_id)
             device_reader.start()
-            zmq_sender.start()
+            
+            self.heartbeat.value = time.monotonic()
+            self.ready_event.set()
             
             while not self.stop_event.is_set():
                 
@@ -101,12 +247,41 @@ class InputStreamSender:
                     sleep(self.invalid_frame_timeout)
                     continue
                 
+                self.heartbeat.value = time.monotonic()
+                
+                # keep draining the device while paused so it stays warm and no stale frames are sent on resume
+                if self.pause_event.is_set():
+                    continue
+                
                 # preprocess frame
                 frame_packet.frame = preprocess(frame_packet.frame)
                 
+                # suppressed frames get no sequence number, receivers do not count them as lost
+                if change_detector is not None:
+                    publish, motion_event = change_detector.update(frame_packet.frame, frame_packet.capture_ns)
+                    frame_packet.motion = change_detector.in_motion
+                    
+                    if motion_event is not None and self.change_detection.motion_events:
+                        motion_packet = frame_packet.model_copy(update={"frame": np.zeros(0, dtype=np.uint8), "sequence": motion_sequence})
+                        motion_sequence += 1
+                        zmq_sender.send(motion_packet, stream=MOTION_STREAM)
+                    
+                    if not publish:
+                        continue
+                
+                frame_packet.sequence = sequence
+                sequence += 1
+                
                 # send frame
                 zmq_sender.send(frame_packet)
                 
+                for derived_stream in self.derived_streams:
+                    if frame_packet.sequence % derived_stream.decimation != 0:
+                        continue
+                    derived_packet = self._derived_packet(frame_packet, derived_stream, derived_sequences[derived_stream.name])
+                    derived_sequences[derived_stream.name] += 1
+                    zmq_sender.send(derived_packet, stream=derived_stream.name)
+                
                 send_time = (time.perf_counter() - dt)
                 if send_time > 0:
                     self.logger.debug(f"frame read and sent with fps {1 / send_time}")
@@ -114,15 +289,39 @@ class InputStreamSender:
         except Exception as e:
             raise e
         finally:
+            if registry is not None:
+                registry.unregister(self.device.name)
             zmq_sender.stop()
             device_reader.stop()
 
 class InputStreamReceiver:
     
-    def __init__(self, devices: List[PeripheryDevice], proxy_pub_port: int, host: str = "127.0.0.1", zmq_receiver_queue_size: int = 10):
+    def __init__(
+        self,
+        devices: List[PeripheryDevice],
+        proxy_pub_port: int,
+        host: str = "127.0.0.1",
+        zmq_receiver_queue_size: int = 10,
+        clock_sync: bool = True,
+        registry_path: str = None,
+        stream: str = FULL_STREAM,
+        max_rate: float = None,
+        max_rates: Dict[str, float] = {}):
         self.logger = getLogger(f"{self.__class__.__name__}" )
         self.devices = devices
-        self.zmq_receiver = ZMQReceiver(host=host, port=proxy_pub_port, q_size=zmq_receiver_queue_size)
+        # with a registry path the senders are connected directly and proxy_pub_port is not used
+        registry = EndpointRegistry(registry_path) if registry_path is not None else None
+        # max_rate and max_rates by device name limit the received packets per second, e.g. for snapshots or dashboards
+        self.zmq_receiver = ZMQReceiver(
+            host=host,
+            port=proxy_pub_port,
+            q_size=zmq_receiver_queue_size,
+            clock_sync=clock_sync,
+            registry=registry,
+            stream=stream,
+            max_rate=max_rate,
+            max_rates=max_rates
+        )
         self.running = False
     
     def start(self):
@@ -132,11 +331,19 @@ class InputStreamReceiver:
     def stop(self):
         self.running = False
         self.zmq_receiver.stop()
-        
-    def read(self, read_attemps: int = 10):
+        for counters in self.zmq_receiver.stream_counters.values():
+            self.logger.info(f"stream counters: {counters}")
+        
+    def read(self, read_attemps: int = 10, device_ids: Set[str] = None):
+        """
+        Latest packet of every device, with device_ids return once these devices sent a packet,
+        together with the packets of the other devices received in the meantime.
+        """
         output = {}
+        if device_ids is None:
+            device_ids = set([device.device_id for device in self.devices])
         
-        while len(output) < len(self.devices) and self.running:
+        while not device_ids.issubset(output) and self.running:
             
             if read_attemps <= 0:
                 return None
@@ -148,13 +355,205 @@ class InputStreamReceiver:
                 continue
             if frame_packet.device.device_id in output:
                 read_attemps -= 1
+                # the older packet of the device is replaced before it was consumed
+                self.count_consumer_drop(frame_packet.device.device_id)
             
             output[frame_packet.device.device_id] = frame_packet
         
         return output
+    
+    def poll(self, timeout_ms: int = 0) -> bool:
+        """True if a packet can be read without waiting longer than timeout_ms"""
+        return self.zmq_receiver.is_active() and self.zmq_receiver.socket.poll(timeout_ms) > 0
+    
+    def count_consumer_drop(self, device_id: str):
+        """for consumers that discard received packets, e.g. when their work queue is full"""
+        counters = self.zmq_receiver.stream_counters.setdefault(device_id, StreamCounters(device_id=device_id))
+        counters.consumer_dropped += 1
+    
+    def counters(self) -> Dict[str, StreamCounters]:
+        """per device sequence gap counters of the received streams"""
+        return {device_id: counters.model_copy() for device_id, counters in self.zmq_receiver.stream_counters.items()}
+    
+    def read_packet(self, read_attemps: int = 10) -> Union[FramePacket, None]:
+        """
+        Next packet of any of the devices, for streams like audio where every packet is needed.
+        """
+        device_ids = set([device.device_id for device in self.devices])
+        
+        while read_attemps > 0 and self.running:
+            
+            frame_packet = self.zmq_receiver.receive()
+            
+            if frame_packet is not None and frame_packet.device.device_id in device_ids:
+                return frame_packet
+            
+            read_attemps -= 1
+        
+        return None
+
+# ------------- SUPERVISION -------------
+
+class _SupervisedProcess:
+    def __init__(self, name: str, is_alive: Callable[[], bool], restart: Callable[[], None], heartbeat_age: Callable[[], float] = None):
+        self.name = name
+        self.is_alive = is_alive
+        self.restart = restart
+        self.heartbeat_age = heartbeat_age
+        
+        self.state = ProcessState.STARTING
+        self.restarts = 0
+        self.failures = 0 # consecutive failures, reset once the process has been stable
+        self.started_at = time.monotonic()
+        self.next_restart_at = 0.
+
+class ProcessSupervisor:
+    """
+    Thread monitoring sender and proxy processes, restarting them with exponential backoff
+    when they die or stop sending heartbeats.
+    """
+    
+    def __init__(
+        self,
+        input_senders: List[InputStreamSender],
+        zmq_proxy: Union[ZMQProxy, None] = None,
+        check_interval: float = 0.5,
+        heartbeat_timeout: float = 10.,
+        backoff_initial: float = 1.,
+        backoff_max: float = 30.,
+        stable_after: float = 30.,
+        on_health_change: Callable[[Dict[str, ProcessHealth]], None] = None):
+        self.logger = getLogger(self.__class__.__name__)
+        
+        self.check_interval = check_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.on_health_change = on_health_change
+        
+        # set by stop, it also aborts a sender restart that waits for the ready signal
+        self.lock = Lock()
+        self.stop_event = ThreadEvent()
+        self.thread = None
+        
+        self.supervised = [
+            _SupervisedProcess(
+                name=sender.device.name,
+                is_alive=sender.is_alive,
+                restart=lambda sender=sender: sender.restart_process(abort=self.stop_event),
+                heartbeat_age=sender.heartbeat_age
+            ) for sender in input_senders
+        ]
+        if zmq_proxy is not None:
+            self.supervised.append(_SupervisedProcess(
+                name=zmq_proxy.__class__.__name__,
+                is_alive=zmq_proxy.is_active,
+                restart=zmq_proxy.restart_process
+            ))
+    
+    def is_active(self): return self.thread is not None
+    
+    def start(self):
+        assert not self.is_active(), "trying to start a supervisor that has already started"
+        
+        now = time.monotonic()
+        for entry in self.supervised:
+            entry.state = ProcessState.STARTING
+            entry.started_at = now
+        
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def stop(self, timeout: float = None):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            if self.thread.is_alive():
+                self.logger.warning(f"supervisor did not stop within {timeout}s")
+        self.thread = None
+        
+        with self.lock:
+            for entry in self.supervised:
+                entry.state = ProcessState.STOPPED
+    
+    def health(self) -> Dict[str, ProcessHealth]:
+        with self.lock:
+            return {
+                entry.name: ProcessHealth(
+                    name=entry.name,
+                    state=entry.state,
+                    restarts=entry.restarts,
+                    heartbeat_age=entry.heartbeat_age() if entry.heartbeat_age is not None else None
+                ) for entry in self.supervised
+            }
+    
+    def _check(self, entry: _SupervisedProcess) -> ProcessState:
+        now = time.monotonic()
+        
+        if not entry.is_alive():
+            return ProcessState.DEAD
+        if entry.heartbeat_age is not None and entry.heartbeat_age() > self.heartbeat_timeout:
+            return ProcessState.STALLED
+        if entry.heartbeat_age is None and now - entry.started_at < self.check_interval:
+            return ProcessState.STARTING
+        
+        # reset backoff once the process has been running stable for long enough
+        if entry.failures > 0 and now - entry.started_at > self.stable_after:
+            entry.failures = 0
+        
+        return ProcessState.RUNNING
+    
+    def _restart(self, entry: _SupervisedProcess):
+        now = time.monotonic()
+        if now < entry.next_restart_at or self.stop_event.is_set():
+            return
+        
+        self.logger.warning(f"{entry.name} is {entry.state.value}, restarting (attempt {entry.failures + 1}) ...")
+        
+        try:
+            entry.restart()
+        except Exception as e:
+            self.logger.error(f"failed to restart {entry.name}: {e}")
+        
+        entry.restarts += 1
+        entry.failures += 1
+        entry.started_at = time.monotonic()
+        entry.next_restart_at = entry.started_at + min(self.backoff_initial * 2 ** (entry.failures - 1), self.backoff_max)
+    
+    def _run(self):
+        while not self.stop_event.wait(self.check_interval):
+            
+            changed = False
+            for entry in self.supervised:
+                
+                state = self._check(entry)
+                
+                with self.lock:
+                    changed = changed or state != entry.state
+                    entry.state = state
+                
+                if state in (ProcessState.DEAD, ProcessState.STALLED):
+                    self._restart(entry)
+            
+            if changed:
+                health = self.health()
+                self.logger.info("health: " + ", ".join([f"{k}={v.state.value}" for k, v in health.items()]))
+                if self.on_health_change is not None:
+                    try:
+                        self.on_health_change(health)
+                    except Exception as e:
+                        self.logger.error(f"health change callback failed: {e}")
 
 # ------------- MULTI STREAM CLASSES -------------
 
+def join_processes(processes: List[Process], timeout: float):
+    """join all processes against one deadline, timeout seconds from now"""
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        process.join(timeout=max(deadline - time.monotonic(), 0))
+
 class MultiInputStreamSender:
     
     def __init__(
@@ -164,43 +563,159 @@ class MultiInputStreamSender:
         proxy_pub_port: int, 
         host: str = "127.0.0.1", 
         zmq_proxy_queue_size: int = 10,
+        zmq_proxy_options: ProxyOptions = ProxyOptions(),
         zmq_sender_queue_size: int = 10,
-        frame_preprocessings: Dict[str, FramePreprocessing] = []):
+        frame_preprocessings: Dict[str, FramePreprocessing] = {},
+        supervise: bool = False,
+        heartbeat_timeout: float = 10.,
+        on_health_change: Callable[[Dict[str, ProcessHealth]], None] = None,
+        clock_port: int = None,
+        clock_host: str = None,
+        node_id: str = None,
+        registry_path: str = None,
+        wire_codec: str = "none",
+        wire_codec_level: int = None,
+        compression_workers: int = 0,
+        derived_streams: Dict[str, List[DerivedStream]] = {},
+        change_detection: ChangeDetection = None):
         self.logger = getLogger(self.__class__.__name__)
         
+        # receivers on other hosts estimate the clock offset of this node through the clock server
+        self.node_id = node_id if node_id is not None else gethostname()
+        self.clock_server = None
+        clock_endpoint = None
+        if clock_port is not None:
+            self.clock_server = ClockServer(host, clock_port, node_id=self.node_id)
+            clock_endpoint = f"tcp://{clock_host if clock_host is not None else host}:{clock_port}"
+        
         self.input_sender = [
             InputStreamSender(
                 device = device, 
                 proxy_sub_port = proxy_sub_port, 
                 host = host,
                 zmq_sender_queue_size = zmq_sender_queue_size,
-                frame_preprocessing = frame_preprocessings.get(device.name, None)
+                frame_preprocessing = frame_preprocessings.get(device.name, None),
+                node_id = self.node_id,
+                clock_endpoint = clock_endpoint,
+                registry_path = registry_path,
+                wire_codec = wire_codec,
+                wire_codec_level = wire_codec_level,
+                compression_workers = compression_workers,
+                derived_streams = derived_streams.get(device.name, []),
+                change_detection = change_detection if isinstance(device, CameraDevice) else None
             ) 
             for device in devices
         ]
-        self.zmq_proxy = ZMQProxy(host, sub_port=proxy_sub_port, pub_port=proxy_pub_port, queue_size=zmq_proxy_queue_size)
+        # in the direct topology every sender binds its own socket and there is no proxy in the data path
+        self.zmq_proxy = None
+        if registry_path is None:
+            self.zmq_proxy = ZMQProxy(host, sub_port=proxy_sub_port, pub_port=proxy_pub_port, queue_size=zmq_proxy_queue_size, options=zmq_proxy_options)
+        
+        self.supervisor = None
+        if supervise:
+            self.supervisor = ProcessSupervisor(
+                input_senders=self.input_sender,
+                zmq_proxy=self.zmq_proxy,
+                heartbeat_timeout=heartbeat_timeout,
+                on_health_change=on_health_change
+            )
         
         self.logger.info(f"multi input stream sender with {len(self.input_sender)} senders")
+    
+    def health(self) -> Dict[str, ProcessHealth]:
+        assert self.supervisor is not None, "health is only available with supervise=True"
+        return self.supervisor.health()
+    
+    def is_paused(self) -> bool:
+        return all([sub.is_paused() for sub in self.input_sender])
+    
+    def stream_descriptors(self, stream: str = FULL_STREAM) -> Dict[str, StreamDescriptor]:
+        """geometry and pixel format of the published frames per device name, to configure receivers before the first frame"""
+        return {
+            sub.device.name: sub.stream_descriptor(stream) for sub in self.input_sender
+            if stream == FULL_STREAM or stream in [derived_stream.name for derived_stream in sub.derived_streams]
+        }
+    
+    def pause(self):
+        for sub in self.input_sender:
+            sub.pause()
+    
+    def resume(self):
+        for sub in self.input_sender:
+            sub.resume()
         
-    def start_processes(self):
+    def start_processes(self, ready_timeout: float = 10, paused: bool = False) -> Dict[str, Union[float, None]]:
+        """
+        Start the proxy and all senders in parallel and wait until they are ready.
+        Returns the startup latency in seconds per device name, None for devices that did not become ready.
+        With paused=True devices are opened but frames are only sent after resume.
+        """
         
-        self.zmq_proxy.start_process()
+        if paused:
+            self.pause()
+        else:
+            self.resume()
+        
+        if self.zmq_proxy is not None:
+            self.zmq_proxy.start_process()
+        if self.clock_server is not None:
+            self.clock_server.start()
         
         # start all input senders in parallel
-        thread_pool_executor = ThreadPoolExecutor(max_workers=len(self.input_sender))
+        with ThreadPoolExecutor(max_workers=len(self.input_sender)) as thread_pool_executor:
+            
+            futures = [thread_pool_executor.submit(sub.start_process, ready_timeout) for sub in self.input_sender]
+            
+            # wait for all senders to be ready
+            latencies = {sub.device.name: future.result() for sub, future in zip(self.input_sender, futures)}
+        
+        self.logger.info("startup latencies: " + ", ".join([f"{k}={v if v is None else round(v, 3)}" for k, v in latencies.items()]))
+        
+        if self.supervisor is not None:
+            self.supervisor.start()
         
-        futures = [thread_pool_executor.submit(sub.start_process) for sub in self.input_sender]
+        return latencies
         
-        # wait for all senders to start
-        results = [future.result(timeout=5) for future in futures]
-        return results
+    def stop_processes(self, timeout: float = 5, kill_timeout: float = 0.5):
+        """
+        Stop all senders and the proxy. Senders that did not exit within timeout are terminated together and then killed
+        together, kill_timeout each, and the proxy gets the same ladder, so the total is at most timeout + 5 * kill_timeout.
+        """
+        deadline = time.monotonic() + timeout
         
-    def stop_processes(self, timeout: float = 1):
+        # stop supervising first so stopped processes are not restarted, a restart in flight is aborted
+        if self.supervisor is not None:
+            self.supervisor.stop(timeout=max(deadline - time.monotonic(), 0))
         
+        # signal all senders at once so they shut down in parallel, then collect them against the shared deadline
         for sub in self.input_sender:
-            sub.stop_process(timeout=timeout)
+            sub.signal_stop()
+        
+        processes = [sub.process for sub in self.input_sender if sub.process is not None]
+        join_processes(processes, deadline - time.monotonic())
+        
+        stragglers = [process for process in processes if process.is_alive()]
+        if len(stragglers) > 0:
+            self.logger.warning(f"{len(stragglers)} senders did not stop within {timeout}s, terminating ...")
+            for process in stragglers:
+                process.terminate()
+            join_processes(stragglers, kill_timeout)
+        
+        stragglers = [process for process in stragglers if process.is_alive()]
+        if len(stragglers) > 0:
+            self.logger.warning(f"{len(stragglers)} senders did not terminate, killing ...")
+            for process in stragglers:
+                process.kill()
+            join_processes(stragglers, kill_timeout)
+        
+        for sub in self.input_sender:
+            sub.process = None
+        
+        if self.zmq_proxy is not None:
+            self.zmq_proxy.stop_process(timeout=max(deadline - time.monotonic(), kill_timeout), kill_timeout=kill_timeout)
         
-        self.zmq_proxy.stop_process()
+        if self.clock_server is not None:
+            self.clock_server.stop()
         
         
 
@@ -0,0 +1,193 @@
+import zmq
+
+from logging import getLogger
+from threading import Thread, Lock
+from threading import Event as ThreadEvent
+from contextlib import contextmanager
+from uuid import uuid4
+
+from .core import MultiInputStreamSender
+
+# ------------- CAPTURE DAEMON -------------
+
+class CaptureDaemon:
+    """
+    Keeps the device processes of a MultiInputStreamSender warm between capture sessions.
+    
+    The devices are opened once and stay paused until a session attaches over the control socket,
+    frames are published while at least one session is attached.
+    Control requests are json dicts {"command": ..., "session": ...} answered with {"ok": ..., "status": ...}.
+    """
+    
+    COMMANDS = ("attach", "detach", "pause", "resume", "status", "shutdown")
+    
+    def __init__(self, multi_sender: MultiInputStreamSender, control_port: int, host: str = "127.0.0.1", receive_wait_time_ms: int = 100):
+        self.logger = getLogger(f"{self.__class__.__name__}@{host}:{control_port}")
+        
+        self.multi_sender = multi_sender
+        self.host = host
+        self.control_port = control_port
+        self.receive_wait_time_ms = receive_wait_time_ms
+        
+        self.sessions = set()
+        self.startup_latencies = {}
+        
+        self.lock = Lock()
+        self.stop_event = ThreadEvent()
+        self.thread = None
+    
+    def is_active(self): return self.thread is not None
+    
+    def start(self, ready_timeout: float = 10):
+        self.logger.info("starting ...")
+        
+        assert not self.is_active(), "trying to start a daemon that has already started"
+        
+        # open all devices once, nothing is sent until a session attaches
+        self.startup_latencies = self.multi_sender.start_processes(ready_timeout=ready_timeout, paused=True)
+        
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        
+        self.logger.info("started !")
+    
+    def stop(self, timeout: float = 5):
+        self.logger.info("stopping ...")
+        
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+        
+        self.multi_sender.stop_processes(timeout=timeout)
+        self.sessions.clear()
+        
+        self.logger.info("stopped !")
+    
+    def serve_forever(self):
+        """
+        Block until a shutdown command is received or the process is interrupted, then stop.
+        """
+        try:
+            while not self.stop_event.wait(1):
+                pass
+        except KeyboardInterrupt:
+            self.logger.info("interrupted")
+        finally:
+            self.stop()
+    
+    def status(self) -> dict:
+        with self.lock:
+            status = {
+                "sessions": sorted(self.sessions),
+                "paused": self.multi_sender.is_paused(),
+                "startup_latencies": self.startup_latencies,
+                "streams": {k: v.model_dump(mode="json") for k, v in self.multi_sender.stream_descriptors().items()},
+            }
+        if self.multi_sender.supervisor is not None:
+            status["health"] = {k: v.model_dump(mode="json") for k, v in self.multi_sender.health().items()}
+        return status
+    
+    def handle(self, request: dict) -> dict:
+        command = request.get("command")
+        session = request.get("session")
+        
+        if command not in self.COMMANDS:
+            return {"ok": False, "error": f"unknown command {command}, expected one of {self.COMMANDS}"}
+        
+        with self.lock:
+            if command == "attach":
+                assert session is not None, "attach requires a session id"
+                self.sessions.add(session)
+                self.multi_sender.resume()
+            elif command == "detach":
+                self.sessions.discard(session)
+                if len(self.sessions) == 0:
+                    self.multi_sender.pause()
+            elif command == "pause":
+                self.multi_sender.pause()
+            elif command == "resume":
+                self.multi_sender.resume()
+            elif command == "shutdown":
+                self.stop_event.set()
+        
+        self.logger.info(f"{command} from session {session}")
+        
+        return {"ok": True, "status": self.status()}
+    
+    def _run(self):
+        
+        context = zmq.Context()
+        socket = context.socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.setsockopt(zmq.RCVTIMEO, self.receive_wait_time_ms)
+        
+        try:
+            socket.bind(f"tcp://{self.host}:{self.control_port}")
+            
+            while not self.stop_event.is_set():
+                try:
+                    request = socket.recv_json()
+                except zmq.error.Again:
+                    continue
+                
+                try:
+                    response = self.handle(request)
+                except Exception as e:
+                    self.logger.error(f"failed to handle {request}: {e}")
+                    response = {"ok": False, "error": str(e)}
+                
+                socket.send_json(response)
+        finally:
+            socket.close()
+            context.term()
+
+class CaptureDaemonClient:
+
+    def __init__(self, control_port: int, host: str = "127.0.0.1", timeout_ms: int = 5000):
+        self.logger = getLogger(f"{self.__class__.__name__}@{host}:{control_port}")
+        
+        self.host = host
+        self.control_port = control_port
+        self.timeout_ms = timeout_ms
+        self.session = uuid4().hex
+    
+    def request(self, command: str) -> dict:
+        
+        # a fresh REQ socket per request so a lost reply can not wedge the client
+        context = zmq.Context()
+        socket = context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.setsockopt(zmq.RCVTIMEO, self.timeout_ms)
+        socket.setsockopt(zmq.SNDTIMEO, self.timeout_ms)
+        
+        try:
+            socket.connect(f"tcp://{self.host}:{self.control_port}")
+            socket.send_json({"command": command, "session": self.session})
+            response = socket.recv_json()
+        except zmq.error.Again:
+            raise TimeoutError(f"capture daemon did not answer {command} within {self.timeout_ms}ms")
+        finally:
+            socket.close()
+            context.term()
+        
+        if not response["ok"]:
+            raise RuntimeError(f"capture daemon rejected {command}: {response['error']}")
+        
+        return response["status"]
+    
+    def attach(self) -> dict: return self.request("attach")
+    def detach(self) -> dict: return self.request("detach")
+    def pause(self) -> dict: return self.request("pause")
+    def resume(self) -> dict: return self.request("resume")
+    def status(self) -> dict: return self.request("status")
+    def shutdown(self) -> dict: return self.request("shutdown")
+    
+    @contextmanager
+    def attached(self):
+        self.attach()
+        try:
+            yield self
+        finally:
+            self.detach()
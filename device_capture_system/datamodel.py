@@ -1,8 +1,8 @@
 # from abc import ABC, abstractmethod
 from enum import Enum
-from typing import Union, Any
+from typing import Union, Any, Literal, List, Dict, ClassVar
 from typing_extensions import Annotated
-from pydantic import BaseModel, field_validator, Field, StrictStr, Strict, StrictInt, StrictFloat
+from pydantic import BaseModel, field_validator, model_validator, Field, StrictStr, Strict, StrictInt, StrictFloat, StrictBool
 from dataclasses import dataclass
 from numpy import ndarray, uint8, int16
 from datetime import datetime
@@ -17,6 +17,18 @@ class FramePreprocessing(Enum):
     ROTATE_90_COUNTERCLOCKWISE = "rotate_90_counterclockwise"
     ROTATE_180 = "rotate_180"
 
+class BackpressurePolicy(Enum):
+    BLOCK = "block" # wait for a free slot
+    DROP_OLDEST = "drop_oldest" # discard the longest waiting item to make room
+    DROP_NEWEST = "drop_newest" # discard the item being submitted
+
+class ProcessState(Enum):
+    STARTING = "starting"
+    RUNNING = "running"
+    STALLED = "stalled"
+    DEAD = "dead"
+    STOPPED = "stopped"
+
 # ---------- DEVICE CLASSES ----------
 
 class PeripheryDevice(BaseModel):
@@ -34,6 +46,8 @@ class AudioDevice(PeripheryDevice):
     channels: Annotated[StrictInt, Field(ge=1)]
     sample_rate: Annotated[StrictInt, Field(ge=8000, le=192000)] # sample rate in Hz
     sample_size: Annotated[StrictInt, Field(ge=8, le=32)] # sample size in bits
+    audio_buffer_size: Union[Annotated[StrictInt, Field(ge=1)], None] = None # device buffer in ms, None uses the driver default
+    chunk_duration_ms: Union[Annotated[StrictInt, Field(ge=1)], None] = None # samples sent per packet, None sends every libav frame
 
 # ---------- MEDIA CLASSES ----------
 
@@ -43,23 +57,168 @@ class MediaFile(BaseModel):
     file_extension: StrictNonEmptyStr
 
 class VideoFile(MediaFile):
-    width: Annotated[StrictInt, Field(ge=640, le=3840)]
-    height: Annotated[StrictInt, Field(ge=480, le=2160)]
+    width: Annotated[StrictInt, Field(ge=1, le=7680)] # of the received frames, rotated cameras are taller than wide
+    height: Annotated[StrictInt, Field(ge=1, le=7680)]
+    input_pixel_format: StrictNonEmptyStr = "rgb24" # pixel format of the received frames
     fps: Annotated[StrictFloat, Field(ge=15, le=120)]
     seconds: Annotated[StrictFloat, Field(ge=1)] # Number of seconds in output video
     codec: StrictNonEmptyStr
+    codec_fallbacks: List[StrictNonEmptyStr] = [] # tried in order when codec is not available, see videoIO.add_video_stream
+    preset: Union[StrictNonEmptyStr, None] = None # x264 style options, None uses the encoder default
+    tune: Union[StrictNonEmptyStr, None] = None
+    crf: Union[Annotated[StrictInt, Field(ge=0, le=51)], None] = None # ignored when bit_rate is set
+    bit_rate: Union[Annotated[StrictInt, Field(gt=0)], None] = None
+    threads: Annotated[StrictInt, Field(ge=0)] = 0 # 0 lets the encoder decide
+    thread_type: Union[Literal["SLICE", "FRAME", "AUTO"], None] = None # slice threading adds no latency, frame threading scales further
+    codec_options: Dict[StrictNonEmptyStr, Dict[StrictNonEmptyStr, StrictStr]] = {} # extra libav options per encoder name
 
 class ImageFile(MediaFile):
     jpg_quality: Annotated[StrictInt, Field(ge=0, le=100)]
     png_compression: Annotated[StrictInt, Field(ge=0, le=9)]
+    jpg_subsampling: Union[Literal["4:4:4", "4:2:2", "4:2:0"], None] = None # None uses the encoder default
+    jpg_optimize: StrictBool = False
+    jpg_progressive: StrictBool = False
+    webp_quality: Annotated[StrictInt, Field(ge=1, le=100)] = 80
+    encoder: StrictNonEmptyStr = "auto" # image encoder backend, see imageIO.IMAGE_ENCODERS
+
+class AudioFile(MediaFile):
+    sample_rate: Annotated[StrictInt, Field(ge=8000, le=192000)] # input sample rate in Hz
+    channels: Annotated[StrictInt, Field(ge=1)]
+    segment_seconds: Union[Annotated[StrictFloat, Field(gt=0)], None] = None # None writes a single file
+    bit_rate: Union[Annotated[StrictInt, Field(gt=0)], None] = None # only used by lossy codecs
+
+class ShardRecord(BaseModel):
+    key: StrictNonEmptyStr
+    device: StrictNonEmptyStr
+    timestamp_ns: StrictInt
+    sequence: StrictInt = 0
+    shard: StrictNonEmptyStr # tar file name relative to the shard directory
+    member: StrictNonEmptyStr # name of the sample in the tar file
+    offset: Annotated[StrictInt, Field(ge=0)] # byte offset of the sample data in the tar file
+    size: Annotated[StrictInt, Field(ge=0)]
+
+# ---------- STREAM CLASSES ----------
+
+# topic of the captured frames of a device, derived streams are published under their own name
+FULL_STREAM = "full"
+# topic of the motion start and stop packets of senders with change detection, see motionIO
+MOTION_STREAM = "motion"
+
+class StreamDescriptor(BaseModel):
+    """what a sender publishes for a device, after preprocessing"""
+    device_id: StrictNonEmptyStr
+    device_name: StrictNonEmptyStr
+    stream: StrictNonEmptyStr = FULL_STREAM
+    frame_preprocessing: Union[FramePreprocessing, None] = None
+    width: Union[StrictInt, None] = None # None for audio devices
+    height: Union[StrictInt, None] = None
+    pixel_format: Union[StrictNonEmptyStr, None] = None
+    suppressed: StrictBool = False # unchanged frames of static scenes are only sent every keep_alive_seconds, see ChangeDetection
+
+class DerivedStream(BaseModel):
+    """an additional stream a sender publishes from the frames of a camera, e.g. a downscaled preview"""
+    name: Annotated[StrictNonEmptyStr, Field(pattern=r"^[^|]+$")] # topic of the stream
+    width: Union[Annotated[StrictInt, Field(ge=1)], None] = None # the height follows the aspect ratio, None keeps the size
+    decimation: Annotated[StrictInt, Field(ge=1)] = 1 # every decimation-th frame is published
+    
+    @field_validator("name")
+    def validate_name(cls, value):
+        if value in (FULL_STREAM, MOTION_STREAM):
+            raise ValueError(f"{value} is reserved for the captured and the motion stream")
+        return value
+
+class ChangeDetection(BaseModel):
+    """change detection of a sender on block averaged grayscale thumbnails of the frames, see motionIO.ChangeDetector"""
+    block_size: Annotated[StrictInt, Field(ge=1)] = 16 # pixels per side of a thumbnail block
+    block_threshold: Annotated[StrictFloat, Field(gt=0)] = 8. # gray level difference of a changed block
+    min_changed_fraction: Annotated[StrictFloat, Field(ge=0, le=1)] = 0.002 # fraction of changed blocks of a changed frame
+    suppress: StrictBool = True # unchanged frames are not sent
+    keep_alive_seconds: Annotated[StrictFloat, Field(gt=0)] = 1. # an unchanged frame is still sent after this long
+    motion_events: StrictBool = True # publish motion start and stop packets on the motion stream
+    motion_hold_seconds: Annotated[StrictFloat, Field(ge=0)] = 2. # motion stops after this long without a changed frame
+
+class ProxyOptions(BaseModel):
+    """context and socket tuning of the ZMQProxy process, None keeps the zmq default"""
+    io_threads: Annotated[StrictInt, Field(ge=1)] = 1
+    sndbuf: Union[Annotated[StrictInt, Field(ge=0)], None] = None # kernel socket buffers in bytes
+    rcvbuf: Union[Annotated[StrictInt, Field(ge=0)], None] = None
+    tcp_keepalive: Union[StrictBool, None] = None
+    tcp_keepalive_idle: Union[Annotated[StrictInt, Field(ge=1)], None] = None # seconds
+    tcp_keepalive_interval: Union[Annotated[StrictInt, Field(ge=1)], None] = None # seconds
+    tcp_keepalive_count: Union[Annotated[StrictInt, Field(ge=1)], None] = None
+    xsub_affinity: Union[Annotated[StrictInt, Field(ge=0)], None] = None # bitmask of the io threads that serve the sockets
+    xpub_affinity: Union[Annotated[StrictInt, Field(ge=0)], None] = None
+    cpu_affinity: Union[List[Annotated[StrictInt, Field(ge=0)]], None] = None # cpus the proxy process is pinned to, linux only
+
+# ---------- HEALTH CLASSES ----------
+
+class ProcessHealth(BaseModel):
+    name: StrictNonEmptyStr
+    state: ProcessState
+    restarts: Annotated[StrictInt, Field(ge=0)] = 0
+    heartbeat_age: Union[float, None] = None # seconds since the last heartbeat, None for processes without heartbeat
+
+class WorkQueueCounters(BaseModel):
+    submitted: Annotated[StrictInt, Field(ge=0)] = 0
+    queued: Annotated[StrictInt, Field(ge=0)] = 0 # currently waiting for a worker
+    in_progress: Annotated[StrictInt, Field(ge=0)] = 0
+    completed: Annotated[StrictInt, Field(ge=0)] = 0
+    failed: Annotated[StrictInt, Field(ge=0)] = 0
+    dropped: Annotated[StrictInt, Field(ge=0)] = 0
+
+class StreamCounters(BaseModel):
+    """packets of one device lost between reading and consuming, attributed by the stage that lost them"""
+    device_id: StrictNonEmptyStr
+    received: Annotated[StrictInt, Field(ge=0)] = 0
+    sender_dropped: Annotated[StrictInt, Field(ge=0)] = 0 # send HWM of the sender was full
+    transport_dropped: Annotated[StrictInt, Field(ge=0)] = 0 # proxy or receiver HWM, zmq does not tell them apart
+    duplicates: Annotated[StrictInt, Field(ge=0)] = 0 # sequence numbers that were received before, discarded
+    consumer_dropped: Annotated[StrictInt, Field(ge=0)] = 0 # received but replaced by a newer packet before it was consumed
+    sender_restarts: Annotated[StrictInt, Field(ge=0)] = 0
+    last_sequence: Union[StrictInt, None] = None
+    
+    @property
+    def lost(self) -> int:
+        return self.sender_dropped + self.transport_dropped + self.consumer_dropped
 
 # ---------- BASE CLASSES ----------
 
+def datetime_to_ns(dt: datetime) -> int:
+    """wall clock nanoseconds of dt without the rounding of float timestamps"""
+    return round(dt.timestamp() - dt.microsecond / 1e6) * 10 ** 9 + dt.microsecond * 1000
+
 class FramePacket(BaseModel):
+    """
+    A frame or audio chunk with integer wall clock (time.time_ns) timestamps.
+    capture_ns is derived from the device pts when the device provides one (see deviceIO.FFMPEGReader),
+    for audio it is the capture time of the first sample.
+    The datetime properties are only computed on access, start_read_dt and end_read_dt are still accepted as arguments.
+    """
+    
+    HEADER_FIELDS: ClassVar[tuple] = ("start_read_ns", "end_read_ns", "capture_ns", "capture_monotonic_ns", "device_pts_ns", "sequence", "motion")
+    
     device: PeripheryDevice
     frame: Any
-    start_read_dt: datetime
-    end_read_dt: datetime
+    start_read_ns: StrictInt # wall clock before the blocking read
+    end_read_ns: StrictInt # wall clock after the frame was decoded
+    capture_ns: StrictInt # wall clock of the capture, end_read_ns if unknown
+    capture_monotonic_ns: Union[StrictInt, None] = None # time.monotonic_ns of the capture on the reading host
+    device_pts_ns: Union[StrictInt, None] = None # presentation timestamp of the device clock
+    sequence: Annotated[StrictInt, Field(ge=0)] = 0 # per device frame counter
+    motion: Union[StrictBool, None] = None # motion state of senders with change detection
+    
+    @model_validator(mode="before")
+    @classmethod
+    def convert_datetimes(cls, values):
+        if isinstance(values, dict):
+            values = dict(values)
+            for key in ("start_read", "end_read"):
+                dt = values.pop(f"{key}_dt", None)
+                if dt is not None and f"{key}_ns" not in values:
+                    values[f"{key}_ns"] = datetime_to_ns(dt)
+            if values.get("capture_ns") is None:
+                values["capture_ns"] = values.get("end_read_ns")
+        return values
     
     @field_validator("frame")
     def validate_frame(cls, value):
@@ -67,24 +226,32 @@ class FramePacket(BaseModel):
             raise TypeError("frame must be a numpy array")
         return value
     
+    @property
+    def start_read_dt(self) -> datetime: return datetime.fromtimestamp(self.start_read_ns / 1e9)
+    
+    @property
+    def end_read_dt(self) -> datetime: return datetime.fromtimestamp(self.end_read_ns / 1e9)
+    
+    @property
+    def capture_dt(self) -> datetime: return datetime.fromtimestamp(self.capture_ns / 1e9)
+    
     def dump(self):
         
         # check if frame is contiguous and convert to contiguous if not
         if not self.frame.flags["C_CONTIGUOUS"]:
             self.frame = ascontiguousarray(self.frame)
         
+        data = {key: getattr(self, key) for key in self.HEADER_FIELDS}
+        data["frame"] = {
+            "shape": list(self.frame.shape),
+            "dtype": str(self.frame.dtype)
+        }
+        data["device"] = {
+            "type": self.device.__class__.__name__,
+            "parameters": self.device.model_dump(),
+        }
+        
         return {
             "frame": self.frame, 
-            "data": {
-                "start_read_timestamp": self.start_read_dt.timestamp(),
-                "end_read_timestamp": self.end_read_dt.timestamp(),
-                "frame": {
-                    "shape": list(self.frame.shape),
-                    "dtype": str(self.frame.dtype)
-                },
-                "device": {
-                    "type": self.device.__class__.__name__,
-                    "parameters": self.device.model_dump(),
-                }
-            }
+            "data": data
         }
@@ -1,9 +1,10 @@
-import av
 import re
+import time
 import concurrent.futures as concurrent_futures
 import subprocess
 import pydantic
 import platform
+import numpy as np
 
 # from capture_devices import devices
 from json import dump as json_dump
@@ -12,12 +13,13 @@ from typing import List, Union
 from abc import ABC, abstractmethod
 from logging import getLogger
 from logging import getLogger
-from datetime import datetime
 from traceback import format_exc
-from numpy import unique
 
 from .datamodel import FramePacket
 from .datamodel import PeripheryDevice, CameraDevice, AudioDevice
+from .utils import lazy_import
+
+av = lazy_import("av") # only loaded once a device is opened, config handling does not need it
 
 # ------------------- DEVICE UTILS ------------------- #
 
@@ -196,6 +198,10 @@ class FFMPEGReader(ABC):
         self.device = device
         self.container = None
         self.stream = None
+        
+        self.sequence = 0 # number of packets read from the device, not reset by restarts
+        self.pts_offset = None # (wall clock, monotonic) ns minus device pts of the earliest read frame
+        self.pts_reanchor_ns = 10 ** 9
     
     def is_active(self):
         return self.container is not None
@@ -207,6 +213,7 @@ class FFMPEGReader(ABC):
             self.container.close()
             self.container = None
         self.stream = None
+        self.pts_offset = None
         
         self.logger.info("stopped!")
     
@@ -234,11 +241,64 @@ class FFMPEGReader(ABC):
     
     def read(self, timeout: float = 1):
         
+        read = self._read_frame(timeout)
+        if read is None:
+            return None
+        
+        frame, start_read_ns, end_read_ns, end_read_monotonic_ns, device_pts_ns = read
+        capture_ns, capture_monotonic_ns = self._capture_time(device_pts_ns, end_read_ns, end_read_monotonic_ns, self._frame_duration_ns(frame))
+        
+        frame_packet = FramePacket(
+            device=self.device,
+            frame=frame,
+            start_read_ns=start_read_ns,
+            end_read_ns=end_read_ns,
+            capture_ns=capture_ns,
+            capture_monotonic_ns=capture_monotonic_ns,
+            device_pts_ns=device_pts_ns,
+            sequence=self.sequence
+        )
+        self.sequence += 1
+        return frame_packet
+    
+    def _frame_duration_ns(self, frame: np.ndarray) -> int:
+        """time between the capture of the first and the last sample of a frame"""
+        return 0
+    
+    def _capture_time(self, device_pts_ns: Union[int, None], end_read_ns: int, end_read_monotonic_ns: int, duration_ns: int = 0):
+        """
+        Wall clock and monotonic capture time of the first sample of a frame.
+        Without a device pts this is the read time minus the frame duration. With a pts the device clock is anchored to
+        the host clock at the frame read with the smallest delay, so the read jitter of later frames does not end up in the timestamps.
+        The anchor is reset if the pts jumps or the device clock drifts by more than pts_reanchor_ns.
+        """
+        end_read_ns -= duration_ns
+        end_read_monotonic_ns -= duration_ns
+        
+        if device_pts_ns is None:
+            return end_read_ns, end_read_monotonic_ns
+        
+        if self.pts_offset is not None:
+            capture_ns = device_pts_ns + self.pts_offset[0]
+            # a frame can not be captured after it was read, a read that is much later than predicted means the pts jumped
+            if capture_ns > end_read_ns or end_read_ns - capture_ns > self.pts_reanchor_ns:
+                if capture_ns < end_read_ns:
+                    self.logger.warning(f"device pts is {(end_read_ns - capture_ns) / 1e6:.1f}ms behind the host clock, re-anchoring")
+                self.pts_offset = None
+        
+        if self.pts_offset is None:
+            self.pts_offset = (end_read_ns - device_pts_ns, end_read_monotonic_ns - device_pts_ns)
+        
+        return device_pts_ns + self.pts_offset[0], device_pts_ns + self.pts_offset[1]
+    
+    def _read_frame(self, timeout: float = 1):
+        """next decoded frame as (array, start_read_ns, end_read_ns, end_read_monotonic_ns, device_pts_ns) or None"""
+        
         if not self.is_active():
             self.logger.warning("Trying to read from a reader that is not active ...")
             return None
         
-        start_read_dt = datetime.now()
+        start_read_ns = time.time_ns()
         
         with concurrent_futures.ThreadPoolExecutor(max_workers=1) as executor:
             
@@ -250,6 +310,10 @@ class FFMPEGReader(ABC):
                 if frame is None:
                     return None
                 
+                device_pts_ns = None
+                if frame.pts is not None and frame.time_base is not None:
+                    device_pts_ns = int(frame.pts * frame.time_base * 10 ** 9)
+                
                 if isinstance(frame, av.VideoFrame):
                     frame = frame.reformat(format='rgb24')
             
@@ -266,14 +330,10 @@ class FFMPEGReader(ABC):
                 self.stop()
                 raise e
         
-        end_read_dt = datetime.now()
+        end_read_ns = time.time_ns()
+        end_read_monotonic_ns = time.monotonic_ns()
         
-        return FramePacket(
-            device=self.device,
-            frame=frame.to_ndarray(),
-            start_read_dt=start_read_dt,
-            end_read_dt=end_read_dt
-        )
+        return frame.to_ndarray(), start_read_ns, end_read_ns, end_read_monotonic_ns, device_pts_ns
 
 # ------------------- FFMPEG READERS ------------------- #
 
@@ -296,15 +356,156 @@ class AudioDeviceReader(FFMPEGReader):
     def __init__(self, audio_device: AudioDevice):
         super().__init__(device=audio_device, logger_name=f"{__class__.__name__}@{audio_device.name}")
         
+        # libav delivers a few ms of audio per frame, chunking amortises the cost of sending a packet over chunk_duration_ms
+        self.chunker = None
+        if audio_device.chunk_duration_ms is not None:
+            self.chunker = AudioChunker(channels=audio_device.channels, chunk_samples=audio_device.sample_rate * audio_device.chunk_duration_ms // 1000)
+        self.chunk_start = None # (start_read_ns, capture_ns, capture_monotonic_ns, device_pts_ns) of the first sample of the next chunk
+        self.last_read_ns = None # (start_read_ns, end_read_ns) of the last libav frame
+    
     def start(self):
+        options = {
+            'ar': f'{self.device.sample_rate}',
+            'channels': f'{self.device.channels}',
+            'sample_size': f'{self.device.sample_size}',
+        }
+        if self.device.audio_buffer_size is not None:
+            options['audio_buffer_size'] = f'{self.device.audio_buffer_size}' # device buffer in ms
+        
         super().start(
             file_string=f'audio={self.device.device_id}', 
-            options={
-                'ar': f'{self.device.sample_rate}',
-                'channels': f'{self.device.channels}',
-                'sample_size': f'{self.device.sample_size}',
-                # 'audio_buffer_size': f'{self.device.audio_buffer_size}'
-            },
+            options=options,
             format='dshow',
         )
+    
+    def stop(self):
+        super().stop()
+        if self.chunker is not None:
+            self.chunker.clear()
+        self.chunk_start = None
+    
+    def _frame_duration_ns(self, frame: np.ndarray) -> int:
+        return frame.size // self.device.channels * 10 ** 9 // self.device.sample_rate
+    
+    def read(self, timeout: float = 1):
+        
+        if self.chunker is None:
+            return super().read(timeout)
+        
+        while True:
+            
+            chunk = self.chunker.pop()
+            if chunk is not None:
+                
+                # a chunk can end inside a libav frame, its last sample was captured before the rest of that frame
+                leftover = self.chunker.available()
+                end_read_ns = self.last_read_ns[1] - leftover * 10 ** 9 // self.device.sample_rate
+                start_read_ns, capture_ns, capture_monotonic_ns, device_pts_ns = self.chunk_start
+                
+                frame_packet = FramePacket(
+                    device=self.device,
+                    frame=chunk,
+                    start_read_ns=start_read_ns,
+                    end_read_ns=end_read_ns,
+                    capture_ns=capture_ns,
+                    capture_monotonic_ns=capture_monotonic_ns,
+                    device_pts_ns=device_pts_ns,
+                    sequence=self.sequence
+                )
+                self.sequence += 1
+                
+                # samples are contiguous, the next chunk starts one chunk duration later
+                self.chunk_start = None
+                if leftover > 0:
+                    chunk_ns = self.chunker.chunk_samples * 10 ** 9 // self.device.sample_rate
+                    self.chunk_start = (
+                        self.last_read_ns[0],
+                        capture_ns + chunk_ns,
+                        capture_monotonic_ns + chunk_ns,
+                        None if device_pts_ns is None else device_pts_ns + chunk_ns
+                    )
+                return frame_packet
+            
+            read = self._read_frame(timeout)
+            if read is None:
+                return None
+            
+            frame, start_read_ns, end_read_ns, end_read_monotonic_ns, device_pts_ns = read
+            capture_ns, capture_monotonic_ns = self._capture_time(device_pts_ns, end_read_ns, end_read_monotonic_ns, self._frame_duration_ns(frame))
+            if self.chunk_start is None:
+                self.chunk_start = (start_read_ns, capture_ns, capture_monotonic_ns, device_pts_ns)
+            self.last_read_ns = (start_read_ns, end_read_ns)
+            self.chunker.push(frame)
+
+# ------------------- AUDIO CHUNKING ------------------- #
+
+class AudioChunker:
+    """
+    Ring buffer aggregating small audio frames into chunks of chunk_samples samples per channel.
+    
+    Packed frames (1, samples * channels) and planar frames (channels, samples) are accepted,
+    chunks are returned in the layout of the pushed frames.
+    """
+    
+    def __init__(self, channels: int, chunk_samples: int):
+        assert channels > 0, "channels must be positive"
+        assert chunk_samples > 0, "chunk_samples must be positive"
+        
+        self.channels = channels
+        self.chunk_samples = chunk_samples
+        
+        self.buffer = None # (capacity, channels), allocated on the first push when the dtype is known
+        self.planar = False
+        self.read_index = 0
+        self.size = 0
+    
+    def available(self) -> int:
+        return self.size
+    
+    def clear(self):
+        self.read_index = 0
+        self.size = 0
+    
+    def _grow(self, capacity: int, dtype):
+        buffer = np.empty((capacity, self.channels), dtype=dtype)
+        if self.buffer is not None and self.size > 0:
+            buffer[:self.size] = self._take(self.size)
+        self.buffer = buffer
+        self.read_index = 0
+    
+    def _take(self, samples: int) -> np.ndarray:
+        capacity = len(self.buffer)
+        end = self.read_index + samples
+        if end <= capacity:
+            return self.buffer[self.read_index:end].copy()
+        return np.concatenate([self.buffer[self.read_index:], self.buffer[:end - capacity]])
+    
+    def push(self, frame: np.ndarray):
+        
+        self.planar = self.channels > 1 and frame.shape[0] == self.channels
+        samples = frame.T if self.planar else frame.reshape(-1, self.channels)
+        
+        if self.buffer is None or self.buffer.dtype != samples.dtype or self.size + len(samples) > len(self.buffer):
+            self._grow(max(2 * self.chunk_samples, 2 * (self.size + len(samples))), samples.dtype)
+        
+        # copy in at most two slices around the end of the ring
+        capacity = len(self.buffer)
+        write_index = (self.read_index + self.size) % capacity
+        first = min(len(samples), capacity - write_index)
+        self.buffer[write_index:write_index + first] = samples[:first]
+        self.buffer[:len(samples) - first] = samples[first:]
+        self.size += len(samples)
+    
+    def pop(self):
+        """next chunk or None if fewer than chunk_samples samples are buffered"""
+        if self.size < self.chunk_samples:
+            return None
+        
+        chunk = self._take(self.chunk_samples)
+        self.read_index = (self.read_index + self.chunk_samples) % len(self.buffer)
+        self.size -= self.chunk_samples
+        
+        if self.planar:
+            return np.ascontiguousarray(chunk.T)
+        return chunk.reshape(1, -1)
 
@@ -1,18 +1,29 @@
-import av
 import os
-import tqdm
-import cv2
+import math
+import time
 import numpy as np
 
 from datetime import datetime
-from PIL import Image
 from time import sleep
 from logging import getLogger
-from multiprocessing import Pool
-from typing import List
+from threading import Thread, Lock, Condition
+from threading import Event as ThreadEvent
+from typing import List, Dict, Set, Union, Callable
+from fractions import Fraction
 
-from .datamodel import VideoFile, ImageFile, CameraDevice, FramePacket
+from .datamodel import VideoFile, ImageFile, AudioFile, CameraDevice, AudioDevice, FramePacket, BackpressurePolicy, WorkQueueCounters, StreamDescriptor, MOTION_STREAM
 from .core import InputStreamReceiver
+from .utils import lazy_import, BoundedWorkQueue
+from .imageIO import ImageEncoder, get_image_encoder
+from .shardIO import ShardWriter
+from .rawIO import RawFrameWriter
+from .ringIO import RawFrameRing, EncodedFrameRing
+from .videoIO import add_video_stream, resolve_encoder_profile, frame_geometry
+from .audioIO import AudioFileWriter, audio_samples, audio_frame_from_ndarray, channel_layout, codec_sample_rate
+
+# codecs and progress bars are loaded on first use
+av = lazy_import("av")
+tqdm = lazy_import("tqdm")
 
 # ---------------------------------------------------------------------
 
@@ -24,29 +35,64 @@ class VideoSaver:
         proxy_pub_port: int, 
         output_path: str,
         video_length: int,
-        codec: str = "h264",
-        host: str = "127.0.0.1"):
+        codec: str = None,
+        host: str = "127.0.0.1",
+        encoder_profile: str = None,
+        codec_fallbacks: List[str] = None,
+        preset: str = None,
+        tune: str = None,
+        crf: int = None,
+        bit_rate: int = None,
+        threads: int = None,
+        thread_type: str = None,
+        codec_options: Dict[str, Dict[str, str]] = None,
+        stream_descriptors: Dict[str, StreamDescriptor] = {},
+        registry_path: str = None,
+        motion_events: bool = False):
         self.logger = getLogger(f"{self.__class__.__name__}")
         
+        # encoder settings from the profile (see videoIO.VIDEO_ENCODER_PROFILES), overridden by the passed values
+        encoder_fields = resolve_encoder_profile(
+            encoder_profile,
+            codec=codec,
+            codec_fallbacks=codec_fallbacks,
+            preset=preset,
+            tune=tune,
+            crf=crf,
+            bit_rate=bit_rate,
+            threads=threads,
+            thread_type=thread_type,
+            codec_options=codec_options
+        )
+        encoder_fields.setdefault("codec", "h264")
+        
         self.cameras = cameras
-        self.stream_receiver = InputStreamReceiver(devices=cameras, proxy_pub_port=proxy_pub_port, host=host)
+        self.stream_receiver = InputStreamReceiver(devices=cameras, proxy_pub_port=proxy_pub_port, host=host, registry_path=registry_path)
         
-        assert len(np.unique([cam.name for cam in cameras])) == len(cameras), "All cameras must have unique names"
+        # motion start and stop packets of senders with change detection, see save_motion_video
+        self.motion_receiver = None
+        self.moving = set() # device ids of the cameras in motion
+        if motion_events:
+            self.motion_receiver = InputStreamReceiver(devices=cameras, proxy_pub_port=proxy_pub_port, host=host, registry_path=registry_path, stream=MOTION_STREAM)
         
-        self.logger.warning("!! HARD CODED BEHAVIOUR: FRAME PREPROCESSING ON MY MACHINE REQUIRES THE WIDTH AND HEIGHT TO BE SWAPPED THE VIDEO SAVER IS HARDCODED TO REFLECT THIS, PLEASE CHANGE VideoFile IN fileIO!!")
+        assert len(np.unique([cam.name for cam in cameras])) == len(cameras), "All cameras must have unique names"
         
-        # initialize video files
-        self.video_files = [
-            VideoFile(
+        # initialize video files, the geometry published by the sender (MultiInputStreamSender.stream_descriptors) is used if known,
+        # either way it is checked against the first received frames before the encoders are opened
+        self.video_files = []
+        for cam in cameras:
+            descriptor = stream_descriptors.get(cam.name)
+            self.video_files.append(VideoFile(
                 file_path=os.path.join(output_path, cam.name),
                 file_name="placeholder", # set in VideoSaver.save_video
                 file_extension="mp4",
-                width=cam.height, # ! the cameras are all rotated by 90 degrees
-                height=cam.width, # ! the cameras are all rotated by 90 degrees
+                width=descriptor.width if descriptor is not None else cam.width,
+                height=descriptor.height if descriptor is not None else cam.height,
+                input_pixel_format=descriptor.pixel_format if descriptor is not None else "rgb24",
                 fps=cam.fps,
                 seconds=video_length,
-                codec=codec
-            ) for cam in cameras]
+                **encoder_fields
+            ))
         
         # create directories if not exist
         for video_file in tqdm.tqdm(self.video_files, desc="creating directories"):
@@ -56,25 +102,79 @@ class VideoSaver:
         
     def start(self):
         self.stream_receiver.start()
+        if self.motion_receiver is not None:
+            self.motion_receiver.start()
         
     def stop(self):
         self.stream_receiver.stop()
+        if self.motion_receiver is not None:
+            self.motion_receiver.stop()
         
-    def save_video(self, video_name: str, bad_frames_timeout: int = 25):
+    def _open_video_files(self, video_name: str, frames: Dict[str, FramePacket]):
         
         output_files = []
         streams = []
-        for video_file in self.video_files:
+        for (i, cam) in enumerate(self.cameras):
+            
+            width, height, pixel_format = frame_geometry(frames[cam.device_id].frame)
+            video_file = self.video_files[i]
+            if (width, height, pixel_format) != (video_file.width, video_file.height, video_file.input_pixel_format):
+                self.logger.info(f"{cam.name} sends {width}x{height} {pixel_format}, expected {video_file.width}x{video_file.height} {video_file.input_pixel_format}")
+                video_file = video_file.model_copy(update={"width": width, "height": height, "input_pixel_format": pixel_format})
+                self.video_files[i] = video_file
+            
             output_file = av.open(file=os.path.join(video_file.file_path, f"{video_name}.{video_file.file_extension}"), mode="w")
-            stream = output_file.add_stream(codec_name=video_file.codec, rate=video_file.fps)
-            stream.width = video_file.width
-            stream.height = video_file.height
-            stream.pix_fmt = "yuv420p"
+            stream = add_video_stream(output_file, video_file, pix_fmt="yuv420p")
             
             output_files.append(output_file)
             streams.append(stream)
         
-        frames_to_collect = video_file.fps * video_file.seconds
+        return output_files, streams
+    
+    def _update_motion(self, timeout_ms: int = 0) -> bool:
+        """apply the motion packets that arrived within timeout_ms, True if any camera is in motion"""
+        while self.motion_receiver.poll(timeout_ms):
+            motion_packet = self.motion_receiver.read_packet(read_attemps=1)
+            if motion_packet is None:
+                continue
+            if motion_packet.motion:
+                self.moving.add(motion_packet.device.device_id)
+            else:
+                self.moving.discard(motion_packet.device.device_id)
+            timeout_ms = 0
+        return len(self.moving) > 0
+    
+    def save_motion_video(self, video_name: str, motion_timeout: float = None, bad_frames_timeout: int = 25) -> bool:
+        """
+        Wait for any camera to start moving and record until all cameras stopped or the video length is reached.
+        Returns False if no motion started within motion_timeout seconds, None waits forever.
+        The moving cameras set the frame rate, static cameras of senders that suppress unchanged frames only send keep alives
+        and their last frame is repeated.
+        """
+        assert self.motion_receiver is not None, "motion videos need a saver with motion_events=True"
+        
+        deadline = None if motion_timeout is None else time.monotonic() + motion_timeout
+        while not self._update_motion(timeout_ms=100):
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+        
+        self.logger.info(f"motion of {len(self.moving)} cameras, recording {video_name} ...")
+        self.save_video(video_name, bad_frames_timeout=bad_frames_timeout, stop_condition=lambda: not self._update_motion(), paced_by=lambda: self.moving)
+        return True
+    
+    def save_video(self, video_name: str, bad_frames_timeout: int = 25, stop_condition: Callable[[], bool] = None, paced_by: Callable[[], Set[str]] = None):
+        """
+        Record video_length seconds of all cameras, or until stop_condition returns True.
+        With paced_by a frame is written whenever the cameras of the returned device ids sent one, the last frame of the other cameras is repeated.
+        """
+        
+        # opened with the first frames, so the encoders match the received geometry and no rescaling is needed
+        output_files = []
+        streams = []
+        last_frames = {}
+        device_ids = set([cam.device_id for cam in self.cameras])
+        
+        frames_to_collect = self.video_files[0].fps * self.video_files[0].seconds
         collected_frames = 0
         timeout_counter = 0
         
@@ -83,7 +183,15 @@ class VideoSaver:
             with tqdm.tqdm(total=frames_to_collect, desc="saving video") as tqdm_bar:
                 while collected_frames < frames_to_collect:
                     
-                    frames = self.stream_receiver.read()
+                    # checked between frames, e.g. the end of motion for save_motion_video
+                    if stop_condition is not None and stop_condition():
+                        break
+                    
+                    # every camera needs a first frame before one can be repeated
+                    required = device_ids
+                    if paced_by is not None:
+                        required = (set(paced_by()) | (device_ids - set(last_frames))) & device_ids
+                    frames = self.stream_receiver.read(device_ids=required if len(required) > 0 else device_ids)
                     
                     # check if frames is None, if so increment timeout counter and wait for 1 second
                     if frames is None:
@@ -96,9 +204,15 @@ class VideoSaver:
                     timeout_counter = 0
                     collected_frames += 1
                     
+                    last_frames.update(frames)
+                    frames = last_frames
+                    
+                    if len(output_files) == 0:
+                        output_files, streams = self._open_video_files(video_name, frames)
+                    
                     for (i, cam) in enumerate(self.cameras):
                         
-                        av_frame = av.VideoFrame.from_ndarray(frames[cam.device_id].frame, format="rgb24")
+                        av_frame = av.VideoFrame.from_ndarray(frames[cam.device_id].frame, format=self.video_files[i].input_pixel_format)
                         av_frame = av_frame.reformat(format="yuv420p")
                         
                         for packet in streams[i].encode(av_frame):
@@ -107,7 +221,7 @@ class VideoSaver:
                     tqdm_bar.update(1)
                 
             # flush the encoder
-            for i in tqdm.tqdm(range(len(self.cameras)), desc="flushing encoder"):
+            for i in tqdm.tqdm(range(len(streams)), desc="flushing encoder"):
                 for packet in streams[i].encode():
                     output_files[i].mux(packet)
             
@@ -121,6 +235,83 @@ class VideoSaver:
                 of.close()
             self.logger.info("video files closed")
 
+class RawSaver:
+    """
+    Lossless recording of frames into preallocated, memory mapped files, one recording per camera.
+    Frames are copied as received, no encoding is done so throughput is only limited by the disk.
+    """
+    
+    def __init__(
+        self, 
+        cameras: List[CameraDevice], 
+        proxy_pub_port: int, 
+        output_path: str,
+        host: str = "127.0.0.1",
+        registry_path: str = None):
+        self.logger = getLogger(f"{self.__class__.__name__}")
+        
+        assert len(np.unique([cam.name for cam in cameras])) == len(cameras), "All cameras must have unique names"
+        
+        self.cameras = cameras
+        self.output_path = output_path
+        self.stream_receiver = InputStreamReceiver(devices=cameras, proxy_pub_port=proxy_pub_port, host=host, registry_path=registry_path)
+    
+    def start(self):
+        self.stream_receiver.start()
+    
+    def stop(self):
+        self.stream_receiver.stop()
+    
+    def save_frames(self, recording_name: str, number_of_frames: int, bad_frames_timeout: int = 25) -> List[str]:
+        
+        # frame geometry is only known after preprocessing, the files are allocated with the first frames
+        writers = None
+        collected_frames = 0
+        timeout_counter = 0
+        
+        try:
+            
+            with tqdm.tqdm(total=number_of_frames, desc="saving raw frames") as tqdm_bar:
+                while collected_frames < number_of_frames:
+                    
+                    frames = self.stream_receiver.read()
+                    
+                    if frames is None:
+                        sleep(1)
+                        timeout_counter += 1
+                        self.logger.warning(f"timeout while waiting for frames: {timeout_counter}/{bad_frames_timeout}")
+                        assert timeout_counter < bad_frames_timeout, f"timeout while waiting for frames"
+                        continue
+                    
+                    if writers is None:
+                        writers = [
+                            RawFrameWriter(
+                                file_prefix=os.path.join(self.output_path, cam.name, recording_name),
+                                shape=frames[cam.device_id].frame.shape,
+                                dtype=frames[cam.device_id].frame.dtype,
+                                max_frames=number_of_frames,
+                                metadata={"device": cam.model_dump()}
+                            ) for cam in self.cameras]
+                    
+                    timeout_counter = 0
+                    collected_frames += 1
+                    
+                    for (i, cam) in enumerate(self.cameras):
+                        frame_packet = frames[cam.device_id]
+                        writers[i].write(frame_packet.frame, frame_packet.capture_ns)
+                    
+                    tqdm_bar.update(1)
+            
+            self.logger.info(f"raw frames saved !")
+        
+        except Exception as e:
+            raise e
+        finally:
+            for writer in writers or []:
+                writer.close()
+        
+        return [os.path.join(self.output_path, cam.name, recording_name) for cam in self.cameras]
+
 class ImageSaver:
     
     def __init__(
@@ -132,10 +323,22 @@ class ImageSaver:
         host: str = "127.0.0.1", 
         jpg_quality: int = 95,
         png_compression: int = 3,
-        num_workers: int = 8):
+        jpg_subsampling: str = None,
+        jpg_optimize: bool = False,
+        jpg_progressive: bool = False,
+        webp_quality: int = 80,
+        encoder: str = "auto",
+        num_workers: int = 8,
+        queue_size: int = 32,
+        backpressure_policy: BackpressurePolicy = BackpressurePolicy.BLOCK,
+        output_mode: str = "files",
+        max_shard_size: int = 2 ** 30,
+        registry_path: str = None,
+        max_rate: float = None):
         self.logger = getLogger(f"{self.__class__.__name__}")
         
         assert len(np.unique([cam.name for cam in cameras])) == len(cameras), "All cameras must have unique names"
+        assert output_mode in ("files", "shards"), "output_mode must be either 'files' or 'shards'"
         
         # set image parameters
         self.cameras = cameras
@@ -145,71 +348,91 @@ class ImageSaver:
                 file_name="placeholder", # set in ImageSaver.save_image
                 file_extension=image_file_extension,
                 jpg_quality=jpg_quality,
-                png_compression=png_compression
+                png_compression=png_compression,
+                jpg_subsampling=jpg_subsampling,
+                jpg_optimize=jpg_optimize,
+                jpg_progressive=jpg_progressive,
+                webp_quality=webp_quality,
+                encoder=encoder
             ) for cam in cameras]
         
-        # set receiver
-        self.stream_receiver = InputStreamReceiver(devices=cameras, proxy_pub_port=proxy_pub_port, host=host)
+        # resolve the encoder backend once, "auto" picks the fastest one available
+        self.encoder = get_image_encoder(encoder, image_file_extension)
+        self.logger.info(f"encoding {image_file_extension} with {self.encoder.name}")
+        
+        # set receiver, with max_rate only that many images per second and camera are received, e.g. for periodic snapshots
+        self.stream_receiver = InputStreamReceiver(devices=cameras, proxy_pub_port=proxy_pub_port, host=host, registry_path=registry_path, max_rate=max_rate)
         
-        # instantiate a multiprocessing worker pool placeholder for saving images
-        self.pool = None
+        # images are encoded by worker threads, PIL releases the GIL while encoding so frames are shared instead of pickled
+        # the number of queued images is bounded, the policy decides between blocking the receiver and dropping images
         self.num_workers = num_workers
-        self.futures = []
+        self.queue_size = queue_size
+        self.backpressure_policy = backpressure_policy
+        self.work_queue = None
+        
+        # in shard mode the images of all cameras are appended to large tar shards in output_path instead of one file per image
+        self.output_mode = output_mode
+        self.output_path = output_path
+        self.max_shard_size = max_shard_size
+        self.shard_writer = None
         
         # create directories if not exist
-        for image_file in tqdm.tqdm(self.image_files, desc="creating directories"):
+        for image_file in tqdm.tqdm(self.image_files if output_mode == "files" else [], desc="creating directories"):
             if not os.path.exists(image_file.file_path):
                 os.makedirs(image_file.file_path)
                 self.logger.debug(f"directory {image_file.file_path} created")
         
         
     def start(self):
-        assert self.pool is None, "trying to start a process that has already started"
+        assert self.work_queue is None, "trying to start a process that has already started"
         self.stream_receiver.start()
-        self.pool = Pool(self.num_workers)
+        self.work_queue = BoundedWorkQueue(
+            max_size=self.queue_size, 
+            num_workers=self.num_workers, 
+            policy=self.backpressure_policy, 
+            name=self.__class__.__name__
+        )
+        self.work_queue.start()
+        
+        if self.output_mode == "shards":
+            self.shard_writer = ShardWriter(self.output_path, prefix="images", max_shard_size=self.max_shard_size)
         
     def stop(self):
         self.stream_receiver.stop()
         
-        for result in self.futures:
-            try:
-                self.logger.info(f"Waiting for process {result} to finish ...")
-                result.get(timeout=1)
-            except Exception as e:
-                self.logger.error(f"Error while waiting for process to finish: {e}")
-        
-        if self.pool is not None:
-            self.pool.close()
-        
-        for worker in self.pool._pool:
-            try:
-                self.logger.info(f"Joining worker {worker} ...")
-                worker.join(timeout=1)
-            except Exception as e:
-                self.logger.error(f"Error while joining worker: {e}, terminating ...")
-                worker.terminate()
-        
-        self.pool.join()
-        self.pool = None
-        
-    def check_futures(self):
-        for result in self.futures:
-            if result.ready():
-                try:
-                    result.get()
-                except Exception as e:
-                    self.logger.error(f"Error produced by future: {e}")
+        # finish all queued images
+        if self.work_queue is not None:
+            self.logger.info("waiting for queued images to be saved ...")
+            self.work_queue.stop()
+            self.logger.info(f"image counters: {self.work_queue.counters()}")
+        self.work_queue = None
+        
+        if self.shard_writer is not None:
+            self.shard_writer.close()
+        self.shard_writer = None
+    
+    def counters(self) -> WorkQueueCounters:
+        assert self.work_queue is not None, "counters are only available while the saver is running"
+        return self.work_queue.counters()
     
     @staticmethod
-    def _save_image(frame: np.ndarray, image_file: ImageFile, image_name: str):
+    def _save_image(frame: np.ndarray, image_file: ImageFile, image_name: str, encoder: ImageEncoder):
         
         image_uri = os.path.join(image_file.file_path, f"{image_name}.{image_file.file_extension}")
-        image = Image.fromarray(frame)
         
-        if image_file.file_extension == "jpg":
-            image.save(image_uri, quality=image_file.jpg_quality)
-        elif image_file.file_extension == "png":
-            image.save(image_uri, compress_level=image_file.png_compression)
+        with open(image_uri, "wb") as f:
+            f.write(encoder.encode(frame, image_file))
+    
+    @staticmethod
+    def _save_image_to_shard(frame_packet: FramePacket, image_file: ImageFile, image_name: str, encoder: ImageEncoder, shard_writer: ShardWriter):
+        shard_writer.write(
+            key=image_name,
+            device=frame_packet.device.name,
+            extension=image_file.file_extension,
+            data=encoder.encode(frame_packet.frame, image_file),
+            timestamp_ns=frame_packet.capture_ns,
+            sequence=frame_packet.sequence
+        )
         
     def save_image(self, image_name: str) -> bool:
         
@@ -219,17 +442,16 @@ class ImageSaver:
         if frames is None:
             return False
         
-        # clean up results
-        self.check_futures() # check for errors
-        self.futures = [r for r in self.futures if not r.ready()]
-        self.logger.debug(f"not-ready process results in queue: {len(self.futures)}")
-        
         # save images
         self.logger.debug(f"saving images {image_name} ...")
         for (i, camera) in enumerate(self.cameras):
             cam_id = camera.device_id
-            result = self.pool.apply_async(ImageSaver._save_image, (frames[cam_id].frame, self.image_files[i], image_name))
-            self.futures.append(result)
+            if self.shard_writer is not None:
+                submitted = self.work_queue.submit(ImageSaver._save_image_to_shard, frames[cam_id], self.image_files[i], image_name, self.encoder, self.shard_writer)
+            else:
+                submitted = self.work_queue.submit(ImageSaver._save_image, frames[cam_id].frame, self.image_files[i], image_name, self.encoder)
+            if not submitted:
+                self.stream_receiver.count_consumer_drop(cam_id)
         
         return True
     
@@ -252,4 +474,643 @@ class ImageSaver:
                 timeout_counter = 0
                 saved_images += 1
                 
-                tqdm_bar.update(1)
\ No newline at end of file
+                tqdm_bar.update(1)
+                tqdm_bar.set_postfix(self.counters().model_dump(include={"queued", "completed", "dropped"}))
+
+class AudioSaver:
+    """
+    Records every audio packet of the microphones to wav, flac or opus files, one file or segment series per microphone.
+    Encoding runs on a worker thread so the receiver keeps draining the socket, when the encoder falls behind reading waits
+    for it, a dropped packet would leave a gap that shortens the file and shifts the audio against its first sample timestamp.
+    """
+    
+    def __init__(
+        self, 
+        microphones: List[AudioDevice], 
+        proxy_pub_port: int, 
+        output_path: str,
+        audio_file_extension: str = "wav",
+        segment_length: float = None,
+        bit_rate: int = None,
+        host: str = "127.0.0.1",
+        queue_size: int = 256,
+        registry_path: str = None):
+        self.logger = getLogger(f"{self.__class__.__name__}")
+        
+        assert len(np.unique([mic.name for mic in microphones])) == len(microphones), "All microphones must have unique names"
+        
+        self.microphones = microphones
+        self.audio_files = [
+            AudioFile(
+                file_path=os.path.join(output_path, mic.name),
+                file_name="placeholder", # set in AudioSaver.save_audio
+                file_extension=audio_file_extension,
+                sample_rate=mic.sample_rate,
+                channels=mic.channels,
+                segment_seconds=segment_length,
+                bit_rate=bit_rate
+            ) for mic in microphones]
+        
+        self.stream_receiver = InputStreamReceiver(devices=microphones, proxy_pub_port=proxy_pub_port, host=host, registry_path=registry_path)
+        
+        # a single worker keeps the packets of each microphone in order
+        self.queue_size = queue_size
+        self.work_queue = None
+        
+        # create directories if not exist
+        for audio_file in tqdm.tqdm(self.audio_files, desc="creating directories"):
+            if not os.path.exists(audio_file.file_path):
+                os.makedirs(audio_file.file_path)
+                self.logger.debug(f"directory {audio_file.file_path} created")
+    
+    def start(self):
+        assert self.work_queue is None, "trying to start a process that has already started"
+        self.stream_receiver.start()
+        self.work_queue = BoundedWorkQueue(
+            max_size=self.queue_size, 
+            num_workers=1, 
+            policy=BackpressurePolicy.BLOCK, 
+            name=self.__class__.__name__
+        )
+        self.work_queue.start()
+    
+    def stop(self):
+        self.stream_receiver.stop()
+        if self.work_queue is not None:
+            self.work_queue.stop()
+            self.logger.info(f"audio packet counters: {self.work_queue.counters()}")
+        self.work_queue = None
+    
+    def counters(self) -> WorkQueueCounters:
+        assert self.work_queue is not None, "counters are only available while the saver is running"
+        return self.work_queue.counters()
+    
+    def save_audio(self, audio_name: str, seconds: float, bad_frames_timeout: int = 25) -> List[str]:
+        
+        writers = {
+            mic.device_id: AudioFileWriter(audio_file.model_copy(update={"file_name": audio_name}), mic)
+            for mic, audio_file in zip(self.microphones, self.audio_files)
+        }
+        samples_to_collect = {mic.device_id: int(seconds * mic.sample_rate) for mic in self.microphones}
+        collected_samples = {mic.device_id: 0 for mic in self.microphones}
+        timeout_counter = 0
+        
+        try:
+            
+            with tqdm.tqdm(total=seconds, desc="saving audio", unit="s") as tqdm_bar:
+                while any([collected_samples[k] < samples_to_collect[k] for k in writers]):
+                    
+                    frame_packet = self.stream_receiver.read_packet()
+                    
+                    if frame_packet is None:
+                        timeout_counter += 1
+                        self.logger.warning(f"timeout while waiting for audio: {timeout_counter}/{bad_frames_timeout}")
+                        assert timeout_counter < bad_frames_timeout, f"timeout while waiting for audio"
+                        continue
+                    
+                    timeout_counter = 0
+                    device = frame_packet.device
+                    if collected_samples[device.device_id] >= samples_to_collect[device.device_id]:
+                        continue
+                    
+                    # only written samples count towards the length
+                    if not self.work_queue.submit(writers[device.device_id].write, frame_packet):
+                        self.stream_receiver.count_consumer_drop(device.device_id)
+                        continue
+                    collected_samples[device.device_id] += audio_samples(frame_packet.frame, device.channels)
+                    
+                    tqdm_bar.n = round(min([collected_samples[mic.device_id] / mic.sample_rate for mic in self.microphones]), 2)
+                    tqdm_bar.refresh()
+            
+            self.logger.info(f"audio saved !")
+        
+        except Exception as e:
+            raise e
+        finally:
+            # finish the queued packets before the files are finalized
+            self.work_queue.join()
+            for writer in writers.values():
+                writer.close()
+        
+        return sum([writer.files for writer in writers.values()], [])
+
+class _AVMuxer:
+    """
+    Writes the packets of an AVRecorder recording, all methods must be called from one thread.
+    The container is opened once the first frame of every camera is known, since all streams have to exist before the first packet is muxed.
+    """
+    
+    TIME_BASE = Fraction(1, 1000) # video timestamps in ms, matroska native
+    MAX_PENDING_PACKETS = 256 # cameras that have not sent a frame by then use their configured geometry
+    
+    def __init__(self, file_uri: str, cameras: List[CameraDevice], microphones: List[AudioDevice], video_codec: str, audio_codec: str, audio_resync_threshold: float):
+        self.logger = getLogger(f"{self.__class__.__name__}@{os.path.basename(file_uri)}")
+        
+        self.file_uri = file_uri
+        self.cameras = cameras
+        self.microphones = microphones
+        self.video_codec = video_codec
+        self.audio_codec = audio_codec
+        self.audio_resync_threshold = audio_resync_threshold
+        
+        self.container = None
+        self.streams: Dict[str, "av.stream.Stream"] = {}
+        self.resamplers = {}
+        self.next_pts = {} # video: last pts, audio: pts of the next sample
+        self.pending: List[FramePacket] = []
+        self.start_ns = None
+        
+        self.audio_resyncs = 0
+        self.audio_dropped = 0
+    
+    def _open(self):
+        self.container = av.open(self.file_uri, mode="w")
+        
+        first_frames = {}
+        for frame_packet in self.pending:
+            first_frames.setdefault(frame_packet.device.device_id, frame_packet.frame)
+        
+        for cam in self.cameras:
+            if cam.device_id in first_frames:
+                height, width = first_frames[cam.device_id].shape[:2]
+            else:
+                self.logger.warning(f"no frame from {cam.name} yet, using the configured {cam.width}x{cam.height}")
+                width, height = cam.width, cam.height
+            
+            stream = self.container.add_stream(self.video_codec, rate=int(round(cam.fps)))
+            stream.width = width
+            stream.height = height
+            stream.pix_fmt = "yuv420p"
+            stream.time_base = self.TIME_BASE
+            stream.codec_context.time_base = self.TIME_BASE
+            self.streams[cam.device_id] = stream
+        
+        for mic in self.microphones:
+            sample_rate = codec_sample_rate(self.audio_codec, mic.sample_rate)
+            stream = self.container.add_stream(self.audio_codec, rate=sample_rate, layout=channel_layout(mic.channels))
+            self.streams[mic.device_id] = stream
+            self.resamplers[mic.device_id] = av.AudioResampler(format=stream.codec_context.codec.audio_formats[0].name, layout=channel_layout(mic.channels), rate=sample_rate)
+        
+        # time zero of all streams is the earliest capture in the recording
+        self.start_ns = min([frame_packet.capture_ns for frame_packet in self.pending])
+        
+        pending = self.pending
+        self.pending = []
+        for frame_packet in pending:
+            self._write(frame_packet)
+        
+        self.logger.info(f"writing {self.file_uri}")
+    
+    def write(self, frame_packet: FramePacket):
+        if self.container is not None:
+            self._write(frame_packet)
+            return
+        
+        self.pending.append(frame_packet)
+        seen = set([p.device.device_id for p in self.pending])
+        if all([cam.device_id in seen for cam in self.cameras]) or len(self.pending) >= self.MAX_PENDING_PACKETS:
+            self._open()
+    
+    def _mux(self, stream, av_frame):
+        for packet in stream.encode(av_frame):
+            self.container.mux(packet)
+    
+    def _write(self, frame_packet: FramePacket):
+        device_id = frame_packet.device.device_id
+        stream = self.streams[device_id]
+        
+        if isinstance(frame_packet.device, AudioDevice):
+            self._write_audio(frame_packet, stream)
+            return
+        
+        # variable frame rate, a late or missing frame shows up as a longer frame duration
+        pts = (frame_packet.capture_ns - self.start_ns) // 10 ** 6
+        last_pts = self.next_pts.get(device_id, -1)
+        pts = max(pts, last_pts + 1)
+        self.next_pts[device_id] = pts
+        
+        av_frame = av.VideoFrame.from_ndarray(frame_packet.frame, format=frame_geometry(frame_packet.frame)[2])
+        av_frame = av_frame.reformat(width=stream.width, height=stream.height, format=stream.pix_fmt)
+        av_frame.pts = pts
+        av_frame.time_base = self.TIME_BASE
+        self._mux(stream, av_frame)
+    
+    def _write_audio(self, frame_packet: FramePacket, stream):
+        device_id = frame_packet.device.device_id
+        sample_rate = stream.codec_context.sample_rate
+        
+        # audio timestamps count samples, the read time only corrects them when the two drift apart (drops or clock drift)
+        read_pts = max(0, (frame_packet.capture_ns - self.start_ns) * sample_rate // 10 ** 9)
+        next_pts = self.next_pts.get(device_id, read_pts)
+        drift = read_pts - next_pts
+        
+        if drift > self.audio_resync_threshold * sample_rate:
+            self.logger.debug(f"audio {frame_packet.device.name} behind by {drift / sample_rate:.3f}s, skipping ahead")
+            self.audio_resyncs += 1
+            next_pts = read_pts
+        elif drift < -self.audio_resync_threshold * sample_rate:
+            self.logger.debug(f"audio {frame_packet.device.name} ahead by {-drift / sample_rate:.3f}s, dropping packet")
+            self.audio_dropped += 1
+            return
+        
+        for av_frame in self.resamplers[device_id].resample(audio_frame_from_ndarray(frame_packet.frame, frame_packet.device)):
+            av_frame.pts = next_pts
+            av_frame.time_base = Fraction(1, sample_rate)
+            next_pts += av_frame.samples
+            self._mux(stream, av_frame)
+        
+        self.next_pts[device_id] = next_pts
+    
+    def close(self):
+        if self.container is None and len(self.pending) > 0:
+            self._open()
+        if self.container is None:
+            return
+        
+        # flush resamplers and encoders
+        for device_id, stream in self.streams.items():
+            if device_id in self.resamplers:
+                for av_frame in self.resamplers[device_id].resample(None):
+                    av_frame.pts = self.next_pts.get(device_id, 0)
+                    self.next_pts[device_id] = av_frame.pts + av_frame.samples
+                    self._mux(stream, av_frame)
+            self._mux(stream, None)
+        
+        self.container.close()
+        self.container = None
+        
+        self.logger.info(f"closed, audio resyncs: {self.audio_resyncs}, audio packets dropped: {self.audio_dropped}")
+
+class AVRecorder:
+    """
+    Records cameras and microphones into a single container (mkv by default) with one stream per device.
+    
+    Timestamps are derived from the packet read times instead of counting frames, so a dropped or late frame leaves a gap
+    (variable frame rate) rather than shifting everything after it. Audio timestamps follow the sample count and are
+    resynchronized to the read times when they drift apart by more than audio_resync_threshold seconds,
+    which keeps all streams aligned over long recordings.
+    """
+    
+    def __init__(
+        self, 
+        cameras: List[CameraDevice], 
+        microphones: List[AudioDevice],
+        proxy_pub_port: int, 
+        output_path: str,
+        video_codec: str = "h264",
+        audio_codec: str = "aac",
+        container_format: str = "mkv",
+        audio_resync_threshold: float = 0.1,
+        host: str = "127.0.0.1",
+        queue_size: int = 256,
+        registry_path: str = None):
+        self.logger = getLogger(f"{self.__class__.__name__}")
+        
+        devices = cameras + microphones
+        assert len(devices) > 0, "at least one camera or microphone is required"
+        assert len(np.unique([dev.device_id for dev in devices])) == len(devices), "All devices must have unique ids"
+        assert audio_resync_threshold > 0, "audio_resync_threshold must be positive"
+        
+        self.cameras = cameras
+        self.microphones = microphones
+        self.output_path = output_path
+        self.video_codec = video_codec
+        self.audio_codec = audio_codec
+        self.container_format = container_format
+        self.audio_resync_threshold = audio_resync_threshold
+        
+        self.stream_receiver = InputStreamReceiver(devices=devices, proxy_pub_port=proxy_pub_port, host=host, registry_path=registry_path)
+        
+        # a single worker, the muxer is not thread safe
+        self.queue_size = queue_size
+        self.work_queue = None
+        
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+            self.logger.debug(f"directory {output_path} created")
+    
+    def start(self):
+        assert self.work_queue is None, "trying to start a process that has already started"
+        self.stream_receiver.start()
+        self.work_queue = BoundedWorkQueue(
+            max_size=self.queue_size, 
+            num_workers=1, 
+            policy=BackpressurePolicy.DROP_NEWEST, 
+            name=self.__class__.__name__
+        )
+        self.work_queue.start()
+    
+    def stop(self):
+        self.stream_receiver.stop()
+        if self.work_queue is not None:
+            self.work_queue.stop()
+            self.logger.info(f"packet counters: {self.work_queue.counters()}")
+        self.work_queue = None
+    
+    def counters(self) -> WorkQueueCounters:
+        assert self.work_queue is not None, "counters are only available while the recorder is running"
+        return self.work_queue.counters()
+    
+    def record(self, recording_name: str, seconds: float, bad_frames_timeout: int = 25) -> str:
+        
+        file_uri = os.path.join(self.output_path, f"{recording_name}.{self.container_format}")
+        muxer = _AVMuxer(file_uri, self.cameras, self.microphones, self.video_codec, self.audio_codec, self.audio_resync_threshold)
+        
+        start_ns = None
+        timeout_counter = 0
+        
+        try:
+            
+            with tqdm.tqdm(total=seconds, desc="recording", unit="s") as tqdm_bar:
+                while True:
+                    
+                    frame_packet = self.stream_receiver.read_packet()
+                    
+                    if frame_packet is None:
+                        timeout_counter += 1
+                        self.logger.warning(f"timeout while waiting for packets: {timeout_counter}/{bad_frames_timeout}")
+                        assert timeout_counter < bad_frames_timeout, f"timeout while waiting for packets"
+                        continue
+                    
+                    timeout_counter = 0
+                    
+                    # the recording length follows the capture clock, not the number of frames
+                    capture_ns = frame_packet.capture_ns
+                    if start_ns is None:
+                        start_ns = capture_ns
+                    if capture_ns - start_ns >= seconds * 1e9:
+                        break
+                    
+                    if not self.work_queue.submit(muxer.write, frame_packet):
+                        self.stream_receiver.count_consumer_drop(frame_packet.device.device_id)
+                    
+                    tqdm_bar.n = round((capture_ns - start_ns) / 1e9, 2)
+                    tqdm_bar.refresh()
+            
+            self.logger.info(f"recording saved !")
+        
+        except Exception as e:
+            raise e
+        finally:
+            self.work_queue.join()
+            muxer.close()
+        
+        return file_uri
+
+class PreTriggerRecorder:
+    """
+    Keeps the last pre_trigger_seconds of every camera in memory, trigger() writes them to disk followed by the frames
+    of the next post_trigger_seconds, so a recording covers the time before an external event.
+    
+    With buffer_mode="jpeg" frames are buffered encoded and an event is written as tar shards, see shardIO.
+    The frames are encoded by num_workers threads, then buffered and written one at a time in the order they were received.
+    With buffer_mode="raw" frames are buffered in a preallocated ring and an event is one RawFrameWriter recording per camera,
+    an event extended past the size of a recording continues in <camera>-001, <camera>-002, ...
+    The buffer of a camera never exceeds max_buffer_bytes, older frames are evicted first, see memory_usage.
+    """
+    
+    def __init__(
+        self,
+        cameras: List[CameraDevice],
+        proxy_pub_port: int,
+        output_path: str,
+        pre_trigger_seconds: float = 5.,
+        post_trigger_seconds: float = 5.,
+        buffer_mode: str = "jpeg",
+        jpg_quality: int = 90,
+        max_buffer_bytes: int = 2 ** 29,
+        num_workers: int = 4,
+        queue_size: int = 32,
+        host: str = "127.0.0.1",
+        registry_path: str = None):
+        self.logger = getLogger(f"{self.__class__.__name__}")
+        
+        assert len(np.unique([cam.name for cam in cameras])) == len(cameras), "All cameras must have unique names"
+        assert buffer_mode in ("jpeg", "raw"), "buffer_mode must be either 'jpeg' or 'raw'"
+        assert pre_trigger_seconds > 0 and post_trigger_seconds >= 0, "pre_trigger_seconds must be positive and post_trigger_seconds not negative"
+        
+        self.cameras = {cam.device_id: cam for cam in cameras}
+        self.output_path = output_path
+        self.pre_trigger_ns = round(pre_trigger_seconds * 1e9)
+        self.post_trigger_ns = round(post_trigger_seconds * 1e9)
+        self.buffer_mode = buffer_mode
+        self.max_buffer_bytes = max_buffer_bytes
+        
+        if buffer_mode == "jpeg":
+            self.image_file = ImageFile(file_path=output_path, file_name="placeholder", file_extension="jpg", jpg_quality=jpg_quality, png_compression=0)
+            self.encoder = get_image_encoder("auto", "jpg")
+        
+        # jpeg frames are encoded in a work queue so the recorder thread only receives, packets are processed in ticket order
+        # so the queue blocks when it is full, a dropped ticket would stall all packets after it
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        self.work_queue = None
+        self.order = Condition()
+        self.received = 0 # ticket of the next received packet
+        self.processed = 0 # ticket of the next packet to buffer and write
+        
+        self.stream_receiver = InputStreamReceiver(devices=cameras, proxy_pub_port=proxy_pub_port, host=host, registry_path=registry_path)
+        
+        # one ring per camera, raw rings are allocated with the first frame when the frame geometry is known
+        self.rings: Dict[str, Union[RawFrameRing, EncodedFrameRing]] = {}
+        
+        # the event that is written, frames with a capture time in [event_start_ns, event_end_ns] are saved
+        self.event_name = None
+        self.event_start_ns = None
+        self.event_end_ns = None
+        self.event_writers = {} # RawFrameWriter per device id or a single ShardWriter
+        self.event_segments = {} # number of full RawFrameWriter recordings per device id
+        self.events = [] # output paths of the written events
+        
+        # trigger is called from other threads, the event is started by the thread processing the packets
+        # the lock guards the event window and the pending (name, start, end) window of the triggers that did not start yet
+        self.lock = Lock()
+        self.pending_trigger = None
+        self.stop_event = ThreadEvent()
+        self.thread = None
+    
+    def is_active(self): return self.thread is not None
+    
+    def is_recording(self): return self.event_name is not None
+    
+    def start(self):
+        assert not self.is_active(), "trying to start a recorder that has already started"
+        
+        self.stream_receiver.start()
+        if self.buffer_mode == "jpeg":
+            self.work_queue = BoundedWorkQueue(max_size=self.queue_size, num_workers=self.num_workers, name=self.__class__.__name__)
+            self.work_queue.start()
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+        self.stream_receiver.stop()
+        
+        # finish the received packets
+        if self.work_queue is not None:
+            self.work_queue.stop()
+            self.logger.info(f"packet counters: {self.work_queue.counters()}")
+        self.work_queue = None
+        
+        # every event trigger returned a name for is written
+        self._close_event()
+        self._start_pending_event()
+        self._close_event()
+        self.logger.info(f"buffer memory: {self.memory_usage()}")
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """bytes held by the buffer of every camera name"""
+        return {cam.name: self.rings[device_id].nbytes if device_id in self.rings else 0 for device_id, cam in self.cameras.items()}
+    
+    def trigger(self, event_name: str = None, trigger_ns: int = None) -> str:
+        """
+        Save the buffered frames up to pre_trigger_seconds before trigger_ns (now if None) and the following post_trigger_seconds.
+        A trigger overlapping the running event extends it, triggers before the next event starts are merged into one window.
+        Returns the name of the event directory in output_path the frames are written to.
+        """
+        if trigger_ns is None:
+            trigger_ns = time.time_ns()
+        if event_name is None:
+            event_name = datetime.now().strftime('%Y-%m-%d_%H-%M-%S-%f')
+        start_ns, end_ns = trigger_ns - self.pre_trigger_ns, trigger_ns + self.post_trigger_ns
+        
+        with self.lock:
+            if self.event_name is not None and start_ns <= self.event_end_ns:
+                self.event_end_ns = max(self.event_end_ns, end_ns)
+                self.logger.info(f"event {self.event_name} extended")
+                return self.event_name
+            
+            if self.pending_trigger is not None:
+                event_name, pending_start_ns, pending_end_ns = self.pending_trigger
+                start_ns, end_ns = min(start_ns, pending_start_ns), max(end_ns, pending_end_ns)
+            self.pending_trigger = (event_name, start_ns, end_ns)
+        
+        return event_name
+    
+    def _run(self):
+        while not self.stop_event.is_set():
+            frame_packet = self.stream_receiver.read_packet()
+            if frame_packet is None:
+                continue
+            if self.work_queue is None:
+                self.process(frame_packet)
+                continue
+            self.work_queue.submit(self._encode_and_process, frame_packet, self.received)
+            self.received += 1
+    
+    def _encode_and_process(self, frame_packet: FramePacket, ticket: int):
+        try:
+            data = self.encoder.encode(frame_packet.frame, self.image_file)
+        except Exception as e:
+            self.logger.error(f"could not encode frame: {e}")
+            data = None
+        
+        # the packets are encoded in parallel, the event state is only changed by the packet whose turn it is
+        with self.order:
+            while self.processed != ticket:
+                self.order.wait()
+        try:
+            if data is not None:
+                self.process(frame_packet, data)
+        finally:
+            with self.order:
+                self.processed += 1
+                self.order.notify_all()
+    
+    def process(self, frame_packet: FramePacket, data: bytes = None):
+        """buffer a received packet and write it if an event is running, data is the already encoded jpeg frame"""
+        camera = self.cameras[frame_packet.device.device_id]
+        capture_ns = frame_packet.capture_ns
+        
+        self._close_event(capture_ns)
+        self._start_pending_event()
+        
+        data = self._buffer(camera, frame_packet, data)
+        
+        if self.event_name is not None and capture_ns >= self.event_start_ns:
+            self._write(camera, data, capture_ns, frame_packet.sequence)
+    
+    def _buffer(self, camera: CameraDevice, frame_packet: FramePacket, data: bytes = None) -> Union[bytes, np.ndarray]:
+        ring = self.rings.get(camera.device_id)
+        
+        if self.buffer_mode == "jpeg":
+            if data is None:
+                data = self.encoder.encode(frame_packet.frame, self.image_file)
+            if ring is None:
+                ring = self.rings[camera.device_id] = EncodedFrameRing(self.pre_trigger_ns / 1e9, self.max_buffer_bytes)
+            ring.push(data, frame_packet.capture_ns, frame_packet.sequence)
+            return data
+        
+        if ring is None:
+            capacity = math.ceil(self.pre_trigger_ns / 1e9 * camera.fps) + 1
+            max_capacity = max(1, self.max_buffer_bytes // frame_packet.frame.nbytes)
+            if capacity > max_capacity:
+                self.logger.warning(f"buffer of {camera.name} is limited to {max_capacity / camera.fps:.1f}s by max_buffer_bytes")
+                capacity = max_capacity
+            ring = self.rings[camera.device_id] = RawFrameRing(capacity, frame_packet.frame.shape, frame_packet.frame.dtype)
+            self.logger.info(f"allocated {ring.nbytes / 2 ** 20:.1f}MB for {capacity} frames of {camera.name}")
+        ring.push(frame_packet.frame, frame_packet.capture_ns, frame_packet.sequence)
+        return frame_packet.frame
+    
+    def _start_pending_event(self):
+        # a pending window waits for the running event to close, it did not overlap with it
+        with self.lock:
+            if self.pending_trigger is None or self.event_name is not None:
+                return
+            self.event_name, self.event_start_ns, self.event_end_ns = self.pending_trigger
+            self.pending_trigger = None
+        self.logger.info(f"event {self.event_name} triggered, buffer memory: {self.memory_usage()}")
+        
+        for device_id, ring in self.rings.items():
+            for data, timestamp_ns, sequence in ring.since(self.event_start_ns):
+                self._write(self.cameras[device_id], data, timestamp_ns, sequence)
+    
+    def _write(self, camera: CameraDevice, data: Union[bytes, np.ndarray], timestamp_ns: int, sequence: int):
+        event_path = os.path.join(self.output_path, self.event_name)
+        
+        if self.buffer_mode == "jpeg":
+            if "shards" not in self.event_writers:
+                self.event_writers["shards"] = ShardWriter(event_path, prefix="frames")
+            self.event_writers["shards"].write(key=f"{sequence:010d}", device=camera.name, extension="jpg", data=data, timestamp_ns=timestamp_ns, sequence=sequence)
+            return
+        
+        writer = self.event_writers.get(camera.device_id)
+        if writer is not None and writer.is_full():
+            # repeated triggers extend the event without limit, it continues in a new recording
+            writer.close()
+            writer = None
+            self.event_segments[camera.device_id] = self.event_segments.get(camera.device_id, 0) + 1
+        if writer is None:
+            # room for the buffer and one extension of the post trigger window
+            segment = self.event_segments.get(camera.device_id, 0)
+            writer = self.event_writers[camera.device_id] = RawFrameWriter(
+                file_prefix=os.path.join(event_path, camera.name if segment == 0 else f"{camera.name}-{segment:03d}"),
+                shape=data.shape,
+                dtype=data.dtype,
+                max_frames=self.rings[camera.device_id].capacity + math.ceil(2 * self.post_trigger_ns / 1e9 * camera.fps) + 1,
+                metadata={"device": camera.model_dump(), "event_start_ns": self.event_start_ns}
+            )
+        writer.write(data, timestamp_ns)
+    
+    def _close_event(self, capture_ns: int = None):
+        """close the running event, with capture_ns only once the packet captured then is past the end of the event"""
+        with self.lock:
+            if self.event_name is None or (capture_ns is not None and capture_ns <= self.event_end_ns):
+                return
+            event_name, event_writers = self.event_name, self.event_writers
+            self.event_name = None
+            self.event_start_ns = None
+            self.event_end_ns = None
+            self.event_writers = {}
+            self.event_segments = {}
+        
+        for writer in event_writers.values():
+            writer.close()
+        
+        self.events.append(os.path.join(self.output_path, event_name))
+        self.logger.info(f"event {event_name} saved")
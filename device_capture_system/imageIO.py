@@ -0,0 +1,260 @@
+import io
+import importlib.util
+import numpy as np
+
+from abc import ABC, abstractmethod
+from fractions import Fraction
+from logging import getLogger
+from typing import Dict, List, Type
+
+from .datamodel import ImageFile
+from .utils import lazy_import
+
+av = lazy_import("av")
+Image = lazy_import("PIL.Image")
+
+# pixel formats frames can be passed in as: packed rgb (h, w, 3), planar I420 (h * 3 / 2, w) and grayscale (h, w)
+PIXEL_FORMATS = ("rgb24", "yuv420p", "gray")
+
+# ------------------- HELPERS ------------------- #
+
+def frame_to_rgb(frame: np.ndarray, pixel_format: str) -> np.ndarray:
+    if pixel_format == "rgb24":
+        return frame
+    elif pixel_format == "yuv420p":
+        return av.VideoFrame.from_ndarray(frame, format="yuv420p").reformat(format="rgb24").to_ndarray()
+    elif pixel_format == "gray":
+        return np.repeat(frame[..., None], 3, axis=2)
+    raise ValueError(f"pixel_format must be one of {PIXEL_FORMATS}, not {pixel_format}")
+
+def frame_size(frame: np.ndarray, pixel_format: str):
+    """width and height of the image stored in frame"""
+    if pixel_format == "yuv420p":
+        return frame.shape[1], frame.shape[0] * 2 // 3
+    return frame.shape[1], frame.shape[0]
+
+def resize_frame(frame: np.ndarray, width: int, height: int) -> np.ndarray:
+    """area interpolated resize of a rgb24 or gray frame, the fast and alias free way to downscale"""
+    frame = np.ascontiguousarray(frame)
+    if importlib.util.find_spec("cv2") is not None:
+        import cv2
+        return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    return np.asarray(Image.fromarray(frame).resize((width, height), Image.Resampling.BOX))
+
+# ------------------- BASE CLASS ------------------- #
+
+class ImageEncoder(ABC):
+    """Encodes a single frame into the bytes of an image file, configured through ImageFile"""
+    
+    name: str = None
+    file_extensions: tuple = ()
+    
+    def __init__(self):
+        self.logger = getLogger(f"{self.__class__.__name__}")
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+    
+    @classmethod
+    def supports(cls, file_extension: str) -> bool:
+        return file_extension in cls.file_extensions
+    
+    @abstractmethod
+    def encode(self, frame: np.ndarray, image_file: ImageFile, pixel_format: str = "rgb24") -> bytes:
+        pass
+
+# ------------------- ENCODERS ------------------- #
+
+class OpenCVImageEncoder(ImageEncoder):
+    """libjpeg-turbo, libpng and libwebp through cv2.imencode, releases the GIL while encoding"""
+    
+    name = "opencv"
+    file_extensions = ("jpg", "png", "webp")
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        return importlib.util.find_spec("cv2") is not None
+    
+    def encode(self, frame: np.ndarray, image_file: ImageFile, pixel_format: str = "rgb24") -> bytes:
+        import cv2
+        
+        # opencv expects bgr, convert directly from the input format to avoid an intermediate rgb frame
+        if pixel_format == "rgb24":
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        elif pixel_format == "yuv420p":
+            frame = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420)
+        elif pixel_format != "gray":
+            raise ValueError(f"pixel_format must be one of {PIXEL_FORMATS}, not {pixel_format}")
+        
+        if image_file.file_extension == "jpg":
+            params = [
+                cv2.IMWRITE_JPEG_QUALITY, image_file.jpg_quality,
+                cv2.IMWRITE_JPEG_OPTIMIZE, int(image_file.jpg_optimize),
+                cv2.IMWRITE_JPEG_PROGRESSIVE, int(image_file.jpg_progressive),
+            ]
+            if image_file.jpg_subsampling is not None and hasattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR"):
+                params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, {
+                    "4:4:4": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+                    "4:2:2": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+                    "4:2:0": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+                }[image_file.jpg_subsampling]]
+        elif image_file.file_extension == "png":
+            params = [cv2.IMWRITE_PNG_COMPRESSION, image_file.png_compression]
+        elif image_file.file_extension == "webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, image_file.webp_quality]
+        else:
+            raise ValueError(f"{self.name} encoder does not support {image_file.file_extension}")
+        
+        ok, data = cv2.imencode(f".{image_file.file_extension}", frame, params)
+        if not ok:
+            raise RuntimeError(f"{self.name} encoder failed to encode {image_file.file_extension}")
+        return data.tobytes()
+
+class PILImageEncoder(ImageEncoder):
+    
+    name = "pil"
+    file_extensions = ("jpg", "png", "webp")
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        return importlib.util.find_spec("PIL") is not None
+    
+    def encode(self, frame: np.ndarray, image_file: ImageFile, pixel_format: str = "rgb24") -> bytes:
+        
+        image = Image.fromarray(frame if pixel_format == "gray" else frame_to_rgb(frame, pixel_format))
+        buffer = io.BytesIO()
+        
+        if image_file.file_extension == "jpg":
+            options = {
+                "quality": image_file.jpg_quality, 
+                "optimize": image_file.jpg_optimize, 
+                "progressive": image_file.jpg_progressive
+            }
+            if image_file.jpg_subsampling is not None:
+                options["subsampling"] = image_file.jpg_subsampling
+            image.save(buffer, format="JPEG", **options)
+        elif image_file.file_extension == "png":
+            image.save(buffer, format="PNG", compress_level=image_file.png_compression)
+        elif image_file.file_extension == "webp":
+            image.save(buffer, format="WEBP", quality=image_file.webp_quality)
+        else:
+            raise ValueError(f"{self.name} encoder does not support {image_file.file_extension}")
+        
+        return buffer.getvalue()
+
+class PyAVImageEncoder(ImageEncoder):
+    """
+    ffmpeg image encoders through PyAV, planar yuv420p frames are encoded without an rgb conversion.
+    The mjpeg encoder has no progressive mode, jpg_progressive is ignored.
+    """
+    
+    name = "av"
+    file_extensions = ("jpg", "png", "webp")
+    
+    CODECS = {"jpg": "mjpeg", "png": "png", "webp": "libwebp"}
+    JPEG_PIXEL_FORMATS = {"4:4:4": "yuvj444p", "4:2:2": "yuvj422p", "4:2:0": "yuvj420p", None: "yuvj420p"}
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        return importlib.util.find_spec("av") is not None
+    
+    @classmethod
+    def supports(cls, file_extension: str) -> bool:
+        return file_extension in cls.CODECS and cls.CODECS[file_extension] in av.codecs_available
+    
+    def encode(self, frame: np.ndarray, image_file: ImageFile, pixel_format: str = "rgb24") -> bytes:
+        
+        if not self.supports(image_file.file_extension):
+            raise ValueError(f"{self.name} encoder does not support {image_file.file_extension}")
+        
+        width, height = frame_size(frame, pixel_format)
+        
+        codec_context = av.CodecContext.create(self.CODECS[image_file.file_extension], "w")
+        codec_context.width = width
+        codec_context.height = height
+        codec_context.time_base = Fraction(1, 1)
+        
+        if image_file.file_extension == "jpg":
+            # map quality 100..0 to the mjpeg quantizer scale 2..31
+            qscale = round(2 + (100 - image_file.jpg_quality) * 29 / 100)
+            codec_context.pix_fmt = self.JPEG_PIXEL_FORMATS[image_file.jpg_subsampling]
+            codec_context.options = {"qmin": str(qscale), "qmax": str(qscale), "huffman": "optimal" if image_file.jpg_optimize else "default"}
+        elif image_file.file_extension == "png":
+            codec_context.pix_fmt = "gray" if pixel_format == "gray" else "rgb24"
+            codec_context.options = {"compression_level": str(image_file.png_compression)}
+        else:
+            codec_context.pix_fmt = "yuv420p"
+            codec_context.options = {"quality": str(image_file.webp_quality)}
+        
+        av_frame = av.VideoFrame.from_ndarray(frame, format=pixel_format)
+        if av_frame.format.name != codec_context.pix_fmt:
+            av_frame = av_frame.reformat(format=codec_context.pix_fmt)
+        
+        packets = codec_context.encode(av_frame) + codec_context.encode(None)
+        return b"".join([bytes(packet) for packet in packets])
+
+class RawArrayEncoder(ImageEncoder):
+    """lossless, uncompressed .npy serialisation of the frame as it is"""
+    
+    name = "npy"
+    file_extensions = ("npy",)
+    
+    def encode(self, frame: np.ndarray, image_file: ImageFile, pixel_format: str = "rgb24") -> bytes:
+        buffer = io.BytesIO()
+        np.lib.format.write_array(buffer, np.ascontiguousarray(frame), allow_pickle=False)
+        return buffer.getvalue()
+
+# ------------------- DECODING ------------------- #
+
+def decode_image(data: bytes) -> np.ndarray:
+    """decode an encoded image (or .npy array) into an array, images are returned as rgb24"""
+    
+    if data[:6] == b"\x93NUMPY":
+        return np.load(io.BytesIO(data), allow_pickle=False)
+    
+    if importlib.util.find_spec("cv2") is not None:
+        import cv2
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if image is not None:
+            if image.ndim == 3 and image.shape[2] == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            elif image.ndim == 3 and image.shape[2] == 4:
+                image = cv2.cvtColor(image, cv2.COLOR_BGRA2RGB)
+            return image
+    
+    image = Image.open(io.BytesIO(data))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    return np.asarray(image)
+
+# ------------------- ENCODER SELECTION ------------------- #
+
+IMAGE_ENCODERS: Dict[str, Type[ImageEncoder]] = {
+    OpenCVImageEncoder.name: OpenCVImageEncoder,
+    PILImageEncoder.name: PILImageEncoder,
+    PyAVImageEncoder.name: PyAVImageEncoder,
+    RawArrayEncoder.name: RawArrayEncoder,
+}
+
+# fastest first for the rgb24 frames ImageSaver receives, measured with benchmarks/benchmark_image_encoders.py at 2560x1440
+# over 30 encodes: jpg q95 opencv 28ms, pil 35ms, av 62ms, png opencv is also faster than pil, only av png is faster but 25% larger
+IMAGE_ENCODER_PRIORITY: List[str] = ["opencv", "pil", "av", "npy"]
+
+def get_image_encoder(name: str = "auto", file_extension: str = "jpg") -> ImageEncoder:
+    """
+    Instantiate the encoder backend called name, or with name="auto" the fastest available backend supporting file_extension
+    """
+    if name != "auto":
+        assert name in IMAGE_ENCODERS, f"unknown image encoder {name}, expected one of {list(IMAGE_ENCODERS)}"
+        encoder_class = IMAGE_ENCODERS[name]
+        assert encoder_class.is_available(), f"image encoder {name} is not available"
+        assert encoder_class.supports(file_extension), f"image encoder {name} does not support {file_extension}"
+        return encoder_class()
+    
+    for encoder_name in IMAGE_ENCODER_PRIORITY:
+        encoder_class = IMAGE_ENCODERS[encoder_name]
+        if encoder_class.is_available() and encoder_class.supports(file_extension):
+            return encoder_class()
+    
+    raise ValueError(f"no available image encoder supports {file_extension}")
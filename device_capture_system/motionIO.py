@@ -0,0 +1,89 @@
+import numpy as np
+
+from logging import getLogger
+from typing import Tuple, Union
+
+from .datamodel import ChangeDetection
+
+# ------------------- THUMBNAILS ------------------- #
+
+def gray_thumbnail(frame: np.ndarray, block_size: int) -> np.ndarray:
+    """
+    float32 grayscale thumbnail with the mean of every block_size x block_size block of a gray (h, w) or (h, w, c) frame,
+    the averaging suppresses sensor noise and the whole frame is reduced in one vectorized pass.
+    """
+    height, width = frame.shape[0] // block_size, frame.shape[1] // block_size
+    assert height > 0 and width > 0, f"frame {frame.shape} is smaller than a block of {block_size} pixels"
+    
+    blocks = frame[:height * block_size, :width * block_size]
+    if blocks.ndim == 2:
+        return blocks.reshape(height, block_size, width, block_size).mean(axis=(1, 3), dtype=np.float32)
+    return blocks.reshape(height, block_size, width, block_size, -1).mean(axis=(1, 3, 4), dtype=np.float32)
+
+# ------------------- CHANGE DETECTOR ------------------- #
+
+class ChangeDetector:
+    """
+    Decides per frame whether a sender publishes it and tracks the motion state of a camera.
+    
+    A frame changed if more than min_changed_fraction of its thumbnail blocks differ by more than block_threshold from the
+    thumbnail of the last published frame, so a slow drift is published once it adds up. Motion starts with a changed frame
+    and stops motion_hold_seconds after the last one. Outside of motion unchanged frames are suppressed, except for a keep
+    alive every keep_alive_seconds.
+    """
+    
+    def __init__(self, config: ChangeDetection, name: str = None):
+        self.logger = getLogger(f"{self.__class__.__name__}@{name}" if name is not None else self.__class__.__name__)
+        
+        self.config = config
+        self.keep_alive_ns = round(config.keep_alive_seconds * 1e9)
+        self.motion_hold_ns = round(config.motion_hold_seconds * 1e9)
+        
+        self.reference = None # thumbnail of the last published frame
+        self.last_sent_ns = None
+        self.last_change_ns = None
+        self.in_motion = False
+        
+        self.changed = 0
+        self.suppressed = 0
+    
+    def changed_fraction(self, thumbnail: np.ndarray) -> float:
+        if self.reference.shape != thumbnail.shape:
+            return 1.
+        return float(np.count_nonzero(np.abs(thumbnail - self.reference) > self.config.block_threshold)) / thumbnail.size
+    
+    def update(self, frame: np.ndarray, capture_ns: int) -> Tuple[bool, Union[bool, None]]:
+        """whether frame is published, and the new motion state if motion started (True) or stopped (False) with it"""
+        thumbnail = gray_thumbnail(frame, self.config.block_size)
+        
+        # the first frame is the reference of the scene, not a change
+        if self.reference is None:
+            self.reference = thumbnail
+            self.last_sent_ns = capture_ns
+            return True, None
+        
+        changed = self.changed_fraction(thumbnail) > self.config.min_changed_fraction
+        
+        motion_event = None
+        if changed:
+            self.changed += 1
+            self.last_change_ns = capture_ns
+            if not self.in_motion:
+                self.in_motion = True
+                motion_event = True
+        elif self.in_motion and capture_ns - self.last_change_ns > self.motion_hold_ns:
+            self.in_motion = False
+            motion_event = False
+        
+        # frames are only suppressed outside of motion, so recordings of a moving scene keep the full frame rate
+        send = not self.config.suppress or self.in_motion or capture_ns - self.last_sent_ns >= self.keep_alive_ns
+        if send:
+            self.reference = thumbnail
+            self.last_sent_ns = capture_ns
+        else:
+            self.suppressed += 1
+        
+        if motion_event is not None:
+            self.logger.info(f"motion {'started' if motion_event else 'stopped'}, {self.suppressed} frames suppressed so far")
+        
+        return send, motion_event
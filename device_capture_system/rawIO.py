@@ -0,0 +1,149 @@
+import os
+import json
+import numpy as np
+
+from logging import getLogger
+from typing import Tuple, Union
+
+# ------------------- RAW FRAME WRITER ------------------- #
+
+class RawFrameWriter:
+    """
+    Appends fixed size frames to a preallocated, memory mapped .npy file with a parallel int64 timestamp index.
+    
+    A recording <file_prefix> consists of
+        <file_prefix>.frames.npy      (max_frames, *shape) frames
+        <file_prefix>.timestamps.npy  (max_frames,) timestamps in ns, 0 for unwritten slots
+        <file_prefix>.json            header with shape, dtype and number of written frames
+    Both .npy files can also be opened with np.load(..., mmap_mode="r").
+    """
+    
+    def __init__(self, file_prefix: str, shape: Tuple[int, ...], dtype: Union[str, np.dtype], max_frames: int, metadata: dict = {}):
+        self.logger = getLogger(f"{self.__class__.__name__}@{os.path.basename(file_prefix)}")
+        
+        assert max_frames > 0, "max_frames must be positive"
+        
+        self.file_prefix = file_prefix
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.max_frames = max_frames
+        self.metadata = metadata
+        self.count = 0
+        
+        directory = os.path.dirname(file_prefix)
+        if directory != "" and not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        self.frames = np.lib.format.open_memmap(f"{file_prefix}.frames.npy", mode="w+", dtype=self.dtype, shape=(max_frames, *self.shape))
+        self.timestamps = np.lib.format.open_memmap(f"{file_prefix}.timestamps.npy", mode="w+", dtype=np.int64, shape=(max_frames,))
+        
+        # reserve the blocks up front so the file does not fragment and a full disk fails here instead of mid recording
+        self._preallocate(f"{file_prefix}.frames.npy")
+        
+        self._write_header()
+        
+        self.logger.info(f"preallocated {max_frames} frames of {self.shape} {self.dtype} ({self.frames.nbytes / 2 ** 20:.1f}MB)")
+    
+    @staticmethod
+    def _preallocate(file_uri: str):
+        if not hasattr(os, "posix_fallocate"):
+            return
+        with open(file_uri, "r+b") as f:
+            os.posix_fallocate(f.fileno(), 0, os.path.getsize(file_uri))
+    
+    def _write_header(self):
+        with open(f"{self.file_prefix}.json", "w") as f:
+            json.dump({
+                "shape": list(self.shape),
+                "dtype": self.dtype.str,
+                "max_frames": self.max_frames,
+                "count": self.count,
+                "metadata": self.metadata
+            }, f)
+    
+    def is_active(self): return self.frames is not None
+    
+    def is_full(self): return self.count >= self.max_frames
+    
+    def write(self, frame: np.ndarray, timestamp_ns: int) -> bool:
+        
+        if not self.is_active():
+            self.logger.warning("trying to write to a closed writer")
+            return False
+        
+        if self.is_full():
+            self.logger.warning(f"recording is full ({self.max_frames} frames), frame dropped")
+            return False
+        
+        assert frame.shape == self.shape, f"frame shape {frame.shape} does not match recording shape {self.shape}"
+        
+        # a plain copy into the page cache, the kernel writes it back to disk in the background
+        self.frames[self.count] = frame
+        self.timestamps[self.count] = timestamp_ns
+        self.count += 1
+        
+        return True
+    
+    def flush(self):
+        self.frames.flush()
+        self.timestamps.flush()
+        self._write_header()
+    
+    def close(self):
+        if not self.is_active():
+            return
+        
+        self.flush()
+        self.frames = None
+        self.timestamps = None
+        
+        self.logger.info(f"closed with {self.count}/{self.max_frames} frames")
+
+# ------------------- RAW FRAME READER ------------------- #
+
+class RawFrameReader:
+    """
+    Zero copy access to a recording written by RawFrameWriter, frames are returned as np.memmap views.
+    """
+    
+    def __init__(self, file_prefix: str):
+        self.logger = getLogger(f"{self.__class__.__name__}@{os.path.basename(file_prefix)}")
+        
+        with open(f"{file_prefix}.json", "r") as f:
+            self.header = json.load(f)
+        
+        frames = np.load(f"{file_prefix}.frames.npy", mmap_mode="r")
+        timestamps = np.load(f"{file_prefix}.timestamps.npy", mmap_mode="r")
+        
+        # if the writer was not closed the header count is stale, written slots have a timestamp
+        count = self.header["count"]
+        if count < len(timestamps) and timestamps[count] != 0:
+            count = int(np.count_nonzero(timestamps))
+            self.logger.warning(f"recording was not closed, recovered {count} frames from the timestamp index")
+        
+        self.frames = frames[:count]
+        self.timestamps = timestamps[:count]
+    
+    def __len__(self):
+        return len(self.frames)
+    
+    def __getitem__(self, index) -> np.ndarray:
+        return self.frames[index]
+    
+    @property
+    def metadata(self) -> dict:
+        return self.header["metadata"]
+    
+    def index_of(self, timestamp_ns: int) -> int:
+        """index of the frame closest in time to timestamp_ns"""
+        assert len(self) > 0, "recording is empty"
+        
+        i = int(np.searchsorted(self.timestamps, timestamp_ns))
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(self)]
+        return min(candidates, key=lambda j: abs(int(self.timestamps[j]) - timestamp_ns))
+    
+    def range(self, start_ns: int, end_ns: int) -> Tuple[np.ndarray, np.ndarray]:
+        """frames and timestamps with start_ns <= timestamp <= end_ns as views into the recording"""
+        start = int(np.searchsorted(self.timestamps, start_ns, side="left"))
+        end = int(np.searchsorted(self.timestamps, end_ns, side="right"))
+        return self.frames[start:end], self.timestamps[start:end]
@@ -0,0 +1,91 @@
+import numpy as np
+
+from collections import deque
+from typing import Iterator, Tuple, Union
+
+# ------------------- RAW FRAME RING ------------------- #
+
+class RawFrameRing:
+    """
+    The last capacity frames of one shape and dtype in a ring that is allocated once, overwriting the oldest frame.
+    Memory use is fixed at nbytes, frames are copied in and handed out as views into the ring.
+    """
+    
+    def __init__(self, capacity: int, shape: Tuple[int, ...], dtype: Union[str, np.dtype]):
+        assert capacity > 0, "capacity must be positive"
+        
+        self.capacity = capacity
+        self.frames = np.empty((capacity, *shape), dtype=dtype)
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.sequences = np.zeros(capacity, dtype=np.int64)
+        self.next = 0 # slot of the next frame
+        self.count = 0
+    
+    def __len__(self):
+        return self.count
+    
+    @property
+    def nbytes(self) -> int:
+        return self.frames.nbytes + self.timestamps.nbytes + self.sequences.nbytes
+    
+    def push(self, frame: np.ndarray, timestamp_ns: int, sequence: int = 0):
+        assert frame.shape == self.frames.shape[1:], f"frame shape {frame.shape} does not match ring shape {self.frames.shape[1:]}"
+        
+        self.frames[self.next] = frame
+        self.timestamps[self.next] = timestamp_ns
+        self.sequences[self.next] = sequence
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+    
+    def since(self, timestamp_ns: int) -> Iterator[Tuple[np.ndarray, int, int]]:
+        """(frame, timestamp, sequence) of the frames at or after timestamp_ns, oldest first"""
+        oldest = (self.next - self.count) % self.capacity
+        for i in range(self.count):
+            slot = (oldest + i) % self.capacity
+            if self.timestamps[slot] >= timestamp_ns:
+                yield self.frames[slot], int(self.timestamps[slot]), int(self.sequences[slot])
+    
+    def clear(self):
+        self.next = 0
+        self.count = 0
+
+# ------------------- ENCODED FRAME RING ------------------- #
+
+class EncodedFrameRing:
+    """
+    Encoded frames of the last seconds, newest frame time minus seconds, or fewer when their size exceeds max_bytes.
+    Compressed frames keep much longer histories in the same memory than a RawFrameRing, at the cost of encoding every frame.
+    """
+    
+    def __init__(self, seconds: float, max_bytes: int):
+        assert seconds > 0, "seconds must be positive"
+        assert max_bytes > 0, "max_bytes must be positive"
+        
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.items = deque() # (data, timestamp, sequence)
+        self.nbytes = 0
+        self.evicted = 0 # frames evicted for the size limit before they were seconds old
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def push(self, data: bytes, timestamp_ns: int, sequence: int = 0):
+        self.items.append((data, timestamp_ns, sequence))
+        self.nbytes += len(data)
+        
+        while len(self.items) > 1 and self.items[0][1] < timestamp_ns - self.seconds * 1e9:
+            self.nbytes -= len(self.items.popleft()[0])
+        while len(self.items) > 1 and self.nbytes > self.max_bytes:
+            self.nbytes -= len(self.items.popleft()[0])
+            self.evicted += 1
+    
+    def since(self, timestamp_ns: int) -> Iterator[Tuple[bytes, int, int]]:
+        """(data, timestamp, sequence) of the frames at or after timestamp_ns, oldest first"""
+        for data, timestamp, sequence in list(self.items):
+            if timestamp >= timestamp_ns:
+                yield data, timestamp, sequence
+    
+    def clear(self):
+        self.items.clear()
+        self.nbytes = 0
@@ -0,0 +1,200 @@
+import os
+import io
+import re
+import glob
+import tarfile
+import numpy as np
+
+from logging import getLogger
+from threading import Lock
+from typing import Dict, List, Union
+
+from .datamodel import ShardRecord
+from .imageIO import decode_image
+
+# ------------------- SHARD WRITER ------------------- #
+
+class ShardWriter:
+    """
+    Appends encoded images or raw arrays to WebDataset style tar shards, rotating to a new shard when max_shard_size is reached.
+    Every shard has an append only index (<shard>.index.jsonl) with one ShardRecord per sample,
+    holding timestamps, device, sequence and the byte range of the sample in the tar file.
+    Writes are thread safe.
+    """
+    
+    def __init__(self, output_path: str, prefix: str, max_shard_size: int = 2 ** 30, fsync: bool = False):
+        self.logger = getLogger(f"{self.__class__.__name__}@{prefix}")
+        
+        assert max_shard_size > 0, "max_shard_size must be positive"
+        
+        self.output_path = output_path
+        self.prefix = prefix
+        self.max_shard_size = max_shard_size
+        self.fsync = fsync
+        
+        self.lock = Lock()
+        self.shard_index = -1
+        self.shard_file = None
+        self.tar = None
+        self.index_file = None
+        self.records_in_shard = 0
+        
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+        
+        # continue after existing shards instead of overwriting them
+        existing_shards = sorted(glob.glob(os.path.join(output_path, f"{prefix}-*.tar")))
+        if len(existing_shards) > 0:
+            self.shard_index = int(re.findall(r"-(\d+)\.tar$", existing_shards[-1])[0])
+    
+    def is_active(self): return self.tar is not None
+    
+    def _shard_name(self) -> str:
+        return f"{self.prefix}-{self.shard_index:06d}.tar"
+    
+    def _open_next_shard(self):
+        self._close_shard()
+        
+        self.shard_index += 1
+        shard_uri = os.path.join(self.output_path, self._shard_name())
+        
+        self.shard_file = open(shard_uri, "wb")
+        self.tar = tarfile.open(fileobj=self.shard_file, mode="w", format=tarfile.PAX_FORMAT)
+        self.index_file = open(f"{shard_uri}.index.jsonl", "w")
+        self.records_in_shard = 0
+        
+        self.logger.info(f"writing shard {shard_uri}")
+    
+    def _close_shard(self):
+        if self.tar is None:
+            return
+        
+        self.tar.close()
+        self.index_file.close()
+        if self.fsync:
+            os.fsync(self.shard_file.fileno())
+        self.shard_file.close()
+        
+        self.tar = None
+        self.shard_file = None
+        self.index_file = None
+    
+    def close(self):
+        with self.lock:
+            self._close_shard()
+    
+    def write(self, key: str, device: str, extension: str, data: bytes, timestamp_ns: int, sequence: int = 0) -> ShardRecord:
+        
+        # dots separate key and field in webdataset names
+        member_name = f"{key.replace('.', '_')}.{device.replace('.', '_')}.{extension}"
+        
+        tarinfo = tarfile.TarInfo(member_name)
+        tarinfo.size = len(data)
+        tarinfo.mtime = timestamp_ns // 10 ** 9
+        
+        with self.lock:
+            
+            # rotate before the shard would exceed its size, a shard always holds at least one sample
+            if self.tar is None or (self.records_in_shard > 0 and self.tar.offset + 512 + len(data) > self.max_shard_size):
+                self._open_next_shard()
+            
+            self.tar.addfile(tarinfo, io.BytesIO(data))
+            
+            # the data ends at the current offset, padded to full tar blocks
+            offset = self.tar.offset - (len(data) + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+            
+            record = ShardRecord(
+                key=key,
+                device=device,
+                timestamp_ns=timestamp_ns,
+                sequence=sequence,
+                shard=self._shard_name(),
+                member=member_name,
+                offset=offset,
+                size=len(data)
+            )
+            self.index_file.write(record.model_dump_json() + "\n")
+            self.index_file.flush()
+            self.records_in_shard += 1
+        
+        return record
+
+# ------------------- SHARD READER ------------------- #
+
+class ShardReader:
+    """
+    Random access to samples written by ShardWriter through the shard indices, by position or timestamp.
+    """
+    
+    def __init__(self, output_path: str, prefix: str = None):
+        self.logger = getLogger(f"{self.__class__.__name__}@{output_path}")
+        
+        self.output_path = output_path
+        self.files = {}
+        
+        pattern = f"{prefix}-*.tar.index.jsonl" if prefix is not None else "*.tar.index.jsonl"
+        records = []
+        for index_uri in sorted(glob.glob(os.path.join(output_path, pattern))):
+            with open(index_uri, "r") as f:
+                # a partially written last line is skipped, the sample it describes may be incomplete
+                for line in f:
+                    try:
+                        records.append(ShardRecord.model_validate_json(line))
+                    except ValueError:
+                        self.logger.warning(f"skipping incomplete index entry in {index_uri}")
+        
+        records.sort(key=lambda record: record.timestamp_ns)
+        
+        # per device timestamp arrays for binary search
+        self.records: Dict[str, List[ShardRecord]] = {}
+        for record in records:
+            self.records.setdefault(record.device, []).append(record)
+        self.timestamps = {device: np.array([r.timestamp_ns for r in device_records], dtype=np.int64) for device, device_records in self.records.items()}
+    
+    def __len__(self):
+        return sum([len(records) for records in self.records.values()])
+    
+    def devices(self) -> List[str]:
+        return list(self.records)
+    
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+    
+    def read(self, record: ShardRecord) -> bytes:
+        if record.shard not in self.files:
+            self.files[record.shard] = open(os.path.join(self.output_path, record.shard), "rb")
+        f = self.files[record.shard]
+        f.seek(record.offset)
+        return f.read(record.size)
+    
+    def load(self, record: ShardRecord) -> np.ndarray:
+        """read and decode a sample into an array"""
+        return decode_image(self.read(record))
+    
+    def nearest(self, device: str, timestamp_ns: int) -> Union[ShardRecord, None]:
+        """record of device closest in time to timestamp_ns"""
+        timestamps = self.timestamps.get(device)
+        if timestamps is None or len(timestamps) == 0:
+            return None
+        
+        i = int(np.searchsorted(timestamps, timestamp_ns))
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(timestamps)]
+        best = min(candidates, key=lambda j: abs(int(timestamps[j]) - timestamp_ns))
+        return self.records[device][best]
+    
+    def range(self, start_ns: int, end_ns: int, device: str = None) -> List[ShardRecord]:
+        """records with start_ns <= timestamp_ns <= end_ns, for one or all devices, ordered by time"""
+        devices = [device] if device is not None else self.devices()
+        
+        output = []
+        for dev in devices:
+            if dev not in self.timestamps:
+                continue
+            start = int(np.searchsorted(self.timestamps[dev], start_ns, side="left"))
+            end = int(np.searchsorted(self.timestamps[dev], end_ns, side="right"))
+            output += self.records[dev][start:end]
+        
+        output.sort(key=lambda record: record.timestamp_ns)
+        return output
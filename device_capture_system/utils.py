@@ -0,0 +1,151 @@
+import sys
+import importlib.util
+
+from types import ModuleType
+from typing import Callable
+from collections import deque
+from logging import getLogger
+from threading import Thread, Condition
+
+from .datamodel import BackpressurePolicy, WorkQueueCounters
+
+# ------------------- LAZY IMPORTS ------------------- #
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Import a module on first attribute access instead of at import time,
+    so heavy codec and imaging libraries are only loaded by processes that use them.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    
+    return module
+
+# ------------------- WORK QUEUES ------------------- #
+
+class BoundedWorkQueue:
+    """
+    Worker threads consuming a bounded FIFO of (function, args) items.
+    When the queue is full, submit blocks or drops the oldest or the newest item depending on the policy.
+    All bookkeeping is O(1) per item.
+    """
+    
+    def __init__(self, max_size: int, num_workers: int, policy: BackpressurePolicy = BackpressurePolicy.BLOCK, name: str = None):
+        self.logger = getLogger(name if name is not None else self.__class__.__name__)
+        
+        assert max_size > 0, "max_size must be positive"
+        assert num_workers > 0, "num_workers must be positive"
+        
+        self.max_size = max_size
+        self.num_workers = num_workers
+        self.policy = policy
+        self.name = name if name is not None else self.__class__.__name__
+        
+        self.queue = deque()
+        self.condition = Condition()
+        self.workers = []
+        self.running = False
+        
+        self.submitted = 0
+        self.in_progress = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+    
+    def is_active(self): return self.running
+    
+    def start(self):
+        assert not self.is_active(), "trying to start a work queue that has already started"
+        
+        self.running = True
+        self.workers = [Thread(target=self._run, name=f"{self.name}-{i}", daemon=True) for i in range(self.num_workers)]
+        for worker in self.workers:
+            worker.start()
+    
+    def stop(self):
+        """Stop accepting items and wait until all queued items are processed."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+    
+    def join(self):
+        """Wait until all queued items are processed, the queue keeps accepting items."""
+        with self.condition:
+            while len(self.queue) > 0 or self.in_progress > 0:
+                self.condition.wait()
+    
+    def submit(self, function: Callable, *args) -> bool:
+        """Queue function(*args), returns False if the item was dropped."""
+        with self.condition:
+            assert self.running, "trying to submit to a work queue that is not running"
+            
+            self.submitted += 1
+            
+            if len(self.queue) >= self.max_size:
+                if self.policy == BackpressurePolicy.DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                elif self.policy == BackpressurePolicy.DROP_OLDEST:
+                    self.queue.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self.queue) >= self.max_size and self.running:
+                        self.condition.wait()
+            
+            self.queue.append((function, args))
+            self.condition.notify_all()
+        
+        return True
+    
+    def counters(self) -> WorkQueueCounters:
+        with self.condition:
+            return WorkQueueCounters(
+                submitted=self.submitted,
+                queued=len(self.queue),
+                in_progress=self.in_progress,
+                completed=self.completed,
+                failed=self.failed,
+                dropped=self.dropped
+            )
+    
+    def _run(self):
+        while True:
+            
+            with self.condition:
+                while len(self.queue) == 0 and self.running:
+                    self.condition.wait()
+                if len(self.queue) == 0:
+                    return
+                
+                function, args = self.queue.popleft()
+                self.in_progress += 1
+                self.condition.notify_all() # a slot became free for blocked submitters
+            
+            try:
+                function(*args)
+                failed = False
+            except Exception as e:
+                self.logger.error(f"Error while processing item: {e}")
+                failed = True
+            
+            with self.condition:
+                self.in_progress -= 1
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+                self.condition.notify_all() # wakes join
@@ -0,0 +1,133 @@
+import numpy as np
+
+from fractions import Fraction
+from logging import getLogger
+from typing import Dict, List, Tuple
+
+from .datamodel import VideoFile
+from .utils import lazy_import
+
+av = lazy_import("av")
+
+logger = getLogger(__name__)
+
+# ------------------- FRAME GEOMETRY ------------------- #
+
+def frame_geometry(frame: np.ndarray) -> Tuple[int, int, str]:
+    """width, height and pixel format of a received video frame"""
+    if frame.ndim == 2:
+        return frame.shape[1], frame.shape[0], "gray"
+    
+    assert frame.ndim == 3 and frame.shape[2] in (3, 4), f"unsupported video frame shape {frame.shape}"
+    return frame.shape[1], frame.shape[0], "rgb24" if frame.shape[2] == 3 else "rgba"
+
+# ------------------- ENCODER PROFILES ------------------- #
+
+# named sets of VideoFile encoder fields, explicitly passed values take precedence
+VIDEO_ENCODER_PROFILES: Dict[str, dict] = {
+    "realtime": {"preset": "ultrafast", "tune": "zerolatency", "crf": 23, "thread_type": "SLICE"},
+    "fast": {"preset": "veryfast", "crf": 23, "thread_type": "FRAME"},
+    "archive": {"preset": "slow", "crf": 18, "thread_type": "FRAME"},
+    # hardware encoders are used when ffmpeg was built with them and a device is present, otherwise libx264
+    "hardware": {
+        "codec": "h264_nvenc",
+        "codec_fallbacks": ["h264_qsv", "h264_videotoolbox", "h264_amf", "libx264"],
+        "preset": "veryfast",
+        "crf": 23,
+        "codec_options": {
+            "h264_nvenc": {"preset": "p1", "tune": "ll"},
+            "h264_qsv": {"preset": "veryfast"},
+            "h264_videotoolbox": {"realtime": "1"},
+            "h264_amf": {"usage": "lowlatency"},
+        },
+    },
+}
+
+# encoders understanding the x264 style preset, tune and crf options
+X264_FAMILY = ("libx264", "libx264rgb", "libx265")
+
+def resolve_encoder_profile(profile: str, **encoder_fields) -> dict:
+    """profile fields updated with all encoder_fields that are not None"""
+    assert profile is None or profile in VIDEO_ENCODER_PROFILES, f"encoder profile must be one of {list(VIDEO_ENCODER_PROFILES)}, not {profile}"
+    
+    fields = dict(VIDEO_ENCODER_PROFILES.get(profile, {}))
+    fields.update({k: v for k, v in encoder_fields.items() if v is not None})
+    return fields
+
+def encoder_options(codec_name: str, video_file: VideoFile) -> Dict[str, str]:
+    """libav private options of codec_name for video_file"""
+    options = {}
+    if codec_name in X264_FAMILY:
+        if video_file.preset is not None:
+            options["preset"] = video_file.preset
+        if video_file.tune is not None:
+            options["tune"] = video_file.tune
+        if video_file.crf is not None and video_file.bit_rate is None:
+            options["crf"] = str(video_file.crf)
+    options.update(video_file.codec_options.get(codec_name, {}))
+    return options
+
+# ------------------- ENCODER SELECTION ------------------- #
+
+_PROBED_ENCODERS = {}
+
+def probe_video_encoder(codec_name: str, width: int, height: int, pix_fmt: str = "yuv420p", options: Dict[str, str] = {}) -> bool:
+    """
+    Check that codec_name exists and can be opened, hardware encoders are compiled in but fail to open without a device.
+    Probing uses a standalone codec context, a stream that was added to a container can not be removed again.
+    """
+    key = (codec_name, width, height, pix_fmt, tuple(sorted(options.items())))
+    if key in _PROBED_ENCODERS:
+        return _PROBED_ENCODERS[key]
+    
+    try:
+        codec_context = av.CodecContext.create(codec_name, "w")
+        codec_context.width = width
+        codec_context.height = height
+        codec_context.pix_fmt = pix_fmt
+        codec_context.time_base = Fraction(1, 30)
+        codec_context.options = dict(options)
+        codec_context.open()
+        available = True
+    except Exception as e:
+        logger.info(f"video encoder {codec_name} not usable: {e}")
+        available = False
+    
+    _PROBED_ENCODERS[key] = available
+    return available
+
+def video_encoder_chain(video_file: VideoFile) -> List[str]:
+    return [video_file.codec] + [codec for codec in video_file.codec_fallbacks if codec != video_file.codec]
+
+def add_video_stream(container, video_file: VideoFile, pix_fmt: str = "yuv420p"):
+    """
+    Add a video stream configured by video_file to container, using the first encoder of
+    video_file.codec followed by video_file.codec_fallbacks that can be opened.
+    """
+    for codec in video_encoder_chain(video_file):
+        try:
+            codec_name = av.codec.Codec(codec, "w").name # resolves aliases like h264 -> libx264
+        except Exception:
+            logger.info(f"video encoder {codec} is not available in this ffmpeg build")
+            continue
+        
+        options = encoder_options(codec_name, video_file)
+        if not probe_video_encoder(codec_name, video_file.width, video_file.height, pix_fmt, options):
+            continue
+        
+        stream = container.add_stream(codec_name, rate=Fraction(video_file.fps).limit_denominator(1001), options=options)
+        stream.width = video_file.width
+        stream.height = video_file.height
+        stream.pix_fmt = pix_fmt
+        if video_file.bit_rate is not None:
+            stream.bit_rate = video_file.bit_rate
+        stream.thread_count = video_file.threads
+        if video_file.thread_type is not None:
+            stream.thread_type = video_file.thread_type
+        
+        if codec != video_file.codec:
+            logger.warning(f"video encoder {video_file.codec} not usable, falling back to {codec_name}")
+        
+        return stream
+    
+    raise RuntimeError(f"none of the video encoders {video_encoder_chain(video_file)} can be used")
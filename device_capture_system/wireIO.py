@@ -0,0 +1,132 @@
+import zlib
+import importlib.util
+import numpy as np
+
+from abc import ABC, abstractmethod
+from typing import Dict, Type, Union
+
+from .datamodel import ImageFile
+from .imageIO import get_image_encoder, decode_image
+
+# ------------------- BASE CLASS ------------------- #
+
+class WireCodec(ABC):
+    """
+    Compresses the frame of a packet for the network, the codec name is sent in the packet header so receivers can decode it.
+    The compressors release the GIL while encoding, so a sender can spread packets over a thread pool.
+    """
+    
+    name: str = None
+    lossless: bool = True
+    
+    def __init__(self, level: Union[int, None] = None):
+        self.level = level
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+    
+    def supports(self, frame: np.ndarray) -> bool:
+        return True
+    
+    @abstractmethod
+    def encode(self, frame: np.ndarray) -> bytes:
+        pass
+    
+    @abstractmethod
+    def decode(self, data, shape: tuple, dtype: str) -> np.ndarray:
+        pass
+
+# ------------------- CODECS ------------------- #
+
+class RawWireCodec(WireCodec):
+    """uncompressed, the frame buffer is sent and received without a copy"""
+    
+    name = "none"
+    
+    def encode(self, frame: np.ndarray) -> np.ndarray:
+        return frame
+    
+    def decode(self, data, shape: tuple, dtype: str) -> np.ndarray:
+        return np.frombuffer(data, dtype=dtype).reshape(shape)
+
+class ZlibWireCodec(WireCodec):
+    """always available, slower than lz4 and zstd at the same ratio"""
+    
+    name = "zlib"
+    
+    def encode(self, frame: np.ndarray) -> bytes:
+        return zlib.compress(frame, 1 if self.level is None else self.level)
+    
+    def decode(self, data, shape: tuple, dtype: str) -> np.ndarray:
+        return np.frombuffer(zlib.decompress(data), dtype=dtype).reshape(shape)
+
+class LZ4WireCodec(WireCodec):
+    """lz4 frame format, the fastest lossless option, requires the lz4 package"""
+    
+    name = "lz4"
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        return importlib.util.find_spec("lz4") is not None
+    
+    def encode(self, frame: np.ndarray) -> bytes:
+        import lz4.frame
+        return lz4.frame.compress(frame, compression_level=0 if self.level is None else self.level)
+    
+    def decode(self, data, shape: tuple, dtype: str) -> np.ndarray:
+        import lz4.frame
+        return np.frombuffer(lz4.frame.decompress(data), dtype=dtype).reshape(shape)
+
+class ZstdWireCodec(WireCodec):
+    """zstandard, better ratio than lz4 at low levels, requires the zstandard package"""
+    
+    name = "zstd"
+    
+    @classmethod
+    def is_available(cls) -> bool:
+        return importlib.util.find_spec("zstandard") is not None
+    
+    def encode(self, frame: np.ndarray) -> bytes:
+        import zstandard
+        return zstandard.ZstdCompressor(level=1 if self.level is None else self.level).compress(frame)
+    
+    def decode(self, data, shape: tuple, dtype: str) -> np.ndarray:
+        import zstandard
+        return np.frombuffer(zstandard.ZstdDecompressor().decompress(data), dtype=dtype).reshape(shape)
+
+class JpegWireCodec(WireCodec):
+    """lossy intra frame jpeg of uint8 rgb or grayscale frames, level is the jpeg quality"""
+    
+    name = "jpeg"
+    lossless = False
+    
+    def __init__(self, level: Union[int, None] = None):
+        super().__init__(level)
+        self.image_file = ImageFile(file_path=".", file_name="wire", file_extension="jpg", jpg_quality=90 if level is None else level, png_compression=0)
+        self.encoder = get_image_encoder("auto", "jpg")
+    
+    def supports(self, frame: np.ndarray) -> bool:
+        return frame.dtype == np.uint8 and (frame.ndim == 2 or (frame.ndim == 3 and frame.shape[2] == 3))
+    
+    def encode(self, frame: np.ndarray) -> bytes:
+        return self.encoder.encode(frame, self.image_file, pixel_format="gray" if frame.ndim == 2 else "rgb24")
+    
+    def decode(self, data, shape: tuple, dtype: str) -> np.ndarray:
+        return decode_image(bytes(data)).reshape(shape)
+
+# ------------------- CODEC SELECTION ------------------- #
+
+WIRE_CODECS: Dict[str, Type[WireCodec]] = {
+    RawWireCodec.name: RawWireCodec,
+    ZlibWireCodec.name: ZlibWireCodec,
+    LZ4WireCodec.name: LZ4WireCodec,
+    ZstdWireCodec.name: ZstdWireCodec,
+    JpegWireCodec.name: JpegWireCodec,
+}
+
+def get_wire_codec(name: str = "none", level: Union[int, None] = None) -> WireCodec:
+    assert name in WIRE_CODECS, f"unknown wire codec {name}, expected one of {list(WIRE_CODECS)}"
+    codec_class = WIRE_CODECS[name]
+    assert codec_class.is_available(), f"wire codec {name} is not available, its compression package is not installed"
+    return codec_class(level)
@@ -1,82 +1,259 @@
+import os
+import re
 import zmq
 import importlib
 import json
+import time
 
+from uuid import uuid4
+from queue import Queue
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Process, Pipe
 from multiprocessing import TimeoutError as ProcessTimeoutError
-from datetime import datetime
-from numpy import frombuffer
+from typing import Union, Dict, List
 from logging import getLogger
+from zmq.utils.monitor import recv_monitor_message
 
 from device_capture_system import datamodel
+from device_capture_system.clockIO import ClockSync
+from device_capture_system.wireIO import WireCodec, RawWireCodec, get_wire_codec
 
-
+# ------------------- PROXY ------------------- #
 
 class ZMQProxy():
-    def __init__(self, host: str, sub_port: int, pub_port: int, queue_size: int = 10):
+    def __init__(self, host: str, sub_port: int, pub_port: int, queue_size: int = 10, linger_ms: int = 0, options: datamodel.ProxyOptions = datamodel.ProxyOptions()):
         self.logger = getLogger(f"{self.__class__.__name__}@{host}:{sub_port}->{pub_port}")
         
         self.queue_size = queue_size
+        self.linger_ms = linger_ms
+        self.options = options
         self.host = host
         self.sub_port = sub_port
         self.pub_port = pub_port
         self.process = None
+        self.control_port = None
         
     def is_active(self):
         return self.process is not None and self.process.is_alive()
     
-    def start_process(self):
+    def start_process(self, timeout: float = 5) -> Union[float, None]:
+        """
+        Start the proxy process and wait until its sockets are bound.
+        Returns the startup latency in seconds or None if the proxy did not become ready within timeout.
+        """
         self.logger.info("starting ...")
         
         assert not self.is_active(), "trying to start proxy that has already started, restarting ..."
         
+        dt = time.perf_counter()
+        
         parent_pipe, child_pipe = Pipe()
         self.process = Process(target=self._run, args=(child_pipe,))
         self.process.start()
         
-        self.logger.info("started !")
+        # the proxy reports the port of its control socket once all sockets are bound
+        if not parent_pipe.poll(timeout):
+            self.logger.error("proxy did not become ready, it can only be terminated")
+            return None
+        
+        self.control_port = parent_pipe.recv()
+        latency = time.perf_counter() - dt
+        
+        self.logger.info(f"started in {latency:.3f}s !")
+        return latency
         
-    def stop_process(self):
+    def stop_process(self, timeout: float = 1, kill_timeout: float = 0.5):
         self.logger.info("stopping ...")
         
         if self.process is not None:
-            self.process.terminate()
-            self.process.join()
-            # try:
-            #     self.process.join()
-            # except ProcessTimeoutError:
-            #     self.logger.warning("process join timeout, terminating ...")
-            #     self.process.terminate()
+            
+            # steer the proxy to return so sockets and context are cleaned up in the process
+            context = zmq.Context()
+            control_socket = context.socket(zmq.PAIR)
+            control_socket.setsockopt(zmq.LINGER, 0)
+            control_socket.setsockopt(zmq.SNDTIMEO, int(timeout * 1000))
+            
+            if self.control_port is not None and self.process.is_alive():
+                control_socket.connect(f"tcp://127.0.0.1:{self.control_port}")
+                try:
+                    control_socket.send(b"TERMINATE")
+                except zmq.error.Again:
+                    self.logger.warning("could not send terminate to proxy")
+            
+            # keep the control connection open until the proxy is gone, closing it earlier can discard the message
+            self.process.join(timeout=timeout)
+            control_socket.close()
+            context.term()
+            
+            if self.process.is_alive():
+                self.logger.warning("process join timeout, terminating ...")
+                self.process.terminate()
+                self.process.join(timeout=kill_timeout)
+            if self.process.is_alive():
+                self.logger.warning("process did not terminate, killing ...")
+                self.process.kill()
+                self.process.join(timeout=kill_timeout)
+            if self.process.is_alive():
+                self.logger.error("process did not exit after kill")
+        
         self.process = None
+        self.control_port = None
         
         self.logger.info("stopped !")
     
+    def restart_process(self):
+        self.logger.info("restarting ...")
+        self.stop_process()
+        self.start_process()
+    
+    def _configure_socket(self, socket, affinity: Union[int, None]):
+        options = self.options
+        socket_options = {
+            zmq.SNDBUF: options.sndbuf,
+            zmq.RCVBUF: options.rcvbuf,
+            zmq.TCP_KEEPALIVE: None if options.tcp_keepalive is None else int(options.tcp_keepalive),
+            zmq.TCP_KEEPALIVE_IDLE: options.tcp_keepalive_idle,
+            zmq.TCP_KEEPALIVE_INTVL: options.tcp_keepalive_interval,
+            zmq.TCP_KEEPALIVE_CNT: options.tcp_keepalive_count,
+            zmq.AFFINITY: affinity,
+        }
+        for option, value in socket_options.items():
+            if value is not None:
+                socket.setsockopt(option, value)
+    
     def _run(self, pipe):
         
-        context = zmq.Context()
+        # every frame is copied through the proxy, pinning keeps it off the cores of the device readers
+        if self.options.cpu_affinity is not None:
+            if hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(0, self.options.cpu_affinity)
+            else:
+                self.logger.warning("cpu affinity is not supported on this platform")
+        
+        context = zmq.Context(io_threads=self.options.io_threads)
         xsub_socket = context.socket(zmq.XSUB)
         xpub_socket = context.socket(zmq.XPUB)
+        control_socket = context.socket(zmq.PAIR)
         
         xsub_socket.setsockopt(zmq.RCVHWM, self.queue_size)
         xpub_socket.setsockopt(zmq.SNDHWM, self.queue_size)
+        for socket in (xsub_socket, xpub_socket, control_socket):
+            socket.setsockopt(zmq.LINGER, self.linger_ms)
+        # options have to be set before bind to apply to the accepted connections
+        self._configure_socket(xsub_socket, self.options.xsub_affinity)
+        self._configure_socket(xpub_socket, self.options.xpub_affinity)
         
         try:
             xsub_socket.bind(f"tcp://{self.host}:{self.sub_port}")
             
             xpub_socket.bind(f"tcp://{self.host}:{self.pub_port}")
             
-            zmq.proxy(xsub_socket, xpub_socket)
-            pipe.send(None) # signal to parent that the proxy has stopped
+            control_port = control_socket.bind_to_random_port("tcp://127.0.0.1")
+            pipe.send(control_port)
+            
+            # returns when TERMINATE is received on the control socket
+            zmq.proxy_steerable(xsub_socket, xpub_socket, None, control_socket)
         except Exception as e:
             raise e
         finally:
             xsub_socket.close()
             xpub_socket.close()
+            control_socket.close()
             context.term()
 
+# ------------------- ENDPOINT REGISTRY ------------------- #
+
+class EndpointRegistry:
+    """
+    Directory of json files, one per sender that binds its own PUB socket, for the direct topology without a proxy.
+    Senders register their endpoint once bound, receivers connect to all registered endpoints.
+    Every sender writes only its own file and replaces it atomically, so no locking between processes is needed.
+    """
+    
+    def __init__(self, path: str):
+        self.logger = getLogger(f"{self.__class__.__name__}@{path}")
+        
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+    
+    def _file_uri(self, name: str) -> str:
+        return os.path.join(self.path, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}.json")
+    
+    def register(self, name: str, endpoint: str, **info):
+        file_uri = self._file_uri(name)
+        with open(f"{file_uri}.tmp", "w") as f:
+            json.dump({"name": name, "endpoint": endpoint, "pid": os.getpid(), **info}, f)
+        os.replace(f"{file_uri}.tmp", file_uri)
+        
+        self.logger.info(f"registered {name} at {endpoint}")
+    
+    def unregister(self, name: str):
+        file_uri = self._file_uri(name)
+        if os.path.exists(file_uri):
+            os.remove(file_uri)
+    
+    def endpoints(self) -> Dict[str, str]:
+        """endpoint per registered sender name"""
+        endpoints = {}
+        for file_name in os.listdir(self.path):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.path, file_name), "r") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue # removed while listing
+            endpoints[entry["name"]] = entry["endpoint"]
+        return endpoints
+
+# ------------------- TOPICS ------------------- #
+
+# packets are tagged with the slowest of these rates in fps whose schedule they fall on, the periods divide each other
+# so subscribing to all tiers up to a rate receives at most that rate and the rest is filtered by the publisher
+RATE_TIERS = (1, 5, 10)
+UNTIERED = "-" # packets that fall on no tier schedule
+
+def stream_topic(stream: str = datamodel.FULL_STREAM, tier: Union[str, None] = None, device_name: Union[str, None] = None) -> str:
+    """topic "<stream>|<tier>|<device name>|" of a packet, without tier or device name the prefix matching all of them"""
+    if tier is None:
+        return f"{stream}|"
+    if device_name is None:
+        return f"{stream}|{tier}|"
+    return f"{stream}|{tier}|{device_name}|"
+
+def rate_subscriptions(stream: str = datamodel.FULL_STREAM, max_rate: Union[float, None] = None, device_name: Union[str, None] = None) -> List[str]:
+    """
+    Topic prefixes receiving stream at no more than the smallest tier >= max_rate, all packets if max_rate is None or above
+    every tier. A limit between two tiers is enforced exactly by the receiver, see ZMQReceiver.
+    """
+    if max_rate is None or max_rate > RATE_TIERS[-1]:
+        if device_name is None:
+            return [stream_topic(stream)]
+        tiers = [str(tier) for tier in RATE_TIERS] + [UNTIERED]
+    else:
+        cutoff = min([tier for tier in RATE_TIERS if tier >= max_rate])
+        tiers = [str(tier) for tier in RATE_TIERS if tier <= cutoff]
+    return [stream_topic(stream, tier, device_name) for tier in tiers]
+
+# ------------------- SENDER / RECEIVER ------------------- #
+
 class ZMQSender():
     
-    def __init__(self, host: str, port: int, q_size: int = 10, name: str = None):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        q_size: int = 10,
+        name: str = None,
+        linger_ms: int = 0,
+        node_id: str = None,
+        clock_endpoint: str = None,
+        bind: bool = False,
+        codec: str = "none",
+        codec_level: Union[int, None] = None,
+        compression_workers: int = 0):
         
         if name is not None:
             self.logger = getLogger(f"{self.__class__.__name__}@{name}")
@@ -86,27 +263,128 @@ class ZMQSender():
         self.host = host
         self.port = port
         self.q_size = q_size
+        self.linger_ms = linger_ms
+        self.bind = bind # bind the PUB socket instead of connecting to a proxy, port 0 picks a free port
+        self.endpoint = None
         
         self.context = None
         self.socket = None
+        
+        # frames are compressed with codec before sending, the codec name is part of the header, see wireIO
+        assert compression_workers >= 0, "compression_workers must not be negative"
+        self.codec = get_wire_codec(codec, codec_level)
+        self.raw_codec = RawWireCodec()
+        self.compression_workers = compression_workers
+        self.executor = None
+        self.pending = None
+        self.send_thread = None
+        
+        # sent with every header, receivers attribute sequence gaps up to this count to the sender
+        self.sent = 0
+        self.dropped = 0
+        self.dropped_lock = Lock()
+        # new with every start, receivers detect a restarted sender by it even if its first packets are lost
+        self.epoch = None
+        
+        # lets receivers on other hosts estimate the clock offset of this node, see clockIO
+        self.node = None
+        if clock_endpoint is not None:
+            self.node = {"node_id": node_id, "clock_endpoint": clock_endpoint}
+        
+        # next capture time in ns each rate tier is due, per stream and device
+        self.tier_schedules: Dict[str, List[int]] = {}
     
     def is_active(self):
         return self.context is not None
     
-    def start(self):
+    def _rate_tier(self, key: str, capture_ns: int) -> str:
+        """the slowest rate tier that is due at capture_ns, if a tier is due all faster ones are due as well"""
+        schedule = self.tier_schedules.setdefault(key, [capture_ns] * len(RATE_TIERS))
+        
+        tier = UNTIERED
+        for i in reversed(range(len(RATE_TIERS))):
+            if capture_ns < schedule[i]:
+                continue
+            # the schedules advance in whole periods from the first packet, so the tiers stay in phase
+            period_ns = 10 ** 9 // RATE_TIERS[i]
+            schedule[i] += period_ns * ((capture_ns - schedule[i]) // period_ns + 1)
+            tier = str(RATE_TIERS[i])
+        return tier
+    
+    def start(self, connect_timeout: Union[float, None] = None) -> bool:
+        """
+        Open the socket, with connect_timeout wait until the connection to the proxy is established.
+        Returns False if the sender did not connect within connect_timeout, it keeps retrying in the background then.
+        """
         self.logger.info("starting ...")
         
         assert not self.is_active(), "trying to start a sender that has already started"
         
+        self.epoch = uuid4().hex
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.PUB)
         self.socket.setsockopt(zmq.SNDHWM, self.q_size)
-        self.socket.connect(f"tcp://{self.host}:{self.port}")
+        self.socket.setsockopt(zmq.LINGER, self.linger_ms)
+        # a full PUB queue silently discards messages, with NODROP the send fails instead and the drop can be counted.
+        # only for the single pipe to the proxy, a bound sender has a pipe per subscriber and one stalled subscriber
+        # would block all others, there the drops of a subscriber are counted as transport gaps by that receiver
+        if not self.bind:
+            self.socket.setsockopt(zmq.XPUB_NODROP, 1)
+        
+        connected = True
+        if self.bind:
+            # receivers connect to the sender, there is nothing to wait for
+            port = self.port
+            if port == 0:
+                port = self.socket.bind_to_random_port(f"tcp://{self.host}")
+            else:
+                self.socket.bind(f"tcp://{self.host}:{port}")
+            self.endpoint = f"tcp://{self.host}:{port}"
+        elif connect_timeout is None:
+            self.socket.connect(f"tcp://{self.host}:{self.port}")
+        else:
+            connected = self._connect_and_wait(connect_timeout)
+        
+        # packets are encoded in a pool, a single thread owns the socket and sends them in order of arrival
+        if self.compression_workers > 0:
+            self.executor = ThreadPoolExecutor(max_workers=self.compression_workers)
+            self.pending = Queue(maxsize=2 * self.compression_workers)
+            self.send_thread = Thread(target=self._send_pending, daemon=True)
+            self.send_thread.start()
         
         self.logger.info("started !")
+        return connected
+    
+    def _connect_and_wait(self, timeout: float) -> bool:
+        
+        # the monitor reports when the connection handshake with the peer has completed
+        monitor_socket = self.socket.get_monitor_socket(zmq.EVENT_HANDSHAKE_SUCCEEDED)
+        
+        try:
+            self.socket.connect(f"tcp://{self.host}:{self.port}")
+            
+            if monitor_socket.poll(timeout * 1000) == 0:
+                self.logger.warning(f"not connected after {timeout}s")
+                return False
+            
+            recv_monitor_message(monitor_socket)
+            return True
+        finally:
+            self.socket.disable_monitor()
+            monitor_socket.close()
     
     def stop(self):
-        self.logger.info("stoping ...")
+        self.logger.info(f"stoping ... (sent: {self.sent}, dropped: {self.dropped})")
+        
+        # packets that are already being encoded are still sent
+        if self.send_thread is not None:
+            self.pending.put(None)
+            self.send_thread.join()
+            self.executor.shutdown()
+        self.executor = None
+        self.pending = None
+        self.send_thread = None
+        
         if self.socket is not None:
             self.socket.close()
         if self.context is not None:
@@ -115,28 +393,87 @@ class ZMQSender():
         self.socket = None
         self.logger.info("stoped !")
     
-    def send(self, packet: datamodel.FramePacket):
-        
-        if not self.is_active():
-            self.logger.warning("trying to send data without starting the sender !")
-            return
-        
-        self.logger.debug("sending data ...")
-        
+    def _count_drop(self):
+        with self.dropped_lock:
+            self.dropped += 1
+        self.logger.warning(f"could not send data, {self.dropped} packets dropped")
+    
+    def _encode(self, packet: datamodel.FramePacket) -> tuple:
+        """header and encoded frame of packet, frames the codec does not support are sent uncompressed"""
         packet_dump = packet.dump()
         frame = packet_dump["frame"]
         data = packet_dump["data"]
         
+        codec: WireCodec = self.codec if self.codec.supports(frame) else self.raw_codec
+        data["codec"] = codec.name
+        return data, codec.encode(frame)
+    
+    def _send_encoded(self, topic: str, data: dict, payload):
+        data["sender_dropped"] = self.dropped
+        data["epoch"] = self.epoch
+        if self.node is not None:
+            data["node"] = self.node
+        
         try:
+            self.socket.send_string(topic, zmq.SNDMORE | zmq.NOBLOCK)
             self.socket.send_json(data, zmq.SNDMORE | zmq.NOBLOCK)
-            self.socket.send(frame, flags=zmq.NOBLOCK, copy=False, track=False)
+            self.socket.send(payload, flags=zmq.NOBLOCK, copy=False, track=False)
+            self.sent += 1
             self.logger.debug("data sent ...")
         except zmq.error.Again:
-            self.logger.warning("could not send data")
+            self._count_drop()
+    
+    def _send_pending(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            topic, future = item
+            try:
+                data, payload = future.result()
+            except Exception as e:
+                self.logger.error(f"could not encode frame: {e}")
+                self._count_drop()
+                continue
+            self._send_encoded(topic, data, payload)
+    
+    def send(self, packet: datamodel.FramePacket, stream: str = datamodel.FULL_STREAM):
+        
+        if not self.is_active():
+            self.logger.warning("trying to send data without starting the sender !")
+            return
+        
+        self.logger.debug("sending data ...")
+        
+        # the topic leads the message, so subscribers filter by stream, rate and device without parsing the header
+        tier = self._rate_tier(f"{stream}|{packet.device.name}", packet.capture_ns)
+        topic = stream_topic(stream, tier, packet.device.name)
+        
+        if self.executor is None:
+            self._send_encoded(topic, *self._encode(packet))
+            return
+        
+        # only this thread adds to the queue, a packet that does not fit is dropped before it is encoded
+        if self.pending.full():
+            self._count_drop()
+            return
+        self.pending.put_nowait((topic, self.executor.submit(self._encode, packet)))
 
 class ZMQReceiver():
     
-    def __init__(self, host: str, port: int, q_size: int = 10, receive_wait_time_ms: int = 1000):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        q_size: int = 10,
+        receive_wait_time_ms: int = 1000,
+        linger_ms: int = 0,
+        clock_sync: bool = True,
+        registry: Union[EndpointRegistry, None] = None,
+        registry_refresh_interval: float = 1.,
+        stream: str = datamodel.FULL_STREAM,
+        max_rate: Union[float, None] = None,
+        max_rates: Dict[str, float] = {}):
         
         self.logger = getLogger(f"{self.__class__.__name__}@{host}:{port}")
         
@@ -144,13 +481,74 @@ class ZMQReceiver():
         self.port = port
         self.q_size = q_size
         self.receive_wait_time_ms = receive_wait_time_ms
+        self.linger_ms = linger_ms
+        self.stream = stream # only packets of this stream are received, see InputStreamSender derived streams
+        
+        # packets per second per device, max_rates by device name take precedence over max_rate for all devices
+        # the publisher filters by rate tier, faster packets left are skipped here before the header is parsed
+        assert max_rate is None or max_rate > 0, "max_rate must be positive"
+        assert all([rate > 0 for rate in max_rates.values()]), "max_rates must be positive"
+        self.max_rate = max_rate
+        self.max_rates = max_rates
+        self.next_receive_ns: Dict[str, int] = {}
         
         self.context = None
         self.socket = None
         
+        # with a registry the receiver connects to the senders directly instead of to the proxy at host:port
+        self.registry = registry
+        self.registry_refresh_interval = registry_refresh_interval
+        self.registry_refreshed_at = 0.
+        self.endpoints = set()
+        
+        self.stream_counters: Dict[str, datamodel.StreamCounters] = {}
+        self.sender_dropped: Dict[str, int] = {} # last sender drop count seen per device
+        self.sender_epochs: Dict[str, Union[str, None]] = {} # epoch of the sender process seen last per device
+        
+        # with clock_sync the timestamps of nodes that run a clock server are converted to the local clock
+        self.clock_sync = clock_sync
+        self.clock_syncs: Dict[str, ClockSync] = {}
+        
+        self.wire_codecs: Dict[str, WireCodec] = {}
+        
     def is_active(self):
         return self.context is not None
     
+    def _track_sequence(self, device_id: str, sequence: int, sender_dropped: int, count_gaps: bool = True, epoch: Union[str, None] = None) -> bool:
+        """
+        Update the counters of device_id with a received sequence number, False if the packet is a duplicate.
+        A gap in the sequence is attributed to the sender as far as its drop count grew, the rest was lost in transport.
+        Rate limited streams have gaps by design, count_gaps=False only counts received packets and duplicates.
+        A new sender epoch is a restarted sender process, which counts its sequence and drops from 0 again.
+        """
+        counters = self.stream_counters.setdefault(device_id, datamodel.StreamCounters(device_id=device_id))
+        last_sequence = counters.last_sequence
+        last_sender_dropped = self.sender_dropped.get(device_id, 0)
+        
+        if last_sequence is not None and epoch != self.sender_epochs.get(device_id):
+            self.logger.warning(f"sender of {device_id} restarted")
+            counters.sender_restarts += 1
+            # the packets of the new process before this one were lost
+            last_sequence = -1
+            last_sender_dropped = 0
+        elif last_sequence is not None and sequence <= last_sequence:
+            counters.duplicates += 1
+            return False
+        
+        if last_sequence is not None and count_gaps:
+            gap = sequence - last_sequence - 1
+            if gap > 0:
+                sender_gap = min(gap, max(0, sender_dropped - last_sender_dropped))
+                counters.sender_dropped += sender_gap
+                counters.transport_dropped += gap - sender_gap
+                self.logger.debug(f"{device_id} lost {gap} packets ({sender_gap} at the sender)")
+        
+        counters.received += 1
+        counters.last_sequence = sequence
+        self.sender_dropped[device_id] = sender_dropped
+        self.sender_epochs[device_id] = epoch
+        return True
+    
     def start(self):
         self.logger.info("starting ...")
         
@@ -158,13 +556,37 @@ class ZMQReceiver():
         
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.SUB)
-        self.socket.setsockopt_string(zmq.SUBSCRIBE, "")
+        # without max_rate all packets are subscribed and max_rates are only enforced by the receiver
+        subscriptions = set(rate_subscriptions(self.stream, self.max_rate))
+        if self.max_rate is not None:
+            for device_name, rate in self.max_rates.items():
+                subscriptions.update(rate_subscriptions(self.stream, rate, device_name))
+        for subscription in subscriptions:
+            self.socket.setsockopt_string(zmq.SUBSCRIBE, subscription)
         self.socket.setsockopt(zmq.RCVTIMEO, self.receive_wait_time_ms)
         self.socket.setsockopt(zmq.RCVHWM, self.q_size)
-        self.socket.connect(f"tcp://{self.host}:{self.port}")
+        self.socket.setsockopt(zmq.LINGER, self.linger_ms)
+        if self.registry is None:
+            self.socket.connect(f"tcp://{self.host}:{self.port}")
+        else:
+            self.refresh_endpoints()
         
         self.logger.info("started !")
     
+    def refresh_endpoints(self):
+        """connect to senders that registered since the last refresh and disconnect from the ones that are gone"""
+        endpoints = set(self.registry.endpoints().values())
+        
+        for endpoint in endpoints - self.endpoints:
+            self.socket.connect(endpoint)
+            self.logger.info(f"connected to {endpoint}")
+        for endpoint in self.endpoints - endpoints:
+            self.socket.disconnect(endpoint)
+            self.logger.info(f"disconnected from {endpoint}")
+        
+        self.endpoints = endpoints
+        self.registry_refreshed_at = time.monotonic()
+    
     def stop(self):
         self.logger.info("stopping ...")
         
@@ -174,16 +596,71 @@ class ZMQReceiver():
             self.context.term()
         self.context = None
         self.socket = None
+        self.endpoints = set()
+        
+        for clock_sync in self.clock_syncs.values():
+            clock_sync.stop()
+        self.clock_syncs = {}
         
         self.logger.info("stopped !")
     
+    def _node_clock(self, clock_endpoint: str) -> ClockSync:
+        clock_sync = self.clock_syncs.get(clock_endpoint)
+        if clock_sync is None:
+            # the first round runs before the first packet of the node is returned, then the clock is tracked in the background
+            clock_sync = ClockSync(clock_endpoint)
+            clock_sync.sync_round()
+            clock_sync.start()
+            self.clock_syncs[clock_endpoint] = clock_sync
+            self.logger.info(f"clock of node {clock_sync.node_id} at {clock_endpoint} is {clock_sync.offset_ns() / 1e6:.3f}ms ahead")
+        return clock_sync
+    
+    def _device_max_rate(self, device_name: str) -> Union[float, None]:
+        return self.max_rates.get(device_name, self.max_rate)
+    
+    def _rate_limited(self, device_name: str) -> bool:
+        """True if a packet of device_name arriving now exceeds its max rate"""
+        max_rate = self._device_max_rate(device_name)
+        if max_rate is None:
+            return False
+        
+        period_ns = 1e9 / max_rate
+        now_ns = time.monotonic_ns()
+        next_ns = self.next_receive_ns.get(device_name, now_ns)
+        
+        # packets up to a tenth of a period early are accepted, so jitter does not halve a stream published at the limit
+        if now_ns < next_ns - 0.1 * period_ns:
+            return True
+        
+        # phase locked while the packets keep up with the rate, restarted after a pause
+        self.next_receive_ns[device_name] = next_ns + period_ns if now_ns - next_ns < period_ns else now_ns + period_ns
+        return False
+    
+    def _wire_codec(self, name: str) -> WireCodec:
+        codec = self.wire_codecs.get(name)
+        if codec is None:
+            codec = get_wire_codec(name)
+            self.wire_codecs[name] = codec
+        return codec
+    
     def receive(self) -> datamodel.FramePacket:
         
         if not self.is_active():
             self.logger.warning("trying to receive data without starting the receiver !")
             return None
         
+        if self.registry is not None and time.monotonic() - self.registry_refreshed_at > self.registry_refresh_interval:
+            self.refresh_endpoints()
+        
         try:
+            while True:
+                topic = self.socket.recv_string()
+                device_name = topic.split("|", 2)[2][:-1]
+                if not self._rate_limited(device_name):
+                    break
+                # the header and frame of a skipped packet are neither parsed nor copied
+                self.socket.recv(copy=False)
+                self.socket.recv(copy=False)
             data = self.socket.recv_json()
             frame = self.socket.recv(copy=False, track=False)
         except zmq.error.Again as e:
@@ -195,26 +672,37 @@ class ZMQReceiver():
         
         self.logger.debug("data received ...")
         
-        # format frame
-        frame = frombuffer(frame, dtype=data["frame"]["dtype"])
-        frame = frame.reshape(data["frame"]["shape"])
+        count_gaps = self._device_max_rate(device_name) is None
+        if not self._track_sequence(data["device"]["parameters"]["device_id"], data["sequence"], data.get("sender_dropped", 0), count_gaps, data.get("epoch")):
+            return None
+        
+        # format frame, uncompressed frames are used in place of the received buffer
+        try:
+            codec = self._wire_codec(data.get("codec", RawWireCodec.name))
+        except AssertionError as e:
+            self.logger.warning(f"could not decode frame: {e}")
+            return None
+        frame = codec.decode(frame, shape=data["frame"]["shape"], dtype=data["frame"]["dtype"])
         
         # format device
         device_class = getattr(datamodel, data["device"]["type"])
         device = device_class(**data["device"]["parameters"])
         
-        # extract timestamp
-        start_read_dt = datetime.fromtimestamp(data["start_read_timestamp"])
-        end_read_dt = datetime.fromtimestamp(data["end_read_timestamp"])
+        timestamps = {key: data[key] for key in datamodel.FramePacket.HEADER_FIELDS}
+        
+        # wall clock timestamps of other nodes are converted to the local clock, the monotonic ones are only comparable on their node
+        if self.clock_sync and data.get("node") is not None:
+            clock_sync = self._node_clock(data["node"]["clock_endpoint"])
+            if clock_sync.is_synchronized():
+                for key in ("start_read_ns", "end_read_ns", "capture_ns"):
+                    timestamps[key] = clock_sync.to_local_ns(timestamps[key])
         
-        # debug fps
-        total_time = datetime.now().timestamp() - data['start_read_timestamp']
-        if total_time > 0:
-            self.logger.debug(f"fps from read to receive: {1 / total_time}")
+        # debug latency, capture and receive are both on the local wall clock
+        latency_ns = time.time_ns() - timestamps["capture_ns"]
+        self.logger.debug(f"latency from capture to receive: {latency_ns / 1e6:.2f}ms")
         
         return datamodel.FramePacket(
             device=device,
             frame=frame,
-            start_read_dt=start_read_dt,
-            end_read_dt=end_read_dt
+            **timestamps
         )
@@ -7,30 +7,70 @@ from datetime import datetime
 
 from device_capture_system.deviceIO import load_all_devices_from_config
 from device_capture_system.core import MultiInputStreamSender
-from device_capture_system.datamodel import FramePreprocessing
-from device_capture_system.fileIO import ImageSaver, VideoSaver
+from device_capture_system.datamodel import FramePreprocessing, BackpressurePolicy, StreamDescriptor, ProxyOptions, ChangeDetection
+from device_capture_system.fileIO import ImageSaver, VideoSaver, RawSaver, AudioSaver, AVRecorder
+from device_capture_system.daemon import CaptureDaemonClient
+from device_capture_system.videoIO import VIDEO_ENCODER_PROFILES
 
 # ---------------------------------------------------------------------
 
 AP = argparse.ArgumentParser()
 AP.add_argument("--output_path", "-o", type=str, required=True, help="output path")
-AP.add_argument("--save_type", "-t", type=str, required=True, help="save type", choices=["image", "video"])
+AP.add_argument("--save_type", "-t", type=str, required=True, help="save type", choices=["image", "video", "raw", "audio", "av"])
 
 AP.add_argument("--config", type=str, default="./configs/devices.json", help="path to device configuration file")
 AP.add_argument("--host", type=str, default="127.0.0.1", help="host name or ip of the server")
 AP.add_argument("--proxy_sub_port", type=int, default=10000, help="port for proxy subscriber")
 AP.add_argument("--proxy_pub_port", type=int, default=10001, help="port for proxy publisher")
 AP.add_argument("--zmq_proxy_queue_size", type=int, default=1000, help="zmq proxy queue size")
+AP.add_argument("--zmq_proxy_io_threads", type=int, default=1, help="zmq io threads of the proxy, one thread handles roughly a gigabyte per second")
+AP.add_argument("--zmq_proxy_cpus", type=int, nargs="*", default=None, help="pin the proxy process to these cpus (linux)")
+AP.add_argument("--supervise", action="store_true", help="restart failed sender and proxy processes automatically")
+AP.add_argument("--clock_port", type=int, default=None, help="serve the clock of this node so receivers on other hosts can correct the timestamps")
+AP.add_argument("--clock_host", type=str, default=None, help="host name or ip under which receivers reach the clock port, defaults to --host")
+AP.add_argument("--registry_path", type=str, default=None, help="directory where senders register their own endpoints, receivers connect to them directly without the proxy")
+AP.add_argument("--wire_codec", type=str, default="none", choices=["none", "zlib", "lz4", "zstd", "jpeg"], help="compression of frames sent over the network, lz4 and zstd need their packages")
+AP.add_argument("--wire_codec_level", type=int, default=None, help="compression level of the wire codec, the quality for jpeg")
+AP.add_argument("--compression_workers", type=int, default=0, help="threads per sender compressing frames, 0 compresses in the capture loop")
+AP.add_argument("--image_max_rate", type=float, default=None, help="save at most this many images per second and camera, frames above the rate are filtered before they are received")
+AP.add_argument("--change_detection", action="store_true", help="publish motion events of the cameras, unchanged frames of static scenes are only suppressed with --record_on_motion")
+AP.add_argument("--keep_alive_seconds", type=float, default=1., help="with change detection an unchanged frame is still sent after this many seconds")
+AP.add_argument("--motion_hold_seconds", type=float, default=2., help="with change detection motion stops after this many seconds without a changed frame")
+AP.add_argument("--record_on_motion", action="store_true", help="record the video when motion starts and stop when it ends, needs --change_detection on the sender")
+AP.add_argument("--daemon_control_port", type=int, default=None, help="attach to a running capture_daemon.py on this control port instead of opening the devices")
 
 # image parameters
 AP.add_argument("--num_images", type=int, default=100, help="number of images to save")
-AP.add_argument("--image_file_extension", type=str, default="jpg", help="image file extension", choices=["jpg", "png"])
+AP.add_argument("--image_file_extension", type=str, default="jpg", help="image file extension", choices=["jpg", "png", "webp", "npy"])
+AP.add_argument("--image_encoder", type=str, default="auto", help="image encoder backend", choices=["auto", "opencv", "pil", "av", "npy"])
+AP.add_argument("--image_output_mode", type=str, default="files", help="one file per image or appended to tar shards", choices=["files", "shards"])
+AP.add_argument("--max_shard_size_mb", type=int, default=1024, help="size at which a new image shard is started")
+AP.add_argument("--jpg_subsampling", type=str, default=None, help="jpg chroma subsampling", choices=["4:4:4", "4:2:2", "4:2:0"])
 AP.add_argument("--jpg_quality", type=int, default=95, help="jpg quality")
 AP.add_argument("--png_compression", type=int, default=3, help="png compression level")
+AP.add_argument("--image_queue_size", type=int, default=32, help="number of images waiting to be encoded")
+AP.add_argument("--backpressure_policy", type=str, default="block", help="what to do when the image queue is full", choices=[p.value for p in BackpressurePolicy])
+
+# raw parameters
+AP.add_argument("--num_frames", type=int, default=300, help="number of raw frames to save per camera")
+
+# audio parameters
+AP.add_argument("--audio_length", type=float, default=10, help="audio length in seconds")
+AP.add_argument("--audio_file_extension", type=str, default="wav", help="audio file extension", choices=["wav", "flac", "opus"])
+AP.add_argument("--audio_segment_length", type=float, default=None, help="start a new audio file every n seconds")
+AP.add_argument("--audio_bit_rate", type=int, default=None, help="bit rate for opus")
 
 # video parameters
 AP.add_argument("--video_length", type=int, default=10, help="video length in seconds")
-AP.add_argument("--video_codec", type=str, default="h264", help="video codec")
+AP.add_argument("--video_codec", type=str, default=None, help="video codec, h264 unless set by the encoder profile")
+AP.add_argument("--video_codec_fallbacks", type=str, nargs="*", default=None, help="video codecs tried when the codec can not be used")
+AP.add_argument("--video_encoder_profile", type=str, default=None, help="video encoder profile", choices=list(VIDEO_ENCODER_PROFILES))
+AP.add_argument("--video_preset", type=str, default=None, help="x264 preset, e.g. ultrafast or veryfast")
+AP.add_argument("--video_crf", type=int, default=None, help="x264 constant rate factor")
+AP.add_argument("--video_bit_rate", type=int, default=None, help="target video bit rate, replaces crf")
+AP.add_argument("--video_threads", type=int, default=None, help="encoder threads per camera, 0 lets the encoder decide")
+AP.add_argument("--video_thread_type", type=str, default=None, help="encoder threading", choices=["SLICE", "FRAME", "AUTO"])
+AP.add_argument("--audio_codec", type=str, default="aac", help="audio codec of av recordings")
 AP.add_argument("--inter_video_save_timer", type=int, default=3, help="time between saving videos")
 
 AP.add_argument("-ll", "--logging_level", type=str, default="info", help="logging level", choices=["debug", "warning", "error"])
@@ -54,8 +94,43 @@ FRAME_PREPROCESSINGS = {
 if __name__ == "__main__":
         
     cameras = load_all_devices_from_config("video", config_file=ARGS.config)
+    microphones = load_all_devices_from_config("audio", config_file=ARGS.config)
+    
+    # only save_motion_video repeats the last frame of static cameras, the other savers would record at the keep alive rate
+    motion_recording = ARGS.save_type == "video" and ARGS.record_on_motion
     
-    logger.warning("FRAME PREPROCESSING IS SET MANUALLY IN THE CODE TO:\n" + ''.join([f'{cam.name} => {FRAME_PREPROCESSINGS.get(cam.name, None)}\n' for cam in cameras]))
+    if ARGS.daemon_control_port is None:
+        logger.warning("FRAME PREPROCESSING IS SET MANUALLY IN THE CODE TO:\n" + ''.join([f'{cam.name} => {FRAME_PREPROCESSINGS.get(cam.name, None)}\n' for cam in cameras]))
+        input_stream_sender = MultiInputStreamSender(
+            devices={"audio": microphones, "av": cameras + microphones}.get(ARGS.save_type, cameras),
+            proxy_sub_port=ARGS.proxy_sub_port,
+            proxy_pub_port=ARGS.proxy_pub_port,
+            host=ARGS.host,
+            zmq_proxy_queue_size=ARGS.zmq_proxy_queue_size,
+            zmq_proxy_options=ProxyOptions(io_threads=ARGS.zmq_proxy_io_threads, cpu_affinity=ARGS.zmq_proxy_cpus),
+            frame_preprocessings=FRAME_PREPROCESSINGS,
+            supervise=ARGS.supervise,
+            clock_port=ARGS.clock_port,
+            clock_host=ARGS.clock_host,
+            registry_path=ARGS.registry_path,
+            wire_codec=ARGS.wire_codec,
+            wire_codec_level=ARGS.wire_codec_level,
+            compression_workers=ARGS.compression_workers,
+            change_detection=ChangeDetection(keep_alive_seconds=ARGS.keep_alive_seconds, motion_hold_seconds=ARGS.motion_hold_seconds, suppress=motion_recording) if ARGS.change_detection else None
+        )
+    else:
+        input_stream_sender = None
+        daemon_client = CaptureDaemonClient(control_port=ARGS.daemon_control_port, host=ARGS.host)
+    
+    # geometry of the frames after preprocessing, so the video encoders are configured before the first frame
+    if input_stream_sender is not None:
+        stream_descriptors = input_stream_sender.stream_descriptors()
+    else:
+        stream_descriptors = {k: StreamDescriptor(**v) for k, v in daemon_client.status()["streams"].items()}
+        # the daemon applies its own preprocessing, FRAME_PREPROCESSINGS is not used when attached
+        logger.info("frame preprocessing of the daemon:\n" + ''.join([f'{k} => {v.frame_preprocessing}\n' for k, v in stream_descriptors.items()]))
+        suppressed = [k for k, v in stream_descriptors.items() if v.suppressed]
+        assert motion_recording or len(suppressed) == 0, f"the daemon suppresses unchanged frames of {suppressed}, only --save_type video --record_on_motion can record them"
     
     if ARGS.save_type == "video":
         saver = VideoSaver(
@@ -64,7 +139,47 @@ if __name__ == "__main__":
             output_path=ARGS.output_path,
             video_length=ARGS.video_length,
             codec=ARGS.video_codec,
-            host=ARGS.host
+            host=ARGS.host,
+            encoder_profile=ARGS.video_encoder_profile,
+            codec_fallbacks=ARGS.video_codec_fallbacks,
+            preset=ARGS.video_preset,
+            crf=ARGS.video_crf,
+            bit_rate=ARGS.video_bit_rate,
+            threads=ARGS.video_threads,
+            thread_type=ARGS.video_thread_type,
+            stream_descriptors=stream_descriptors,
+            registry_path=ARGS.registry_path,
+            motion_events=ARGS.record_on_motion
+        )
+    elif ARGS.save_type == "audio":
+        saver = AudioSaver(
+            microphones=microphones,
+            proxy_pub_port=ARGS.proxy_pub_port,
+            output_path=ARGS.output_path,
+            audio_file_extension=ARGS.audio_file_extension,
+            segment_length=ARGS.audio_segment_length,
+            bit_rate=ARGS.audio_bit_rate,
+            host=ARGS.host,
+            registry_path=ARGS.registry_path
+        )
+    elif ARGS.save_type == "av":
+        saver = AVRecorder(
+            cameras=cameras,
+            microphones=microphones,
+            proxy_pub_port=ARGS.proxy_pub_port,
+            output_path=ARGS.output_path,
+            video_codec=ARGS.video_codec or "h264",
+            audio_codec=ARGS.audio_codec,
+            host=ARGS.host,
+            registry_path=ARGS.registry_path
+        )
+    elif ARGS.save_type == "raw":
+        saver = RawSaver(
+            cameras=cameras,
+            proxy_pub_port=ARGS.proxy_pub_port,
+            output_path=ARGS.output_path,
+            host=ARGS.host,
+            registry_path=ARGS.registry_path
         )
     else:
         saver = ImageSaver(
@@ -74,26 +189,37 @@ if __name__ == "__main__":
             image_file_extension=ARGS.image_file_extension,
             jpg_quality=ARGS.jpg_quality,
             png_compression=ARGS.png_compression,
-            host=ARGS.host
+            jpg_subsampling=ARGS.jpg_subsampling,
+            encoder=ARGS.image_encoder,
+            queue_size=ARGS.image_queue_size,
+            backpressure_policy=BackpressurePolicy(ARGS.backpressure_policy),
+            output_mode=ARGS.image_output_mode,
+            max_shard_size=ARGS.max_shard_size_mb * 2 ** 20,
+            host=ARGS.host,
+            registry_path=ARGS.registry_path,
+            max_rate=ARGS.image_max_rate
         )
     
-    input_stream_sender = MultiInputStreamSender(
-        devices=cameras,
-        proxy_sub_port=ARGS.proxy_sub_port,
-        proxy_pub_port=ARGS.proxy_pub_port,
-        host=ARGS.host,
-        zmq_proxy_queue_size=ARGS.zmq_proxy_queue_size,
-        frame_preprocessings=FRAME_PREPROCESSINGS
-    )
-    
     try:
         
         saver.start()
-        input_stream_sender.start_processes()
+        if input_stream_sender is not None:
+            startup_latencies = input_stream_sender.start_processes()
+            logger.info(f"startup latencies: {startup_latencies}")
+        else:
+            daemon_client.attach()
         
-        if ARGS.save_type == "video":
+        if ARGS.save_type == "video" and ARGS.record_on_motion:
+            saver.save_motion_video(video_name=f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}")
+        elif ARGS.save_type == "video":
             saver.save_video(video_name=f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}")
             time.sleep(ARGS.inter_video_save_timer)
+        elif ARGS.save_type == "audio":
+            saver.save_audio(audio_name=f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}", seconds=ARGS.audio_length)
+        elif ARGS.save_type == "av":
+            saver.record(recording_name=f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}", seconds=ARGS.video_length)
+        elif ARGS.save_type == "raw":
+            saver.save_frames(recording_name=f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}", number_of_frames=ARGS.num_frames)
         else:
             saver.save_images(ARGS.num_images)
         
@@ -101,4 +227,7 @@ if __name__ == "__main__":
         logger.error(e.with_traceback())
     finally:
         saver.stop()
-        input_stream_sender.stop_processes()
+        if input_stream_sender is not None:
+            input_stream_sender.stop_processes()
+        else:
+            daemon_client.detach()
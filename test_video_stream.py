@@ -7,7 +7,7 @@ from traceback import format_exc
 
 from device_capture_system.core import MultiInputStreamSender, InputStreamReceiver
 from device_capture_system.deviceIO import load_all_devices_from_config
-from device_capture_system.datamodel import FramePreprocessing
+from device_capture_system.datamodel import FramePreprocessing, DerivedStream
 
 # ---------------------------------------------------------------------
 
@@ -18,6 +18,7 @@ AP.add_argument("--proxy_pub_port", type=int, default=10001, help="port for prox
 AP.add_argument("--host", type=str, default="127.0.0.1", help="host name or ip of the server")
 AP.add_argument("-ll", "--logging_level", type=str, default="info", help="logging level", choices=["debug", "warning", "error"])
 AP.add_argument("--num_frames", type=int, default=300, help="number of frames to collect")
+AP.add_argument("--preview_width", type=int, default=640, help="width of the preview stream that is displayed")
 
 ARGS = AP.parse_args()
 
@@ -44,13 +45,15 @@ if __name__ == "__main__":
             FramePreprocessing.ROTATE_90_CLOCKWISE,
             FramePreprocessing.ROTATE_90_CLOCKWISE,
             FramePreprocessing.ROTATE_90_COUNTERCLOCKWISE
-        ]
+        ],
+        derived_streams={cam.name: [DerivedStream(name="preview", width=ARGS.preview_width)] for cam in cameras}
     )
     
     receiver = InputStreamReceiver(
         devices = cameras,
         proxy_pub_port = ARGS.proxy_pub_port,
-        host = ARGS.host
+        host = ARGS.host,
+        stream = "preview"
     )
     
     try:
@@ -0,0 +1,73 @@
+import os
+import json
+import av
+import pytest
+import numpy as np
+
+from datetime import datetime
+
+from device_capture_system import audioIO
+from device_capture_system import datamodel
+
+
+@pytest.fixture
+def microphone():
+    return datamodel.AudioDevice(device_id="mic0", name="microphone0", device_type="audio", channels=2, sample_rate=44100, sample_size=16)
+
+def audio_packets(microphone, n, samples=1024):
+    return [
+        datamodel.FramePacket(
+            device=microphone,
+            frame=np.random.randint(-1000, 1000, (1, samples * microphone.channels), dtype=np.int16),
+            start_read_dt=datetime.now(),
+            end_read_dt=datetime.now()
+        ) for _ in range(n)
+    ]
+
+def audio_file(tmp_path, microphone, file_extension, segment_seconds=None):
+    return datamodel.AudioFile(
+        file_path=str(tmp_path),
+        file_name="audio",
+        file_extension=file_extension,
+        sample_rate=microphone.sample_rate,
+        channels=microphone.channels,
+        segment_seconds=segment_seconds
+    )
+
+# ---------- AUDIO ----------
+
+def test_audio_frame_from_ndarray(microphone):
+    packed = audioIO.audio_frame_from_ndarray(np.zeros((1, 20), dtype=np.int16), microphone)
+    planar = audioIO.audio_frame_from_ndarray(np.zeros((2, 10), dtype=np.float32), microphone)
+    
+    assert (packed.format.name, packed.samples) == ("s16", 10)
+    assert (planar.format.name, planar.samples) == ("fltp", 10)
+    assert packed.sample_rate == 44100
+
+@pytest.mark.parametrize("file_extension", list(audioIO.AUDIO_CODECS))
+def test_audio_file_writer(tmp_path, microphone, file_extension):
+    writer = audioIO.AudioFileWriter(audio_file(tmp_path, microphone, file_extension), microphone)
+    packets = audio_packets(microphone, 43)
+    for packet in packets:
+        writer.write(packet)
+    writer.close()
+    
+    assert writer.files == [os.path.join(str(tmp_path), f"audio.{file_extension}")]
+    
+    with av.open(writer.files[0]) as container:
+        assert abs(container.duration / 1e6 - 43 * 1024 / 44100) < 0.05
+    
+    with open(tmp_path / "audio.json") as f:
+        sidecar = json.load(f)
+    assert sidecar["input_samples"] == 43 * 1024
+    assert sidecar["first_sample_timestamp_ns"] == packets[0].capture_ns
+
+def test_audio_file_writer_segments(tmp_path, microphone):
+    writer = audioIO.AudioFileWriter(audio_file(tmp_path, microphone, "wav", segment_seconds=0.1), microphone)
+    for packet in audio_packets(microphone, 20, samples=441):
+        writer.write(packet)
+    writer.close()
+    
+    # a segment is full after 10 packets of 441 samples
+    assert [os.path.basename(f) for f in writer.files] == ["audio_0000.wav", "audio_0001.wav"]
+    assert os.path.exists(tmp_path / "audio_0001.json")
@@ -0,0 +1,40 @@
+import time
+
+from device_capture_system import clockIO
+
+
+def test_clock_sync_local_server():
+    clock_server = clockIO.ClockServer(host="127.0.0.1", port=1040, node_id="node0")
+    clock_server.start()
+    
+    clock_sync = clockIO.ClockSync("tcp://127.0.0.1:1040", pings_per_round=4)
+    best = clock_sync.sync_round()
+    clock_server.stop()
+    
+    # same clock on both sides, the offset error is bounded by half the round trip
+    assert best is not None
+    assert clock_sync.node_id == "node0"
+    assert clock_sync.is_synchronized()
+    assert abs(clock_sync.offset_ns()) <= best[2] / 2 + 10 ** 5
+
+def test_clock_sync_offset_and_drift():
+    clock_sync = clockIO.ClockSync("tcp://127.0.0.1:1041")
+    
+    # remote clock 5ms ahead and running 100ppm fast, one round per second
+    start = time.time_ns()
+    for i in range(10):
+        local_ns = start + i * 10 ** 9
+        clock_sync._update((local_ns, 5e6 + 1e-4 * i * 10 ** 9, 10 ** 5))
+    
+    assert abs(clock_sync.drift - 1e-4) < 1e-9
+    
+    # extrapolated 5s past the last round
+    local_ns = start + 14 * 10 ** 9
+    assert abs(clock_sync.offset_ns(local_ns) - (5e6 + 1.4e6)) < 10
+    assert abs(clock_sync.to_local_ns(local_ns + clock_sync.offset_ns(local_ns)) - local_ns) < 10
+
+def test_clock_sync_unreachable_server():
+    clock_sync = clockIO.ClockSync("tcp://127.0.0.1:1042", timeout_ms=50)
+    assert clock_sync.sync_round() is None
+    assert not clock_sync.is_synchronized()
+    assert clock_sync.offset_ns() == 0
@@ -0,0 +1,257 @@
+import pytest
+import signal
+import numpy as np
+
+from time import sleep, time
+from unittest.mock import MagicMock
+
+from device_capture_system import core
+from device_capture_system import datamodel
+
+
+@pytest.fixture
+def mock_sender():
+    sender = MagicMock()
+    sender.device = datamodel.PeripheryDevice(device_id="device1", name="Device 1", device_type="video")
+    sender.is_alive.return_value = True
+    sender.heartbeat_age.return_value = 0.
+    return sender
+
+# ---------- SUPERVISION ----------
+
+def test_supervisor_restarts_dead_sender(mock_sender):
+    mock_sender.is_alive.return_value = False
+
+    supervisor = core.ProcessSupervisor(input_senders=[mock_sender], check_interval=0.01, backoff_initial=10.)
+    supervisor.start()
+    sleep(0.2)
+    supervisor.stop()
+
+    # backoff prevents a restart loop
+    mock_sender.restart_process.assert_called_once()
+
+def test_supervisor_restarts_stalled_sender(mock_sender):
+    mock_sender.heartbeat_age.return_value = 100.
+
+    health_updates = []
+    supervisor = core.ProcessSupervisor(
+        input_senders=[mock_sender],
+        check_interval=0.01,
+        heartbeat_timeout=1.,
+        on_health_change=health_updates.append
+    )
+    supervisor.start()
+    sleep(0.1)
+    health = supervisor.health()
+    supervisor.stop()
+
+    mock_sender.restart_process.assert_called()
+    assert health["Device 1"].state == datamodel.ProcessState.STALLED
+    assert health["Device 1"].restarts >= 1
+    assert len(health_updates) > 0
+
+def test_supervisor_healthy_sender(mock_sender):
+    supervisor = core.ProcessSupervisor(input_senders=[mock_sender], check_interval=0.01)
+    supervisor.start()
+    sleep(0.1)
+    health = supervisor.health()
+    supervisor.stop()
+
+    mock_sender.restart_process.assert_not_called()
+    assert health["Device 1"].state == datamodel.ProcessState.RUNNING
+
+# ---------- SHUTDOWN ----------
+
+class HangingInputStreamSender(core.InputStreamSender):
+    def _run(self):
+        # ignores the stop event like a sender blocked in a device read
+        sleep(60)
+
+def test_stop_process_is_bounded():
+    device = datamodel.PeripheryDevice(device_id="device1", name="Device 1", device_type="video")
+    sender = HangingInputStreamSender(device=device, proxy_sub_port=1025)
+    sender.start_process(ready_timeout=0.1)
+    process = sender.process
+    
+    dt = time()
+    sender.stop_process(timeout=0.2, kill_timeout=0.2)
+    
+    assert time() - dt < 2
+    assert not process.is_alive()
+    assert not sender.is_active()
+
+class TermIgnoringInputStreamSender(core.InputStreamSender):
+    def _run(self):
+        # only a kill ends it, like a sender stuck in a driver call
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        sleep(60)
+
+def test_stop_processes_is_bounded(tmp_path):
+    devices = [datamodel.PeripheryDevice(device_id=f"device{i}", name=f"Device {i}", device_type="video") for i in range(4)]
+    multi_sender = core.MultiInputStreamSender(devices=devices, proxy_sub_port=1025, proxy_pub_port=1026, registry_path=str(tmp_path / "registry"))
+    multi_sender.input_sender = [TermIgnoringInputStreamSender(device=device, proxy_sub_port=1025) for device in devices]
+    for sub in multi_sender.input_sender:
+        sub.start_process(ready_timeout=0.1)
+    processes = [sub.process for sub in multi_sender.input_sender]
+    
+    dt = time()
+    multi_sender.stop_processes(timeout=0.2, kill_timeout=0.5)
+    
+    # stragglers are terminated and killed together, not one kill_timeout after the other
+    assert time() - dt < 0.2 + 2 * 0.5 + 0.5
+    assert not any([process.is_alive() for process in processes])
+    assert not any([sub.is_active() for sub in multi_sender.input_sender])
+
+class NeverReadyInputStreamSender(core.InputStreamSender):
+    def _run(self):
+        # polled, a process killed while waiting on the event would leave it unusable for the parent
+        while not self.stop_event.is_set():
+            sleep(0.01)
+
+def test_stop_processes_aborts_restart():
+    device = datamodel.PeripheryDevice(device_id="device0", name="Device 0", device_type="video")
+    multi_sender = core.MultiInputStreamSender(devices=[device], proxy_sub_port=1025, proxy_pub_port=1026)
+    sender = NeverReadyInputStreamSender(device=device, proxy_sub_port=1025)
+    multi_sender.input_sender = [sender]
+    multi_sender.supervisor = core.ProcessSupervisor([sender], check_interval=0.05, backoff_initial=0.)
+    
+    sender.start_process(ready_timeout=0.1)
+    multi_sender.supervisor.start()
+    supervisor_thread = multi_sender.supervisor.thread
+    
+    # the supervisor restarts the killed sender and waits up to 10s for a ready signal that never comes
+    killed = sender.process
+    killed.kill()
+    for _ in range(100):
+        restarted = sender.process
+        if restarted is not None and restarted is not killed and restarted.is_alive():
+            break
+        sleep(0.05)
+    assert restarted is not killed
+    
+    dt = time()
+    multi_sender.stop_processes(timeout=1, kill_timeout=0.5)
+    
+    assert time() - dt < 1 + 5 * 0.5
+    assert not supervisor_thread.is_alive()
+    assert not restarted.is_alive()
+    assert not sender.is_active()
+
+# ---------- STARTUP ----------
+
+class ReadyInputStreamSender(core.InputStreamSender):
+    def _run(self):
+        self.ready_event.set()
+        self.stop_event.wait(5)
+
+class CrashingInputStreamSender(core.InputStreamSender):
+    def _run(self):
+        raise RuntimeError("device could not be opened")
+
+def test_start_process_returns_latency():
+    device = datamodel.PeripheryDevice(device_id="device1", name="Device 1", device_type="video")
+    sender = ReadyInputStreamSender(device=device, proxy_sub_port=1025)
+    
+    latency = sender.start_process(ready_timeout=5)
+    sender.stop_process()
+    
+    assert latency is not None and 0 < latency < 5
+
+def test_start_process_not_ready():
+    device = datamodel.PeripheryDevice(device_id="device1", name="Device 1", device_type="video")
+    sender = CrashingInputStreamSender(device=device, proxy_sub_port=1025)
+    
+    dt = time()
+    latency = sender.start_process(ready_timeout=5)
+    sender.stop_process()
+    
+    # a process dying during startup is reported without waiting for the timeout
+    assert latency is None
+    assert time() - dt < 5
+
+def test_start_process_without_proxy():
+    camera = datamodel.CameraDevice(device_id="device0", name="camera0", device_type="video", width=640, height=480, fps=30., pixel_format="rgb24")
+    sender = core.InputStreamSender(device=camera, proxy_sub_port=1031, connect_timeout=0.2)
+    
+    dt = time()
+    latency = sender.start_process(ready_timeout=5)
+    sender.stop_process()
+    
+    # a sender that never connected to the proxy is not ready
+    assert latency is None
+    assert time() - dt < 5
+
+# ---------- STREAM DESCRIPTORS ----------
+
+def test_stream_descriptors():
+    camera = datamodel.CameraDevice(device_id="device0", name="camera0", device_type="video", width=1920, height=1080, fps=30., pixel_format="yuyv422")
+    microphone = datamodel.AudioDevice(device_id="mic0", name="microphone0", device_type="audio", channels=1, sample_rate=44100, sample_size=16)
+    
+    multi_sender = core.MultiInputStreamSender(
+        devices=[camera, microphone], 
+        proxy_sub_port=1025, 
+        proxy_pub_port=1026, 
+        frame_preprocessings={"camera0": datamodel.FramePreprocessing.ROTATE_90_CLOCKWISE}
+    )
+    descriptors = multi_sender.stream_descriptors()
+    
+    assert (descriptors["camera0"].width, descriptors["camera0"].height, descriptors["camera0"].pixel_format) == (1080, 1920, "rgb24")
+    assert descriptors["microphone0"].width is None
+    assert not descriptors["camera0"].suppressed
+    
+    # receivers that do not repeat frames can tell that static scenes are only sent at the keep alive rate
+    for suppress in [True, False]:
+        multi_sender = core.MultiInputStreamSender(devices=[camera], proxy_sub_port=1025, proxy_pub_port=1026, change_detection=datamodel.ChangeDetection(suppress=suppress))
+        assert multi_sender.stream_descriptors()["camera0"].suppressed == suppress
+
+def test_derived_streams():
+    camera = datamodel.CameraDevice(device_id="device0", name="camera0", device_type="video", width=1920, height=1080, fps=30., pixel_format="yuyv422")
+    preview = datamodel.DerivedStream(name="preview", width=480, decimation=2)
+    
+    multi_sender = core.MultiInputStreamSender(devices=[camera], proxy_sub_port=1025, proxy_pub_port=1026, derived_streams={"camera0": [preview]})
+    descriptors = multi_sender.stream_descriptors("preview")
+    assert (descriptors["camera0"].stream, descriptors["camera0"].width, descriptors["camera0"].height) == ("preview", 480, 270)
+    assert multi_sender.stream_descriptors("other") == {}
+    
+    sender = multi_sender.input_sender[0]
+    packet = datamodel.FramePacket(device=camera, frame=np.zeros((1080, 1920, 3), dtype=np.uint8), start_read_ns=1, end_read_ns=2, sequence=4)
+    derived_packet = sender._derived_packet(packet, preview, 2)
+    assert derived_packet.frame.shape == (270, 480, 3)
+    assert (derived_packet.sequence, derived_packet.capture_ns) == (2, 2)
+    assert packet.frame.shape == (1080, 1920, 3)
+
+# ---------- STREAM COUNTERS ----------
+
+def test_stream_receiver_counts_replaced_packets():
+    devices = [datamodel.PeripheryDevice(device_id=f"device{i}", name=f"Device {i}", device_type="video") for i in range(2)]
+    packets = [datamodel.FramePacket(device=devices[i], frame=np.zeros(1), start_read_ns=0, end_read_ns=0, sequence=s) for i, s in [(0, 0), (0, 1), (1, 0)]]
+    
+    receiver = core.InputStreamReceiver(devices, proxy_pub_port=1025)
+    receiver.running = True
+    receiver.zmq_receiver.receive = MagicMock(side_effect=packets)
+    
+    # the first packet of device0 is replaced while waiting for device1
+    frames = receiver.read()
+    assert frames["device0"].sequence == 1
+    assert receiver.counters()["device0"].consumer_dropped == 1
+
+def test_stream_receiver_read_device_ids():
+    devices = [datamodel.PeripheryDevice(device_id=f"device{i}", name=f"Device {i}", device_type="video") for i in range(2)]
+    packets = [datamodel.FramePacket(device=devices[i], frame=np.zeros(1), start_read_ns=0, end_read_ns=0, sequence=s) for i, s in [(1, 0), (0, 0), (0, 1)]]
+    
+    receiver = core.InputStreamReceiver(devices, proxy_pub_port=1025)
+    receiver.running = True
+    receiver.zmq_receiver.receive = MagicMock(side_effect=packets)
+    
+    # returns with the first packet of device0, including the packet of device1 received before
+    frames = receiver.read(device_ids={"device0"})
+    assert (frames["device0"].sequence, frames["device1"].sequence) == (0, 0)
+    assert receiver.read(device_ids={"device0"}) == {"device0": packets[2]}
+
+def test_direct_topology_has_no_proxy(tmp_path):
+    camera = datamodel.CameraDevice(device_id="device0", name="camera0", device_type="video", width=1920, height=1080, fps=30., pixel_format="yuyv422")
+    multi_sender = core.MultiInputStreamSender(devices=[camera], proxy_sub_port=1025, proxy_pub_port=1026, registry_path=str(tmp_path), supervise=True)
+    
+    assert multi_sender.zmq_proxy is None
+    assert multi_sender.input_sender[0].registry_path == str(tmp_path)
+    assert [entry.name for entry in multi_sender.supervisor.supervised] == ["camera0"]
@@ -0,0 +1,42 @@
+import pytest
+
+from unittest.mock import MagicMock
+
+from device_capture_system import daemon
+
+
+@pytest.fixture
+def capture_daemon():
+    multi_sender = MagicMock()
+    multi_sender.supervisor = None
+    multi_sender.is_paused.return_value = True
+    multi_sender.start_processes.return_value = {"Device 1": 0.5}
+    
+    capture_daemon = daemon.CaptureDaemon(multi_sender=multi_sender, control_port=1030)
+    capture_daemon.start()
+    yield capture_daemon
+    capture_daemon.stop()
+
+def test_daemon_starts_paused(capture_daemon):
+    capture_daemon.multi_sender.start_processes.assert_called_once_with(ready_timeout=10, paused=True)
+
+def test_daemon_session_attach_detach(capture_daemon):
+    client_1 = daemon.CaptureDaemonClient(control_port=1030)
+    client_2 = daemon.CaptureDaemonClient(control_port=1030)
+    
+    status = client_1.attach()
+    client_2.attach()
+    assert status["startup_latencies"] == {"Device 1": 0.5}
+    capture_daemon.multi_sender.resume.assert_called()
+    
+    # devices keep streaming until the last session detached
+    client_1.detach()
+    capture_daemon.multi_sender.pause.assert_not_called()
+    status = client_2.detach()
+    capture_daemon.multi_sender.pause.assert_called_once()
+    assert status["sessions"] == []
+
+def test_daemon_unknown_command(capture_daemon):
+    client = daemon.CaptureDaemonClient(control_port=1030)
+    with pytest.raises(RuntimeError):
+        client.request("reopen")
@@ -86,9 +86,11 @@ def test_frame_packet_dump(periphery_device, frame):
     fram_packet_dump = frame_packet.dump()
     assert "frame" in fram_packet_dump
     assert "data" in fram_packet_dump
-
-    assert "start_read_timestamp" in fram_packet_dump["data"]
-    assert "end_read_timestamp" in fram_packet_dump["data"]
+    
+    assert "start_read_ns" in fram_packet_dump["data"]
+    assert "end_read_ns" in fram_packet_dump["data"]
+    assert "capture_ns" in fram_packet_dump["data"]
+    assert "sequence" in fram_packet_dump["data"]
     assert "device" in fram_packet_dump["data"]
     assert "device" in fram_packet_dump["data"]
 
@@ -101,3 +103,34 @@ def test_frame_packet_dump(periphery_device, frame):
     # check if data is correct
     assert (fram_packet_dump["frame"] == frame).all()
 
+
+def test_frame_packet_timestamps(periphery_device, frame):
+    end_read_dt = datetime(2024, 5, 1, 12, 0, 0, 123456)
+    frame_packet = datamodel.FramePacket(
+        device=periphery_device,
+        frame=frame,
+        start_read_dt=end_read_dt,
+        end_read_dt=end_read_dt
+    )
+    
+    # datetimes are converted without float rounding, the capture time defaults to the read time
+    assert frame_packet.end_read_ns % 10 ** 9 == 123456000
+    assert frame_packet.capture_ns == frame_packet.end_read_ns
+    assert frame_packet.end_read_dt == end_read_dt
+    assert frame_packet.sequence == 0
+
+def test_derived_stream():
+    assert datamodel.DerivedStream(name="preview", width=320).decimation == 1
+    
+    for name in ["full", "motion", "pre|view", ""]:
+        with pytest.raises(ValidationError):
+            datamodel.DerivedStream(name=name)
+
+def test_change_detection():
+    change_detection = datamodel.ChangeDetection()
+    assert change_detection.suppress and change_detection.motion_events
+    
+    with pytest.raises(ValidationError):
+        datamodel.ChangeDetection(block_size=0)
+    with pytest.raises(ValidationError):
+        datamodel.ChangeDetection(min_changed_fraction=1.5)
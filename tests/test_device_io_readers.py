@@ -1,4 +1,5 @@
 import json
+import time
 import pytest
 import numpy as np
 import concurrent.futures as concurrent_future
@@ -69,4 +70,83 @@ def test_read(ffmpeg_reader):
     ret_mm.__next__.side_effect = concurrent_future.TimeoutError
     ffmpeg_reader.container.decode.return_value = ret_mm
     ret = ffmpeg_reader.read()
-    assert ret is None
\ No newline at end of file
+    assert ret is None
+
+# ---------- AUDIO CHUNKING ----------
+
+def test_audio_chunker_packed():
+    chunker = deviceIO.AudioChunker(channels=2, chunk_samples=5)
+    samples = np.arange(2 * 23, dtype=np.int16).reshape(1, -1)
+    
+    chunks = []
+    for i in range(0, samples.shape[1], 6): # frames of 3 samples per channel
+        chunker.push(samples[:, i:i + 6])
+        chunk = chunker.pop()
+        while chunk is not None:
+            chunks.append(chunk)
+            chunk = chunker.pop()
+    
+    assert [c.shape for c in chunks] == [(1, 10)] * 4
+    assert (np.concatenate(chunks, axis=1) == samples[:, :40]).all()
+    assert chunker.available() == 3
+
+def test_audio_chunker_planar():
+    chunker = deviceIO.AudioChunker(channels=2, chunk_samples=4)
+    chunker.push(np.arange(6, dtype=np.float32).reshape(2, 3))
+    assert chunker.pop() is None
+    chunker.push(np.arange(6, 12, dtype=np.float32).reshape(2, 3))
+    
+    assert (chunker.pop() == np.array([[0, 1, 2, 6], [3, 4, 5, 9]])).all()
+
+def test_audio_device_reader_chunks():
+    microphone = datamodel.AudioDevice(device_id="mic0", name="microphone0", device_type="audio", channels=1, sample_rate=8000, sample_size=16, chunk_duration_ms=25)
+    reader = deviceIO.AudioDeviceReader(microphone)
+    
+    # 10ms frames read 10ms apart without a device pts
+    now = time.time_ns()
+    reader._read_frame = MagicMock(side_effect=[(np.full((1, 80), i, dtype=np.int16), now + i * 10 ** 7, now + i * 10 ** 7, i * 10 ** 7, None) for i in range(6)] + [None])
+    
+    frame_packet = reader.read()
+    assert frame_packet.frame.shape == (1, 200)
+    assert (frame_packet.frame[0, 160:] == 2).all()
+    assert frame_packet.sequence == 0
+    
+    # the last 40 samples of the third frame are left for the next chunk
+    assert now + 2 * 10 ** 7 - frame_packet.end_read_ns == 5 * 10 ** 6
+    # the first sample was captured one frame duration before the first frame was read
+    assert frame_packet.capture_ns == now - 10 ** 7
+    
+    frame_packet = reader.read()
+    assert (frame_packet.frame[0, :40] == 2).all()
+    assert frame_packet.sequence == 1
+    assert frame_packet.capture_ns == now - 10 ** 7 + 25 * 10 ** 6
+    assert reader.read() is None
+
+def test_reader_capture_time_from_device_pts():
+    camera = datamodel.CameraDevice(device_id="cam0", name="camera0", device_type="video", width=640, height=480, fps=30, pixel_format="yuyv422")
+    reader = deviceIO.CameraDeviceReader(camera)
+    
+    # read delays of 20, 5 and 12ms for frames 33ms apart, then a pts jump of 10s
+    now = time.time_ns()
+    delays = [20, 5, 12]
+    reader._read_frame = MagicMock(side_effect=[(np.zeros((480, 640, 3), dtype=np.uint8), now, now + i * 33 * 10 ** 6 + delays[i] * 10 ** 6, 0, i * 33 * 10 ** 6) for i in range(3)] + [
+        (np.zeros((480, 640, 3), dtype=np.uint8), now, now + 99 * 10 ** 6, 0, 10 ** 10)
+    ])
+    
+    frame_packets = [reader.read() for _ in range(4)]
+    
+    assert [p.sequence for p in frame_packets] == [0, 1, 2, 3]
+    assert frame_packets[0].capture_ns == now + 20 * 10 ** 6
+    # the second frame was read with less delay, the anchor moves to it and the jitter of the third frame is ignored
+    assert frame_packets[1].capture_ns == now + 38 * 10 ** 6
+    assert frame_packets[2].capture_ns == now + 71 * 10 ** 6
+    # after the jump the device clock is anchored again
+    assert frame_packets[3].capture_ns == now + 99 * 10 ** 6
+    assert frame_packets[3].device_pts_ns == 10 ** 10
+
+@patch('device_capture_system.deviceIO.av.open')
+def test_audio_device_reader_buffer_size(mock_av_open):
+    microphone = datamodel.AudioDevice(device_id="mic0", name="microphone0", device_type="audio", channels=1, sample_rate=44100, sample_size=16, audio_buffer_size=20)
+    deviceIO.AudioDeviceReader(microphone).start()
+    
+    assert mock_av_open.call_args.kwargs["options"]["audio_buffer_size"] == "20"
@@ -0,0 +1,389 @@
+import os
+import av
+import pytest
+import numpy as np
+
+from time import sleep
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from device_capture_system import fileIO
+from device_capture_system import datamodel
+from device_capture_system.shardIO import ShardReader
+from device_capture_system.rawIO import RawFrameReader
+
+
+@pytest.fixture
+def cameras():
+    return [
+        datamodel.CameraDevice(device_id=f"device{i}", name=f"camera{i}", device_type="video", width=640, height=480, fps=30., pixel_format="rgb24")
+        for i in range(2)
+    ]
+
+@pytest.fixture
+def frames(cameras):
+    return {
+        cam.device_id: datamodel.FramePacket(
+            device=cam,
+            frame=np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8),
+            start_read_dt=datetime.now(),
+            end_read_dt=datetime.now()
+        ) for cam in cameras
+    }
+
+# ---------- IMAGE SAVER ----------
+
+def test_image_saver_save_images(tmp_path, cameras, frames):
+    image_saver = fileIO.ImageSaver(cameras=cameras, proxy_pub_port=1025, output_path=str(tmp_path), num_workers=2, queue_size=2)
+    image_saver.stream_receiver = MagicMock()
+    image_saver.stream_receiver.read.return_value = frames
+    
+    image_saver.start()
+    image_saver.save_images(5)
+    image_saver.stop()
+    
+    for cam in cameras:
+        saved_images = os.listdir(tmp_path / cam.name)
+        assert len(saved_images) > 0
+        assert all([image.endswith(".jpg") for image in saved_images])
+    
+    assert image_saver.work_queue is None
+
+def test_image_saver_drops_when_full(tmp_path, cameras, frames):
+    image_saver = fileIO.ImageSaver(
+        cameras=cameras, 
+        proxy_pub_port=1025, 
+        output_path=str(tmp_path), 
+        num_workers=1, 
+        queue_size=1, 
+        backpressure_policy=datamodel.BackpressurePolicy.DROP_NEWEST
+    )
+    image_saver.stream_receiver = MagicMock()
+    image_saver.stream_receiver.read.return_value = frames
+    
+    image_saver.start()
+    for i in range(20):
+        image_saver.save_image(f"image_{i}")
+    counters = image_saver.counters()
+    image_saver.stop()
+    
+    # every submitted image is either saved or counted as dropped
+    assert counters.submitted == 40
+    assert counters.dropped > 0
+    assert sum([len(os.listdir(tmp_path / cam.name)) for cam in cameras]) == 40 - counters.dropped
+
+def test_image_saver_shards(tmp_path, cameras, frames):
+    image_saver = fileIO.ImageSaver(cameras=cameras, proxy_pub_port=1025, output_path=str(tmp_path), output_mode="shards")
+    image_saver.stream_receiver = MagicMock()
+    image_saver.stream_receiver.read.return_value = frames
+    
+    image_saver.start()
+    image_saver.save_images(3)
+    image_saver.stop()
+    
+    reader = ShardReader(str(tmp_path))
+    assert len(reader) == 6
+    assert sorted(reader.devices()) == [cam.name for cam in cameras]
+    assert reader.load(reader.range(0, 2 ** 62)[0]).shape == (480, 640, 3)
+
+# ---------- RAW SAVER ----------
+
+def test_raw_saver_save_frames(tmp_path, cameras, frames):
+    raw_saver = fileIO.RawSaver(cameras=cameras, proxy_pub_port=1025, output_path=str(tmp_path))
+    raw_saver.stream_receiver = MagicMock()
+    raw_saver.stream_receiver.read.return_value = frames
+    
+    recordings = raw_saver.save_frames("recording", 4)
+    
+    for cam, recording in zip(cameras, recordings):
+        reader = RawFrameReader(recording)
+        assert len(reader) == 4
+        assert (reader[0] == frames[cam.device_id].frame).all()
+        assert reader.metadata["device"]["name"] == cam.name
+
+# ---------- AUDIO SAVER ----------
+
+def test_audio_saver_save_audio(tmp_path):
+    microphone = datamodel.AudioDevice(device_id="mic0", name="microphone0", device_type="audio", channels=1, sample_rate=8000, sample_size=16)
+    audio_saver = fileIO.AudioSaver(microphones=[microphone], proxy_pub_port=1025, output_path=str(tmp_path), audio_file_extension="flac")
+    audio_saver.stream_receiver = MagicMock()
+    audio_saver.stream_receiver.read_packet.side_effect = lambda: datamodel.FramePacket(
+        device=microphone,
+        frame=np.zeros((1, 800), dtype=np.int16),
+        start_read_dt=datetime.now(),
+        end_read_dt=datetime.now()
+    )
+    
+    audio_saver.start()
+    files = audio_saver.save_audio("recording", seconds=1)
+    counters = audio_saver.counters()
+    audio_saver.stop()
+    
+    assert files == [os.path.join(str(tmp_path), "microphone0", "recording.flac")]
+    assert os.path.exists(tmp_path / "microphone0" / "recording.json")
+    assert counters.completed == 10
+
+def test_audio_saver_slow_encoder(tmp_path, monkeypatch):
+    microphone = datamodel.AudioDevice(device_id="mic0", name="microphone0", device_type="audio", channels=1, sample_rate=8000, sample_size=16)
+    audio_saver = fileIO.AudioSaver(microphones=[microphone], proxy_pub_port=1025, output_path=str(tmp_path), audio_file_extension="wav", queue_size=1)
+    audio_saver.stream_receiver = MagicMock()
+    audio_saver.stream_receiver.read_packet.side_effect = lambda: datamodel.FramePacket(
+        device=microphone,
+        frame=np.zeros((1, 800), dtype=np.int16),
+        start_read_dt=datetime.now(),
+        end_read_dt=datetime.now()
+    )
+    
+    # the encoder is slower than the packets arrive
+    write = fileIO.AudioFileWriter.write
+    def slow_write(self, frame_packet):
+        sleep(0.01)
+        write(self, frame_packet)
+    monkeypatch.setattr(fileIO.AudioFileWriter, "write", slow_write)
+    
+    audio_saver.start()
+    files = audio_saver.save_audio("recording", seconds=1)
+    counters = audio_saver.counters()
+    audio_saver.stop()
+    
+    # no packet is dropped, the file has the requested length
+    assert counters.dropped == 0 and counters.completed == 10
+    with av.open(files[0]) as container:
+        assert abs(container.duration / 1e6 - 1) < 0.01
+
+# ---------- AV RECORDER ----------
+
+def test_av_recorder_timestamps(tmp_path, cameras):
+    microphone = datamodel.AudioDevice(device_id="mic0", name="microphone0", device_type="audio", channels=1, sample_rate=16000, sample_size=16)
+    start = datetime.now().timestamp()
+    
+    # 30 fps video with frames 30-39 dropped and 20ms audio packets, 2 seconds in total
+    packets = []
+    for i in range(100):
+        dt = datetime.fromtimestamp(start + i * 0.02)
+        packets.append(datamodel.FramePacket(device=microphone, frame=np.zeros((1, 320), dtype=np.int16), start_read_dt=dt, end_read_dt=dt))
+    for i in range(60):
+        if 30 <= i < 40:
+            continue
+        dt = datetime.fromtimestamp(start + i / 30)
+        packets.append(datamodel.FramePacket(device=cameras[0], frame=np.zeros((48, 64, 3), dtype=np.uint8), start_read_dt=dt, end_read_dt=dt))
+    packets.sort(key=lambda p: p.end_read_dt)
+    packets.append(datamodel.FramePacket(device=microphone, frame=np.zeros((1, 320), dtype=np.int16), start_read_dt=datetime.fromtimestamp(start + 3), end_read_dt=datetime.fromtimestamp(start + 3)))
+    
+    recorder = fileIO.AVRecorder(cameras=cameras[:1], microphones=[microphone], proxy_pub_port=1025, output_path=str(tmp_path))
+    recorder.stream_receiver = MagicMock()
+    recorder.stream_receiver.read_packet.side_effect = packets
+    
+    recorder.start()
+    file_uri = recorder.record("recording", seconds=2.5)
+    recorder.stop()
+    
+    with av.open(file_uri) as container:
+        video, audio = container.streams.video[0], container.streams.audio[0]
+        assert (video.width, video.height) == (64, 48)
+        video_pts = sorted([packet.pts for packet in container.demux(video) if packet.pts is not None])
+    
+    # the dropped frames leave a gap instead of shifting the following frames
+    assert len(video_pts) == 50
+    assert video_pts[30] - video_pts[29] > 300
+    assert abs(video_pts[-1] * float(video.time_base) - 59 / 30) < 0.05
+
+def test_av_muxer_audio_resync(tmp_path):
+    microphone = datamodel.AudioDevice(device_id="mic0", name="microphone0", device_type="audio", channels=1, sample_rate=16000, sample_size=16)
+    muxer = fileIO._AVMuxer(str(tmp_path / "audio.mkv"), [], [microphone], "h264", "flac", audio_resync_threshold=0.1)
+    start = datetime.now().timestamp()
+    
+    # 0.5s of audio missing after the 10th packet, and a packet arriving too early
+    for t in [i * 0.02 for i in range(10)] + [0.7 + i * 0.02 for i in range(10)] + [0.5]:
+        dt = datetime.fromtimestamp(start + t)
+        muxer.write(datamodel.FramePacket(device=microphone, frame=np.zeros((1, 320), dtype=np.int16), start_read_dt=dt, end_read_dt=dt))
+    muxer.close()
+    
+    assert muxer.audio_resyncs == 1
+    assert muxer.audio_dropped == 1
+    with av.open(str(tmp_path / "audio.mkv")) as container:
+        assert abs(container.duration / 1e6 - 0.9) < 0.05
+
+# ---------- VIDEO SAVER ----------
+
+def test_video_saver_encoder_profile(tmp_path):
+    camera = datamodel.CameraDevice(device_id="device0", name="camera0", device_type="video", width=1280, height=720, fps=15., pixel_format="rgb24")
+    video_saver = fileIO.VideoSaver(cameras=[camera], proxy_pub_port=1025, output_path=str(tmp_path), video_length=1, encoder_profile="realtime", crf=30)
+    
+    assert video_saver.video_files[0].preset == "ultrafast"
+    assert video_saver.video_files[0].crf == 30
+    assert video_saver.video_files[0].codec == "h264"
+    
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    video_saver.stream_receiver = MagicMock()
+    video_saver.stream_receiver.read.return_value = {"device0": datamodel.FramePacket(device=camera, frame=frame, start_read_dt=datetime.now(), end_read_dt=datetime.now())}
+    video_saver.save_video("video")
+    
+    with av.open(str(tmp_path / "camera0" / "video.mp4")) as container:
+        assert container.streams.video[0].frames == 15
+
+def test_video_saver_motion_video(tmp_path):
+    camera = datamodel.CameraDevice(device_id="device0", name="camera0", device_type="video", width=640, height=480, fps=15., pixel_format="rgb24")
+    video_saver = fileIO.VideoSaver(cameras=[camera], proxy_pub_port=1025, output_path=str(tmp_path), video_length=2, preset="ultrafast", motion_events=True)
+    
+    def motion_packet(motion: bool):
+        return datamodel.FramePacket(device=camera, frame=np.zeros(0, dtype=np.uint8), start_read_dt=datetime.now(), end_read_dt=datetime.now(), motion=motion)
+    
+    # motion starts while waiting and stops after 3 recorded frames
+    video_saver.motion_receiver = MagicMock()
+    video_saver.motion_receiver.poll.side_effect = [False, True, False, False, False, False, True, False] + [False] * 10
+    video_saver.motion_receiver.read_packet.side_effect = [motion_packet(True), motion_packet(False)]
+    video_saver.stream_receiver = MagicMock()
+    video_saver.stream_receiver.read.return_value = {"device0": datamodel.FramePacket(device=camera, frame=np.zeros((480, 640, 3), dtype=np.uint8), start_read_dt=datetime.now(), end_read_dt=datetime.now())}
+    
+    assert video_saver.save_motion_video("motion", motion_timeout=10)
+    assert video_saver.moving == set()
+    with av.open(str(tmp_path / "camera0" / "motion.mp4")) as container:
+        assert container.streams.video[0].frames == 3
+    
+    # no motion within the timeout
+    video_saver.motion_receiver.poll.side_effect = None
+    video_saver.motion_receiver.poll.return_value = False
+    assert not video_saver.save_motion_video("still", motion_timeout=0.01)
+
+def test_video_saver_motion_video_static_camera(tmp_path, cameras):
+    video_saver = fileIO.VideoSaver(cameras=cameras, proxy_pub_port=1025, output_path=str(tmp_path), video_length=1, preset="ultrafast", motion_events=True)
+    
+    # only camera0 moves, camera1 suppresses its unchanged frames and sent a single keep alive
+    video_saver.motion_receiver = MagicMock()
+    video_saver.motion_receiver.poll.side_effect = [True] + [False] * 100
+    video_saver.motion_receiver.read_packet.return_value = datamodel.FramePacket(device=cameras[0], frame=np.zeros(0, dtype=np.uint8), start_read_dt=datetime.now(), end_read_dt=datetime.now(), motion=True)
+    
+    def read(device_ids=None):
+        frames = {"device0": datamodel.FramePacket(device=cameras[0], frame=np.zeros((480, 640, 3), dtype=np.uint8), start_read_dt=datetime.now(), end_read_dt=datetime.now())}
+        if "device1" in device_ids:
+            frames["device1"] = datamodel.FramePacket(device=cameras[1], frame=np.zeros((480, 640, 3), dtype=np.uint8), start_read_dt=datetime.now(), end_read_dt=datetime.now())
+        return frames
+    video_saver.stream_receiver = MagicMock()
+    video_saver.stream_receiver.read.side_effect = read
+    
+    assert video_saver.save_motion_video("motion", motion_timeout=10)
+    
+    # the moving camera sets the frame rate, the last frame of the static camera is repeated
+    assert [call.kwargs["device_ids"] for call in video_saver.stream_receiver.read.call_args_list[:2]] == [{"device0", "device1"}, {"device0"}]
+    for cam in cameras:
+        with av.open(str(tmp_path / cam.name / "motion.mp4")) as container:
+            assert container.streams.video[0].frames == 30
+
+def test_video_saver_geometry_from_frames(tmp_path):
+    # a 640x480 camera rotated by 90 degrees
+    camera = datamodel.CameraDevice(device_id="device0", name="camera0", device_type="video", width=640, height=480, fps=15., pixel_format="rgb24")
+    descriptor = datamodel.StreamDescriptor(device_id="device0", device_name="camera0", frame_preprocessing=datamodel.FramePreprocessing.ROTATE_90_CLOCKWISE, width=480, height=640, pixel_format="rgb24")
+    
+    video_saver = fileIO.VideoSaver(cameras=[camera], proxy_pub_port=1025, output_path=str(tmp_path), video_length=1, preset="ultrafast", stream_descriptors={"camera0": descriptor})
+    assert (video_saver.video_files[0].width, video_saver.video_files[0].height) == (480, 640)
+    
+    frame = np.zeros((640, 480, 3), dtype=np.uint8)
+    video_saver.stream_receiver = MagicMock()
+    video_saver.stream_receiver.read.return_value = {"device0": datamodel.FramePacket(device=camera, frame=frame, start_read_dt=datetime.now(), end_read_dt=datetime.now())}
+    video_saver.save_video("rotated")
+    
+    # an unrotated camera without descriptor gets its geometry from the first frame
+    video_saver = fileIO.VideoSaver(cameras=[camera], proxy_pub_port=1025, output_path=str(tmp_path), video_length=1, preset="ultrafast")
+    video_saver.stream_receiver = MagicMock()
+    video_saver.stream_receiver.read.return_value = {"device0": datamodel.FramePacket(device=camera, frame=np.zeros((64, 96), dtype=np.uint8), start_read_dt=datetime.now(), end_read_dt=datetime.now())}
+    video_saver.save_video("gray")
+    assert (video_saver.video_files[0].width, video_saver.video_files[0].height, video_saver.video_files[0].input_pixel_format) == (96, 64, "gray")
+    
+    for video_name, size in [("rotated", (480, 640)), ("gray", (96, 64))]:
+        with av.open(str(tmp_path / "camera0" / f"{video_name}.mp4")) as container:
+            stream = container.streams.video[0]
+            assert (stream.width, stream.height) == size
+
+# ---------- PRE TRIGGER RECORDER ----------
+
+def pre_trigger_packets(camera, seconds, start_ns=10 ** 18):
+    return [
+        datamodel.FramePacket(device=camera, frame=np.full((48, 64, 3), i % 256, dtype=np.uint8), start_read_ns=start_ns, end_read_ns=start_ns, capture_ns=start_ns + round(i * 1e9 / 30), sequence=i)
+        for i in range(round(seconds * 30))
+    ]
+
+@pytest.mark.parametrize("buffer_mode", ["jpeg", "raw"])
+def test_pre_trigger_recorder(tmp_path, cameras, buffer_mode):
+    recorder = fileIO.PreTriggerRecorder(cameras=cameras[:1], proxy_pub_port=1025, output_path=str(tmp_path), pre_trigger_seconds=1., post_trigger_seconds=0.5, buffer_mode=buffer_mode)
+    packets = pre_trigger_packets(cameras[0], 4)
+    
+    # triggered at 2s, frames from 1s to 2.5s are saved
+    for packet in packets[:60]:
+        recorder.process(packet)
+    event_name = recorder.trigger("event", trigger_ns=packets[60].capture_ns)
+    for packet in packets[60:]:
+        recorder.process(packet)
+    
+    assert event_name == "event"
+    assert not recorder.is_recording()
+    assert recorder.events == [str(tmp_path / "event")]
+    
+    if buffer_mode == "jpeg":
+        sequences = [record.sequence for record in ShardReader(str(tmp_path / "event")).records["camera0"]]
+    else:
+        reader = RawFrameReader(str(tmp_path / "event" / "camera0"))
+        sequences = [int(frame[0, 0, 0]) for frame in reader]
+    assert sequences == list(range(30, 76))
+
+def test_pre_trigger_recorder_encoding_workers(tmp_path, cameras):
+    recorder = fileIO.PreTriggerRecorder(cameras=cameras[:1], proxy_pub_port=1025, output_path=str(tmp_path), pre_trigger_seconds=1., post_trigger_seconds=0.5, num_workers=4)
+    packets = pre_trigger_packets(cameras[0], 4)
+    recorder.stream_receiver = MagicMock()
+    recorder.stream_receiver.read_packet.side_effect = packets + [None] * 10 ** 6
+    
+    # the frames are encoded by 4 workers and still buffered and written in the order they were received
+    recorder.trigger("event", trigger_ns=packets[60].capture_ns)
+    recorder.start()
+    for _ in range(100):
+        if recorder.processed == len(packets):
+            break
+        sleep(0.05)
+    recorder.stop()
+    
+    assert recorder.events == [str(tmp_path / "event")]
+    assert [record.sequence for record in ShardReader(str(tmp_path / "event")).records["camera0"]] == list(range(30, 76))
+
+def test_pre_trigger_recorder_merges_pending_triggers(tmp_path, cameras):
+    recorder = fileIO.PreTriggerRecorder(cameras=cameras[:1], proxy_pub_port=1025, output_path=str(tmp_path), pre_trigger_seconds=1., post_trigger_seconds=0.5, buffer_mode="jpeg")
+    packets = pre_trigger_packets(cameras[0], 4)
+    
+    # two triggers before the recorder thread processed the next packet are written as one event
+    for packet in packets[:60]:
+        recorder.process(packet)
+    assert recorder.trigger("a", trigger_ns=packets[60].capture_ns) == "a"
+    assert recorder.trigger("b", trigger_ns=packets[65].capture_ns) == "a"
+    for packet in packets[60:]:
+        recorder.process(packet)
+    
+    assert recorder.events == [str(tmp_path / "a")]
+    assert [record.sequence for record in ShardReader(str(tmp_path / "a")).records["camera0"]] == list(range(30, 81))
+    
+    # a trigger without any following packet is still written on stop
+    assert recorder.trigger("c", trigger_ns=packets[-1].capture_ns) == "c"
+    recorder.stop()
+    assert recorder.events == [str(tmp_path / "a"), str(tmp_path / "c")]
+
+def test_pre_trigger_recorder_raw_segments(tmp_path, cameras):
+    recorder = fileIO.PreTriggerRecorder(cameras=cameras[:1], proxy_pub_port=1025, output_path=str(tmp_path), pre_trigger_seconds=1., post_trigger_seconds=0.5, buffer_mode="raw")
+    packets = pre_trigger_packets(cameras[0], 6)
+    
+    # re-triggered every 0.4s from 2s to 4s, the event from 1s to 4.5s does not fit into one recording of 62 frames
+    for i, packet in enumerate(packets):
+        if 60 <= i <= 120 and i % 12 == 0:
+            assert recorder.trigger(f"event{i}", trigger_ns=packet.capture_ns) == "event60"
+        recorder.process(packet)
+    
+    assert recorder.events == [str(tmp_path / "event60")]
+    readers = [RawFrameReader(str(tmp_path / "event60" / name)) for name in ["camera0", "camera0-001"]]
+    assert [len(reader) for reader in readers] == [62, 44]
+    assert [int(frame[0, 0, 0]) for reader in readers for frame in reader] == list(range(30, 136))
+
+def test_pre_trigger_recorder_memory_bound(tmp_path, cameras):
+    frame_bytes = 48 * 64 * 3
+    recorder = fileIO.PreTriggerRecorder(cameras=cameras[:1], proxy_pub_port=1025, output_path=str(tmp_path), pre_trigger_seconds=10., buffer_mode="raw", max_buffer_bytes=20 * frame_bytes)
+    for packet in pre_trigger_packets(cameras[0], 2):
+        recorder.process(packet)
+    
+    assert len(recorder.rings["device0"]) == 20
+    assert frame_bytes * 20 <= recorder.memory_usage()["camera0"] < frame_bytes * 21
@@ -0,0 +1,66 @@
+import io
+import pytest
+import numpy as np
+
+from PIL import Image
+
+from device_capture_system import imageIO
+from device_capture_system import datamodel
+
+
+@pytest.fixture
+def frame():
+    return np.linspace(0, 255, 64 * 48 * 3).astype(np.uint8).reshape(48, 64, 3)
+
+def image_file(file_extension, **kwargs):
+    return datamodel.ImageFile(
+        file_path="path", 
+        file_name="name", 
+        file_extension=file_extension, 
+        jpg_quality=95, 
+        png_compression=3,
+        **kwargs
+    )
+
+# ---------- ENCODERS ----------
+
+IMAGE_ENCODER_NAMES = ["opencv", "pil", "av"]
+
+@pytest.mark.parametrize("encoder_name", IMAGE_ENCODER_NAMES)
+@pytest.mark.parametrize("file_extension", ["jpg", "png", "webp"])
+def test_image_encoder_roundtrip(encoder_name, file_extension, frame):
+    encoder = imageIO.get_image_encoder(encoder_name, file_extension)
+    
+    data = encoder.encode(frame, image_file(file_extension, jpg_subsampling="4:4:4", jpg_optimize=True))
+    decoded = np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+    
+    assert decoded.shape == frame.shape
+    if file_extension == "png":
+        assert (decoded == frame).all()
+
+@pytest.mark.parametrize("encoder_name", IMAGE_ENCODER_NAMES)
+def test_image_encoder_yuv_input(encoder_name, frame):
+    import av
+    yuv_frame = av.VideoFrame.from_ndarray(frame, format="rgb24").reformat(format="yuv420p").to_ndarray()
+    
+    data = imageIO.get_image_encoder(encoder_name, "jpg").encode(yuv_frame, image_file("jpg"), pixel_format="yuv420p")
+    
+    assert Image.open(io.BytesIO(data)).size == (64, 48)
+
+def test_get_image_encoder_auto():
+    encoder = imageIO.get_image_encoder("auto", "jpg")
+    assert encoder.name == imageIO.IMAGE_ENCODER_PRIORITY[0]
+    
+    with pytest.raises(AssertionError):
+        imageIO.get_image_encoder("unknown", "jpg")
+
+def test_decode_image(frame):
+    for file_extension in ["png", "npy"]:
+        data = imageIO.get_image_encoder("auto", file_extension).encode(frame, image_file(file_extension))
+        assert (imageIO.decode_image(data) == frame).all()
+
+def test_resize_frame(frame):
+    resized = imageIO.resize_frame(frame[:, ::-1], 32, 24)
+    assert resized.shape == (24, 32, 3)
+    # area interpolation averages 2x2 blocks
+    assert abs(int(resized[0, -1, 0]) - int(frame[:2, :2, 0].mean())) <= 1
@@ -0,0 +1,37 @@
+import sys
+import pytest
+import subprocess
+
+# heavy codec, imaging and ui libraries that must only be loaded on first use
+HEAVY_MODULES = ["av", "cv2", "PIL.Image", "tqdm"]
+
+# generous upper bound for the cumulative import time of an entry point in seconds
+IMPORT_TIME_BUDGET = 1.5
+
+
+def import_times(statement: str) -> dict:
+    """Run statement in a fresh interpreter with -X importtime and return the cumulative import time per module in seconds"""
+    
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True)
+    
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        times[module.strip()] = int(cumulative) / 1e6
+    return times
+
+@pytest.mark.parametrize("entry_point, statement", [
+    ("device_capture_system.__main__", "import device_capture_system.__main__"),
+    ("device_capture_system.deviceIO", "from device_capture_system.deviceIO import load_all_devices_from_config"),
+    ("device_capture_system.core", "from device_capture_system.core import InputStreamReceiver"),
+    ("device_capture_system.fileIO", "import device_capture_system.fileIO"),
+])
+def test_import_time_budget(entry_point, statement):
+    times = import_times(statement)
+    
+    loaded_heavy_modules = [module for module in HEAVY_MODULES if module in times]
+    assert loaded_heavy_modules == [], f"{entry_point} eagerly imports {loaded_heavy_modules}"
+    
+    assert times[entry_point] < IMPORT_TIME_BUDGET, f"{entry_point} took {times[entry_point]:.3f}s to import"
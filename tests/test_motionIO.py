@@ -0,0 +1,41 @@
+import numpy as np
+
+from device_capture_system import motionIO
+from device_capture_system import datamodel
+
+
+def test_gray_thumbnail():
+    frame = np.zeros((48, 70, 3), dtype=np.uint8)
+    frame[:16, :16] = 90
+    
+    thumbnail = motionIO.gray_thumbnail(frame, 16)
+    assert thumbnail.shape == (3, 4)
+    assert thumbnail.dtype == np.float32
+    assert thumbnail[0, 0] == 90 and thumbnail[1:].sum() == 0
+    
+    assert motionIO.gray_thumbnail(frame[..., 0], 8).shape == (6, 8)
+
+def test_change_detector():
+    config = datamodel.ChangeDetection(block_size=8, keep_alive_seconds=1., motion_hold_seconds=0.5)
+    change_detector = motionIO.ChangeDetector(config)
+    
+    static = np.random.default_rng(0).integers(100, 104, (48, 64, 3), dtype=np.uint8)
+    moving = static.copy()
+    moving[:16, :16] = 255
+    
+    # 3 seconds at 10 fps, motion from 1.0s to 1.2s
+    frames = [moving if 10 <= i < 13 else static for i in range(30)]
+    results = [change_detector.update(frame, i * 100_000_000) for i, frame in enumerate(frames)]
+    
+    published = [i for i, (send, _) in enumerate(results) if send]
+    events = [(i, event) for i, (_, event) in enumerate(results) if event is not None]
+    
+    # the first frame, the keep alives and every frame in motion, which lasts until 0.5s after the last change
+    assert events == [(10, True), (19, False)]
+    assert published == [0] + list(range(10, 19)) + [28]
+    assert change_detector.suppressed == 30 - len(published)
+
+def test_change_detector_without_suppression():
+    change_detector = motionIO.ChangeDetector(datamodel.ChangeDetection(suppress=False))
+    frame = np.zeros((64, 64), dtype=np.uint8)
+    assert all([change_detector.update(frame, i)[0] for i in range(5)])
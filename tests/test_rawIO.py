@@ -0,0 +1,53 @@
+import json
+import numpy as np
+
+from device_capture_system import rawIO
+
+
+def write_recording(file_prefix, n, max_frames):
+    writer = rawIO.RawFrameWriter(str(file_prefix), shape=(4, 6, 3), dtype=np.uint8, max_frames=max_frames, metadata={"device": "camera0"})
+    for i in range(n):
+        assert writer.write(np.full((4, 6, 3), i, dtype=np.uint8), timestamp_ns=(i + 1) * 1000)
+    return writer
+
+# ---------- RAW FRAMES ----------
+
+def test_raw_frame_roundtrip(tmp_path):
+    writer = write_recording(tmp_path / "camera0" / "recording", n=10, max_frames=10)
+    
+    assert writer.is_full()
+    assert not writer.write(np.zeros((4, 6, 3), dtype=np.uint8), timestamp_ns=11000)
+    writer.close()
+    
+    reader = rawIO.RawFrameReader(str(tmp_path / "camera0" / "recording"))
+    assert len(reader) == 10
+    assert reader.metadata == {"device": "camera0"}
+    assert isinstance(reader[3], np.memmap)
+    assert (reader[3] == 3).all()
+    
+    assert reader.index_of(4400) == 3
+    frames, timestamps = reader.range(2000, 5000)
+    assert isinstance(frames, np.memmap)
+    assert list(timestamps) == [2000, 3000, 4000, 5000]
+    assert [int(f[0, 0, 0]) for f in frames] == [1, 2, 3, 4]
+
+def test_raw_frame_partial_recording(tmp_path):
+    writer = write_recording(tmp_path / "recording", n=3, max_frames=10)
+    writer.close()
+    
+    reader = rawIO.RawFrameReader(str(tmp_path / "recording"))
+    assert len(reader) == 3
+    
+    # the frames file is readable without the header
+    assert np.load(str(tmp_path / "recording.frames.npy")).shape == (10, 4, 6, 3)
+
+def test_raw_frame_recovers_unclosed_recording(tmp_path):
+    writer = write_recording(tmp_path / "recording", n=5, max_frames=10)
+    writer.frames.flush()
+    writer.timestamps.flush()
+    
+    with open(tmp_path / "recording.json") as f:
+        assert json.load(f)["count"] == 0
+    
+    reader = rawIO.RawFrameReader(str(tmp_path / "recording"))
+    assert len(reader) == 5
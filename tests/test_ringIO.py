@@ -0,0 +1,28 @@
+import numpy as np
+
+from device_capture_system import ringIO
+
+
+def test_raw_frame_ring():
+    ring = ringIO.RawFrameRing(capacity=3, shape=(2, 2), dtype=np.uint8)
+    nbytes = ring.nbytes
+    
+    for i in range(5):
+        ring.push(np.full((2, 2), i, dtype=np.uint8), timestamp_ns=i * 10, sequence=i)
+    
+    assert len(ring) == 3
+    assert ring.nbytes == nbytes
+    assert [(int(frame[0, 0]), timestamp, sequence) for frame, timestamp, sequence in ring.since(0)] == [(2, 20, 2), (3, 30, 3), (4, 40, 4)]
+    assert [sequence for _, _, sequence in ring.since(35)] == [4]
+
+def test_encoded_frame_ring():
+    # one second of history at 10 fps, bounded to 8 frames of 100 bytes
+    ring = ringIO.EncodedFrameRing(seconds=1., max_bytes=800)
+    
+    for i in range(20):
+        ring.push(bytes(100), timestamp_ns=i * 100_000_000, sequence=i)
+    
+    assert len(ring) == 8
+    assert ring.nbytes == 800
+    assert [sequence for _, _, sequence in ring.since(0)] == list(range(12, 20))
+    assert ring.evicted == 12 # all evictions are for the size limit, the oldest frame is only 0.7s old
@@ -0,0 +1,52 @@
+import tarfile
+import pytest
+import numpy as np
+
+from device_capture_system import shardIO
+from device_capture_system.imageIO import RawArrayEncoder
+
+
+@pytest.fixture
+def shard_dir(tmp_path):
+    writer = shardIO.ShardWriter(str(tmp_path), prefix="images", max_shard_size=4096)
+    for i in range(10):
+        for device in ["cam.left", "cam.right"]:
+            array = np.full((8, 8), i, dtype=np.uint8)
+            writer.write(key=f"frame{i}", device=device, extension="npy", data=RawArrayEncoder().encode(array, None), timestamp_ns=i * 1000, sequence=i)
+    writer.close()
+    return tmp_path
+
+# ---------- SHARDS ----------
+
+def test_shard_writer_rotates(shard_dir):
+    shards = sorted(shard_dir.glob("images-*.tar"))
+    assert len(shards) > 1
+    
+    # shards stay readable as plain tar files
+    members = sum([len(tarfile.open(shard).getnames()) for shard in shards])
+    assert members == 20
+
+def test_shard_reader_random_access(shard_dir):
+    reader = shardIO.ShardReader(str(shard_dir))
+    
+    assert len(reader) == 20
+    assert sorted(reader.devices()) == ["cam.left", "cam.right"]
+    
+    record = reader.nearest("cam.right", 4400)
+    assert record.sequence == 4
+    assert (reader.load(record) == 4).all()
+    
+    records = reader.range(2000, 5000)
+    assert [r.sequence for r in records] == [2, 2, 3, 3, 4, 4, 5, 5]
+    assert [r.sequence for r in reader.range(2000, 5000, device="cam.left")] == [2, 3, 4, 5]
+    reader.close()
+
+def test_shard_writer_continues_existing_shards(shard_dir):
+    shards_before = sorted(shard_dir.glob("images-*.tar"))
+    
+    writer = shardIO.ShardWriter(str(shard_dir), prefix="images")
+    writer.write(key="frame10", device="cam.left", extension="bin", data=b"data", timestamp_ns=10000)
+    writer.close()
+    
+    assert len(sorted(shard_dir.glob("images-*.tar"))) == len(shards_before) + 1
+    assert len(shardIO.ShardReader(str(shard_dir))) == 21
@@ -0,0 +1,79 @@
+import pytest
+
+from threading import Event
+
+from device_capture_system import utils
+from device_capture_system.datamodel import BackpressurePolicy
+
+
+def blocking_work_queue(policy):
+    """work queue with a single worker blocked on its first item until the returned event is set"""
+    release = Event()
+    started = Event()
+    processed = []
+    
+    def work(item):
+        started.set()
+        release.wait(5)
+        processed.append(item)
+    
+    work_queue = utils.BoundedWorkQueue(max_size=2, num_workers=1, policy=policy)
+    work_queue.start()
+    
+    work_queue.submit(work, 0)
+    started.wait(5)
+    return work_queue, work, release, processed
+
+# ---------- WORK QUEUE ----------
+
+def test_work_queue_drop_newest():
+    work_queue, work, release, processed = blocking_work_queue(BackpressurePolicy.DROP_NEWEST)
+    
+    assert work_queue.submit(work, 1)
+    assert work_queue.submit(work, 2)
+    assert not work_queue.submit(work, 3)
+    
+    release.set()
+    work_queue.stop()
+    
+    assert processed == [0, 1, 2]
+    counters = work_queue.counters()
+    assert counters.dropped == 1
+    assert counters.completed == 3
+    assert counters.queued == 0
+
+def test_work_queue_drop_oldest():
+    work_queue, work, release, processed = blocking_work_queue(BackpressurePolicy.DROP_OLDEST)
+    
+    for i in range(1, 5):
+        assert work_queue.submit(work, i)
+    
+    release.set()
+    work_queue.stop()
+    
+    assert processed == [0, 3, 4]
+    assert work_queue.counters().dropped == 2
+
+def test_work_queue_counts_failures():
+    def fail():
+        raise ValueError("encoding failed")
+    
+    work_queue = utils.BoundedWorkQueue(max_size=2, num_workers=1)
+    work_queue.start()
+    work_queue.submit(fail)
+    work_queue.stop()
+    
+    counters = work_queue.counters()
+    assert counters.failed == 1
+    assert counters.completed == 0
+
+def test_work_queue_join():
+    work_queue, work, release, processed = blocking_work_queue(BackpressurePolicy.BLOCK)
+    work_queue.submit(work, 1)
+    
+    release.set()
+    work_queue.join()
+    
+    assert processed == [0, 1]
+    assert work_queue.is_active()
+    work_queue.stop()
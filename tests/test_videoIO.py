@@ -0,0 +1,54 @@
+import io
+import av
+import pytest
+
+from device_capture_system import videoIO
+from device_capture_system.datamodel import VideoFile
+
+
+def video_file(**encoder_fields):
+    return VideoFile(file_path="videos", file_name="video", file_extension="mp4", width=640, height=480, fps=30., seconds=1., **encoder_fields)
+
+# ---------- ENCODER OPTIONS ----------
+
+def test_resolve_encoder_profile():
+    fields = videoIO.resolve_encoder_profile("realtime", preset="veryfast", crf=None)
+    
+    assert fields["preset"] == "veryfast"
+    assert fields["tune"] == "zerolatency"
+    assert fields["crf"] == 23
+    
+    with pytest.raises(AssertionError):
+        videoIO.resolve_encoder_profile("unknown")
+
+def test_encoder_options():
+    vf = video_file(codec="libx264", preset="ultrafast", crf=20, codec_options={"libx264": {"x264-params": "keyint=30"}, "mpeg4": {"qscale": "3"}})
+    
+    assert videoIO.encoder_options("libx264", vf) == {"preset": "ultrafast", "crf": "20", "x264-params": "keyint=30"}
+    assert videoIO.encoder_options("mpeg4", vf) == {"qscale": "3"}
+    
+    # a target bit rate replaces crf
+    assert "crf" not in videoIO.encoder_options("libx264", video_file(codec="libx264", crf=20, bit_rate=2_000_000))
+
+# ---------- ENCODER SELECTION ----------
+
+def test_add_video_stream_options():
+    container = av.open(io.BytesIO(), mode="w", format="mp4")
+    stream = videoIO.add_video_stream(container, video_file(codec="h264", preset="ultrafast", threads=2, thread_type="SLICE"))
+    
+    assert stream.codec_context.name == "libx264"
+    assert stream.codec_context.options["preset"] == "ultrafast"
+    assert stream.thread_count == 2
+    assert stream.thread_type == "SLICE"
+
+def test_add_video_stream_fallback():
+    container = av.open(io.BytesIO(), mode="w", format="mp4")
+    stream = videoIO.add_video_stream(container, video_file(codec="h264_nonexistent", codec_fallbacks=["mpeg4"]))
+    
+    assert stream.codec_context.name == "mpeg4"
+    assert len(container.streams) == 1
+
+def test_add_video_stream_no_encoder():
+    container = av.open(io.BytesIO(), mode="w", format="mp4")
+    with pytest.raises(RuntimeError):
+        videoIO.add_video_stream(container, video_file(codec="h264_nonexistent"))
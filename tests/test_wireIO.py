@@ -0,0 +1,41 @@
+import pytest
+import numpy as np
+
+from device_capture_system import wireIO
+
+
+@pytest.fixture
+def frame():
+    return np.linspace(0, 255, 64 * 48 * 3).astype(np.uint8).reshape(48, 64, 3)
+
+@pytest.mark.parametrize("name", ["none", "zlib", "lz4", "zstd"])
+def test_lossless_wire_codecs(name, frame):
+    if not wireIO.WIRE_CODECS[name].is_available():
+        pytest.skip(f"wire codec {name} is not available")
+    
+    codec = wireIO.get_wire_codec(name)
+    payload = codec.encode(frame)
+    
+    decoded = codec.decode(payload, shape=frame.shape, dtype=frame.dtype.str)
+    assert np.array_equal(decoded, frame)
+    if name != "none":
+        assert len(payload) < frame.nbytes
+
+@pytest.mark.parametrize("shape", [(48, 64, 3), (48, 64)])
+def test_jpeg_wire_codec(shape):
+    frame = np.full(shape, 128, dtype=np.uint8)
+    codec = wireIO.get_wire_codec("jpeg", 90)
+    assert codec.supports(frame)
+    
+    decoded = codec.decode(codec.encode(frame), shape=frame.shape, dtype=frame.dtype.str)
+    assert decoded.shape == frame.shape
+    assert np.abs(decoded.astype(int) - frame).max() <= 2
+
+def test_jpeg_wire_codec_supports():
+    codec = wireIO.get_wire_codec("jpeg")
+    assert not codec.supports(np.zeros((48, 64, 3), dtype=np.float32))
+    assert not codec.supports(np.zeros((48, 64, 4), dtype=np.uint8))
+
+def test_unknown_wire_codec():
+    with pytest.raises(AssertionError):
+        wireIO.get_wire_codec("gzip")
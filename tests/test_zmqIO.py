@@ -1,7 +1,8 @@
+import zmq
 import pytest
 import numpy as np
 
-from time import sleep
+from time import sleep, time
 from pydantic import ValidationError
 from datetime import datetime
 from threading import Thread
@@ -55,4 +56,316 @@ def test_zmq_sender_send(zmq_sender, zmq_receiver, frame_packet):
     receiver_thread.join()
     
     zmq_sender.stop()
-    zmq_receiver.stop()
\ No newline at end of file
+    zmq_receiver.stop()
+
+def test_zmq_proxy_steerable_stop():
+    zmq_proxy = zmqIO.ZMQProxy(host="127.0.0.1", sub_port=1026, pub_port=1027)
+    zmq_proxy.start_process()
+    assert zmq_proxy.is_active()
+    assert zmq_proxy.control_port is not None
+    
+    process = zmq_proxy.process
+    zmq_proxy.stop_process(timeout=2)
+    
+    # the proxy returned through its control socket instead of being terminated
+    assert process.exitcode == 0
+    assert not zmq_proxy.is_active()
+
+
+def test_zmq_sender_connect_timeout():
+    zmq_proxy = zmqIO.ZMQProxy(host="127.0.0.1", sub_port=1028, pub_port=1029)
+    assert zmq_proxy.start_process() is not None
+    
+    # returns as soon as the handshake with the proxy completed
+    zmq_sender = zmqIO.ZMQSender(host="127.0.0.1", port=1028)
+    dt = time()
+    assert zmq_sender.start(connect_timeout=2)
+    assert time() - dt < 1
+    assert zmq_sender.is_active()
+    
+    zmq_sender.stop()
+    zmq_proxy.stop_process()
+    
+    # nothing listens on the port anymore
+    zmq_sender = zmqIO.ZMQSender(host="127.0.0.1", port=1028)
+    assert not zmq_sender.start(connect_timeout=0.2)
+    zmq_sender.stop()
+
+def test_zmq_receiver_sequence_gaps(zmq_receiver):
+    # 3 packets lost after sequence 1, one of them dropped by the sender
+    assert zmq_receiver._track_sequence("uuid", 0, 0, epoch="a")
+    assert zmq_receiver._track_sequence("uuid", 1, 0, epoch="a")
+    assert zmq_receiver._track_sequence("uuid", 5, 1, epoch="a")
+    assert not zmq_receiver._track_sequence("uuid", 5, 1, epoch="a")
+    
+    counters = zmq_receiver.stream_counters["uuid"]
+    assert (counters.received, counters.sender_dropped, counters.transport_dropped, counters.duplicates) == (3, 1, 2, 1)
+    
+    # a restarted sender starts at 0 again without counting a gap
+    assert zmq_receiver._track_sequence("uuid", 0, 0, epoch="b")
+    assert zmq_receiver._track_sequence("uuid", 1, 0, epoch="b")
+    assert counters.sender_restarts == 1
+    assert counters.lost == 3
+
+def test_zmq_receiver_sender_restart_first_packet_lost(zmq_receiver):
+    for sequence in range(500):
+        assert zmq_receiver._track_sequence("uuid", sequence, 0, epoch="a")
+    
+    # packet 0 of the restarted sender is lost, the following ones are not duplicates
+    assert all([zmq_receiver._track_sequence("uuid", sequence, 0, epoch="b") for sequence in range(1, 6)])
+    
+    counters = zmq_receiver.stream_counters["uuid"]
+    assert (counters.received, counters.duplicates, counters.sender_restarts, counters.transport_dropped) == (505, 0, 1, 1)
+
+def test_zmq_sender_counts_drops():
+    # a subscriber that never reads, the sender queue fills up once the tcp buffers are full
+    context = zmq.Context()
+    sub_socket = context.socket(zmq.SUB)
+    sub_socket.setsockopt(zmq.RCVHWM, 1)
+    sub_socket.setsockopt(zmq.LINGER, 0)
+    sub_socket.setsockopt_string(zmq.SUBSCRIBE, "")
+    sub_socket.bind("tcp://127.0.0.1:1030")
+    
+    zmq_sender = zmqIO.ZMQSender(host="127.0.0.1", port=1030, q_size=1)
+    zmq_sender.start(connect_timeout=2)
+    
+    frame_packet = datamodel.FramePacket(
+        device=datamodel.PeripheryDevice(device_id="uuid", name="test_device"),
+        frame=np.zeros((1024, 1024), dtype=np.uint8),
+        start_read_dt=datetime.now(),
+        end_read_dt=datetime.now()
+    )
+    
+    # the subscriber socket only sends its subscription once it is used, the sender only applies it on a send
+    sub_socket.poll(100)
+    zmq_sender.send(frame_packet)
+    sleep(0.2)
+    
+    for _ in range(199):
+        zmq_sender.send(frame_packet)
+    
+    assert zmq_sender.dropped > 0
+    assert zmq_sender.sent + zmq_sender.dropped == 200
+    
+    zmq_sender.stop()
+    sub_socket.close()
+    context.term()
+
+def test_zmq_proxy_options(frame_packet):
+    options = datamodel.ProxyOptions(io_threads=2, sndbuf=2 ** 20, rcvbuf=2 ** 20, tcp_keepalive=True, tcp_keepalive_idle=30, xsub_affinity=1, xpub_affinity=2, cpu_affinity=[0])
+    zmq_proxy = zmqIO.ZMQProxy(host="127.0.0.1", sub_port=1043, pub_port=1044, options=options)
+    assert zmq_proxy.start_process() is not None
+    
+    zmq_sender = zmqIO.ZMQSender(host="127.0.0.1", port=1043)
+    zmq_receiver = zmqIO.ZMQReceiver(host="127.0.0.1", port=1044)
+    zmq_sender.start(connect_timeout=2)
+    zmq_receiver.start()
+    
+    # packets are forwarded once the subscription went through the proxy
+    received = None
+    for _ in range(20):
+        zmq_sender.send(frame_packet)
+        if zmq_receiver.socket.poll(100):
+            received = zmq_receiver.receive()
+            break
+    
+    zmq_receiver.stop()
+    zmq_sender.stop()
+    zmq_proxy.stop_process()
+    
+    assert received is not None
+    assert received.device.device_id == "uuid"
+
+# ---------- DIRECT TOPOLOGY ----------
+
+def test_endpoint_registry(tmp_path):
+    registry = zmqIO.EndpointRegistry(str(tmp_path / "registry"))
+    registry.register("Razer Kiyo: left", "tcp://127.0.0.1:5000", device_id="@device_pnp_\\\\?\\usb#vid")
+    registry.register("camera1", "tcp://127.0.0.1:5001")
+    
+    assert registry.endpoints() == {"Razer Kiyo: left": "tcp://127.0.0.1:5000", "camera1": "tcp://127.0.0.1:5001"}
+    
+    registry.unregister("Razer Kiyo: left")
+    assert registry.endpoints() == {"camera1": "tcp://127.0.0.1:5001"}
+
+def test_zmq_direct_sender_receiver(tmp_path, frame_packet):
+    registry = zmqIO.EndpointRegistry(str(tmp_path / "registry"))
+    
+    zmq_sender = zmqIO.ZMQSender(host="127.0.0.1", port=0, bind=True)
+    zmq_sender.start()
+    registry.register("test_device", zmq_sender.endpoint)
+    
+    zmq_receiver = zmqIO.ZMQReceiver(host="127.0.0.1", port=0, registry=registry)
+    zmq_receiver.start()
+    assert zmq_receiver.endpoints == {zmq_sender.endpoint}
+    
+    received = None
+    for _ in range(20):
+        zmq_sender.send(frame_packet)
+        if zmq_receiver.socket.poll(100):
+            received = zmq_receiver.receive()
+            break
+    assert received is not None
+    
+    # a sender that unregistered is disconnected on the next refresh
+    registry.unregister("test_device")
+    zmq_receiver.refresh_endpoints()
+    assert zmq_receiver.endpoints == set()
+    
+    zmq_receiver.stop()
+    zmq_sender.stop()
+
+def test_zmq_direct_sender_stalled_subscriber():
+    # a bound sender serves a subscriber that never reads and one that does, the stalled one must not block the other
+    zmq_sender = zmqIO.ZMQSender(host="127.0.0.1", port=0, bind=True, q_size=1)
+    zmq_sender.start()
+    
+    context = zmq.Context()
+    sub_sockets = []
+    for _ in range(2):
+        sub_socket = context.socket(zmq.SUB)
+        sub_socket.setsockopt(zmq.RCVHWM, 1)
+        sub_socket.setsockopt(zmq.LINGER, 0)
+        sub_socket.setsockopt_string(zmq.SUBSCRIBE, "")
+        sub_socket.connect(zmq_sender.endpoint)
+        sub_sockets.append(sub_socket)
+    stalled_socket, healthy_socket = sub_sockets
+    
+    received = []
+    def receive():
+        while healthy_socket.poll(500):
+            received.append(healthy_socket.recv_multipart())
+    
+    frame_packet = datamodel.FramePacket(
+        device=datamodel.PeripheryDevice(device_id="uuid", name="test_device"),
+        frame=np.zeros((1024, 1024), dtype=np.uint8),
+        start_read_dt=datetime.now(),
+        end_read_dt=datetime.now()
+    )
+    
+    # the subscriptions arrive with the first sends
+    stalled_socket.poll(100)
+    zmq_sender.send(frame_packet)
+    sleep(0.2)
+    received.clear()
+    
+    receive_thread = Thread(target=receive)
+    receive_thread.start()
+    for _ in range(100):
+        zmq_sender.send(frame_packet)
+        sleep(0.005)
+    receive_thread.join()
+    
+    assert zmq_sender.dropped == 0
+    assert len(received) >= 90
+    
+    zmq_sender.stop()
+    for sub_socket in sub_sockets:
+        sub_socket.close()
+    context.term()
+
+@pytest.mark.parametrize("codec, compression_workers", [("zlib", 0), ("zlib", 2), ("jpeg", 2)])
+def test_zmq_sender_wire_codec(tmp_path, codec, compression_workers):
+    registry = zmqIO.EndpointRegistry(str(tmp_path / "registry"))
+    
+    zmq_sender = zmqIO.ZMQSender(host="127.0.0.1", port=0, bind=True, codec=codec, compression_workers=compression_workers)
+    zmq_sender.start()
+    registry.register("test_device", zmq_sender.endpoint)
+    zmq_receiver = zmqIO.ZMQReceiver(host="127.0.0.1", port=0, registry=registry)
+    zmq_receiver.start()
+    
+    frame_packet = datamodel.FramePacket(
+        device=datamodel.PeripheryDevice(device_id="uuid", name="test_device"),
+        frame=np.full((48, 64, 3), 128, dtype=np.uint8),
+        start_read_dt=datetime.now(),
+        end_read_dt=datetime.now()
+    )
+    
+    received = None
+    for sequence in range(20):
+        frame_packet.sequence = sequence
+        zmq_sender.send(frame_packet)
+        if zmq_receiver.socket.poll(100):
+            received = zmq_receiver.receive()
+            break
+    
+    zmq_receiver.stop()
+    zmq_sender.stop()
+    
+    assert received is not None
+    assert received.frame.shape == frame_packet.frame.shape
+    assert np.abs(received.frame.astype(int) - frame_packet.frame).max() <= 2
+
+def test_zmq_receiver_stream_topic(tmp_path, frame_packet):
+    registry = zmqIO.EndpointRegistry(str(tmp_path / "registry"))
+    
+    zmq_sender = zmqIO.ZMQSender(host="127.0.0.1", port=0, bind=True)
+    zmq_sender.start()
+    registry.register("test_device", zmq_sender.endpoint)
+    zmq_receiver = zmqIO.ZMQReceiver(host="127.0.0.1", port=0, registry=registry, stream="preview")
+    zmq_receiver.start()
+    
+    received = None
+    for sequence in range(20):
+        frame_packet.sequence = sequence
+        zmq_sender.send(frame_packet)
+        zmq_sender.send(frame_packet.model_copy(update={"frame": np.zeros((2, 2))}), stream="preview")
+        if zmq_receiver.socket.poll(100):
+            received = zmq_receiver.receive()
+            break
+    
+    # the full resolution packets are filtered by the subscription
+    assert received is not None
+    assert received.frame.shape == (2, 2)
+    assert not zmq_receiver.socket.poll(100)
+    
+    zmq_receiver.stop()
+    zmq_sender.stop()
+
+def test_rate_subscriptions():
+    assert zmqIO.rate_subscriptions("full") == ["full|"]
+    assert zmqIO.rate_subscriptions("full", max_rate=2) == ["full|1|", "full|5|"]
+    assert zmqIO.rate_subscriptions("full", max_rate=1, device_name="cam") == ["full|1|cam|"]
+    assert zmqIO.rate_subscriptions("full", max_rate=100, device_name="cam") == ["full|1|cam|", "full|5|cam|", "full|10|cam|", "full|-|cam|"]
+
+def test_zmq_sender_rate_tiers(zmq_sender):
+    # 3 seconds at 25 fps
+    tiers = [zmq_sender._rate_tier("full|cam", i * 40_000_000) for i in range(75)]
+    
+    for max_rate, expected in [(1, 3), (5, 15), (10, 30)]:
+        subscribed = [topic.split("|")[1] for topic in zmqIO.rate_subscriptions("full", max_rate, "cam")]
+        assert sum([tier in subscribed for tier in tiers]) == expected
+
+def test_zmq_receiver_max_rate(tmp_path, frame_packet):
+    registry = zmqIO.EndpointRegistry(str(tmp_path / "registry"))
+    
+    zmq_sender = zmqIO.ZMQSender(host="127.0.0.1", port=0, bind=True)
+    zmq_sender.start()
+    registry.register("test_device", zmq_sender.endpoint)
+    zmq_receiver = zmqIO.ZMQReceiver(host="127.0.0.1", port=0, registry=registry, receive_wait_time_ms=100, max_rate=4)
+    zmq_receiver.start()
+    zmq_receiver.socket.poll(100) # sends the subscriptions
+    sleep(0.2)
+    
+    def send():
+        start_ns = frame_packet.capture_ns
+        for sequence in range(50):
+            frame_packet.sequence = sequence
+            frame_packet.capture_ns = start_ns + sequence * 20_000_000
+            zmq_sender.send(frame_packet)
+            sleep(0.02)
+    sender_thread = Thread(target=send)
+    sender_thread.start()
+    
+    received = 0
+    while sender_thread.is_alive():
+        if zmq_receiver.receive() is not None:
+            received += 1
+    sender_thread.join()
+    
+    # one second of 50 fps, the 5 fps tier is published and limited to 4 fps by the receiver
+    assert 3 <= received <= 5
+    assert zmq_receiver.stream_counters["uuid"].transport_dropped == 0
+    
+    zmq_receiver.stop()
+    zmq_sender.stop()